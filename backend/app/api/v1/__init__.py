@@ -2,6 +2,9 @@ from fastapi import APIRouter
 from .settings import router as settings_router
 from .account import router as alpaca_router
 from .assets import router as assets_router
+from .orders import router as orders_router
+from .quotes import router as quotes_router
+from .portfolio import router as portfolio_router
 from .agents.position_agent import router as position_agent_router
 from .agents.order_agent import router as order_agent_router
 
@@ -9,5 +12,8 @@ router = APIRouter(prefix="/v1")
 router.include_router(settings_router)
 router.include_router(alpaca_router)
 router.include_router(assets_router)
+router.include_router(orders_router)
+router.include_router(quotes_router)
+router.include_router(portfolio_router)
 router.include_router(position_agent_router)
 router.include_router(order_agent_router)
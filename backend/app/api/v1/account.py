@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from app.core.logging import logging
-from app.core.config import get_trading_client
+from app.core.config import get_trading_client, get_trading_client_pool
+from app.core.broker import call_broker, get_broker_executor, BrokerTimeoutError
+from app.core.rate_limit import get_rate_limiter
 from .models.alpaca_user_data import TradeAccountResponse
 from .settings import api_keys_store
 
@@ -21,9 +23,10 @@ async def get_account_details():
     Raises:
         HTTPException: 
             - 500: Internal server error if Alpaca API call fails
+            - 504: If the Alpaca API call times out
             - 404: If API keys are not configured
     """
-    logging.info_with_emoji("Starting account details retrieval")
+    logging.debug_with_emoji("Starting account details retrieval")
     
     try:
         if "current" not in api_keys_store:
@@ -34,24 +37,50 @@ async def get_account_details():
             )
             
         keys = api_keys_store["current"]
-        logging.info_with_emoji("Getting Alpaca Trading Client instance")
+        logging.debug_with_emoji("Getting Alpaca Trading Client instance")
         
         trading_client = get_trading_client(keys)
 
-        logging.info_with_emoji("Fetching account information from Alpaca")
-        client_information = trading_client.get_account()
+        logging.debug_with_emoji("Fetching account information from Alpaca")
+        client_information = await call_broker(trading_client.get_account)
         
         logging.info_with_emoji(
-            f"Account information retrieved successfully. Account status: {client_information.status}"
+            "Account information retrieved successfully. Account status: %s", client_information.status
         )
         return client_information
         
     except HTTPException as he:
-        logging.error_with_emoji(f"HTTP Exception: {str(he)}")
+        logging.error_with_emoji("HTTP Exception: %s", he)
         raise he
+    except BrokerTimeoutError as te:
+        logging.error_with_emoji("Broker timeout: %s", te)
+        raise HTTPException(
+            status_code=504,
+            detail=str(te)
+        )
     except Exception as e:
-        logging.error_with_emoji(f"Unexpected error: {str(e)}")
+        logging.error_with_emoji("Unexpected error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get account details: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/broker/metrics")
+async def get_broker_metrics():
+    """
+    Report broker executor, rate limiter, TradingClient pool and HTTP transport metrics.
+    
+    Returns:
+        Dict: 
+        - executor: worker count, queue depth, in-flight calls, completed/failed/timed-out counts, wait/run times
+        - rate_limits: per-credential bucket fill, queue depth by priority, queue wait times and 429 count
+        - client_pool: pooled clients and hit/miss/eviction counters
+        - http_pool: connection checkout wait time, reuse ratio and keep-alive expiries
+    """
+    client_pool = get_trading_client_pool()
+    return {
+        "executor": get_broker_executor().metrics(),
+        "rate_limits": get_rate_limiter().stats(),
+        "client_pool": client_pool.stats(),
+        "http_pool": client_pool.transport.stats()
+    }
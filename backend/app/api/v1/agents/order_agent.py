@@ -7,17 +7,27 @@ Date: January 2024
 """
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
-from app.api.v1.tools.orders import quick_crypto_order, create_new_order
+from app.api.v1.tools.orders import quick_crypto_order, create_new_order, create_batch_orders, get_order_status
 
-from typing import AsyncGenerator, Optional
+from typing import Any, AsyncGenerator, Dict, Optional, Tuple
 from pydantic import BaseModel, Field
 from langchain_core.messages import HumanMessage, AIMessage
-from app.core.logging import logging
-from app.core.init_agent import setup_base_agent
-from app.core.memory import memory_store
-import json
+from app.core.logging import bind_session, logging
+from app.core.init_agent import AgentConfig
+from app.core.agent_factory import agent_factory
+from app.core.memory import memory_store, SessionKey
+from app.core.summarizer import summarizer
+from app.core.config import get_settings
+from app.core.streaming import SSE_HEADERS, TOOL_OUTPUT_PREVIEW_CHARS, format_sse, iter_agent_events, with_heartbeat
+from app.core.intent import OrderIntent, parse_order_intent
+from app.core.idempotency import ORDER_SCOPE_KEY, order_scope, turn_id
+from app.core.asset_cache import asset_catalogue
+from app.core.metrics import agent_response_seconds
+from app.core.tracing import tracing_callback
 import time
 
+AGENT_ID = "order-agent"  # Unique identifier for order agent
+
 router = APIRouter(prefix="/agents/order-agent", tags=["agents"])
 
 class ChatRequest(BaseModel):
@@ -27,40 +37,44 @@ class ChatRequest(BaseModel):
         description="The message to send to the agent",
         example="Buy 0.1 ETH"
     )
+    user_id: Optional[str] = Field(
+        None,
+        description="Identifier of the user chatting with the agent"
+    )
+    conversation_id: Optional[str] = Field(
+        None,
+        description="Identifier of the conversation, used to scope memory"
+    )
+    request_id: Optional[str] = Field(
+        None,
+        description="Client-chosen id of this turn, new for every message sent; resending a request with the same id never places its orders twice"
+    )
 
 class ChatResponse(BaseModel):
     """Response model for chat endpoint."""
     role: str = Field("assistant", description="The role of the message sender")
     content: str = Field(..., description="The message content")
 
-# Global variable to store the agent instance
-_order_agent: Optional[object] = None
-
-def setup_order_agent():
-    """
-    Sets up and returns the order agent using the base agent setup.
-    
-    Returns:
-        The configured order agent
-        
-    Raises:
-        HTTPException: If API keys are not configured or other setup errors occur
-    """
-    return setup_base_agent(
-        agent_name="Alpaca-Trading-Order-Agent-Trading-Bot",
-        tools=[quick_crypto_order, create_new_order],
-        system_prompt="""You are a trading bot specialized in executing crypto orders. You can handle both simple and complex orders.
+ORDER_AGENT_CONFIG = AgentConfig(
+    agent_name="Alpaca-Trading-Order-Agent-Trading-Bot",
+    tools=[quick_crypto_order, create_new_order, create_batch_orders, get_order_status],
+    system_prompt="""You are a trading bot specialized in executing crypto orders. You can handle both simple and complex orders.
 
 For simple orders like "Buy 0.1 ETH", use the quick_crypto_order tool.
 For complex orders (limit, stop, etc.), use the create_new_order tool.
+When the user asks for several orders at once (e.g. "buy 0.1 ETH, 0.01 BTC and 5 SOL"), place them all with a single create_batch_orders call.
+To check whether an order has filled, or to list open orders, use the get_order_status tool.
 
 Always confirm the order details before execution and provide clear feedback about the order status.
 If there are any errors, explain them clearly to the user."""
-    )
+)
+
+# Compiled once per model/config and credentials, then shared across requests
+agent_factory.register(ORDER_AGENT_CONFIG)
 
 def get_agent():
     """
-    Get or create the order agent instance.
+    Get the cached order agent instance, building it on first use.
     
     Returns:
         The order agent instance
@@ -68,72 +82,123 @@ def get_agent():
     Raises:
         HTTPException: If agent setup fails
     """
-    global _order_agent
-    logging.info_with_emoji("🤖 Getting order agent instance...")
-    if _order_agent is None:
-        logging.info_with_emoji("🆕 Creating new order agent instance...")
-        _order_agent = setup_order_agent()
-    return _order_agent
+    return agent_factory.get(ORDER_AGENT_CONFIG.agent_name)
+
+ORDER_TOOLS = {order_tool.name: order_tool for order_tool in ORDER_AGENT_CONFIG.tools}
+
+def match_fast_path(message: str) -> Optional[OrderIntent]:
+    """
+    Parse a simple order command that can skip the LLM.
+    
+    Args:
+        message: The user's chat message
+        
+    Returns:
+        Optional[OrderIntent]: The intent if parsing is confident enough, else None
+    """
+    settings = get_settings()
+    if not settings.ORDER_INTENT_FAST_PATH:
+        return None
+    
+    # Only check symbols against an already loaded catalogue; never block on a fetch here
+    snapshot = asset_catalogue.snapshot
+    is_known_symbol = (lambda symbol: snapshot.index.lookup(symbol) is not None) if snapshot else None
+    intent = parse_order_intent(message, is_known_symbol)
+    if intent is None or intent.confidence < settings.ORDER_INTENT_MIN_CONFIDENCE:
+        return None
+    return intent
+
+async def iter_fast_path_events(
+    intent: OrderIntent,
+    config: Optional[Dict[str, Any]] = None
+) -> AsyncGenerator[Tuple[str, Dict[str, Any]], None]:
+    """Run the order tool for a parsed intent, yielding the same events as an agent run."""
+    tool_name, tool_args = intent.tool_call()
+    yield "tool_start", {"tool": tool_name, "input": tool_args}
+    
+    output = await ORDER_TOOLS[tool_name].ainvoke(tool_args, config=config)
+    yield "tool_end", {"tool": tool_name, "output": str(output)[:TOOL_OUTPUT_PREVIEW_CHARS], "status": "success"}
+    
+    # Tools report failures as strings; an Order object means it was accepted
+    if isinstance(output, str):
+        content = output
+    else:
+        content = f"Successfully created {intent.describe()} \nHere is the order: {output}"
+    yield "message", {"role": "assistant", "content": content}
 
-async def stream_agent_response(message: str) -> AsyncGenerator[str, None]:
-    """Stream the agent's response."""
+async def stream_agent_response(
+    message: str,
+    session: SessionKey,
+    request_id: Optional[str] = None
+) -> AsyncGenerator[str, None]:
+    """Stream the agent's tokens, tool progress and final answer as SSE events."""
     start_time = time.time()
-    agent_id = "order-agent"  # Unique identifier for order agent
-    logging.info_with_emoji(f"📝 Processing order request: {message}")
+    logging.info_with_emoji("📝 Processing order request: %s", message)
+    yield format_sse("start", {"agent": session.agent_id, "conversation_id": session.conversation_id})
+    
+    # Orders placed for this turn get deterministic client order ids, so retries never duplicate them
+    run_config = {
+        "configurable": {ORDER_SCOPE_KEY: order_scope(session.id, turn_id(request_id))},
+        "callbacks": [tracing_callback]
+    }
+    path = "agent"
     
     try:
-        # Get or initialize agent
-        agent = get_agent()
+        # Simple commands go straight to the order tools; anything ambiguous goes to the LLM
+        intent = match_fast_path(message)
+        agent = None if intent else get_agent()
         
         # Add user message to memory
         human_message = HumanMessage(content=message)
-        memory_store.add_message(agent_id, human_message)
-        
-        # Create agent state with full message history
-        agent_state = {
-            "messages": memory_store.get_messages(agent_id),
-            "structured_response": None
-        }
+        memory_store.add_message(session, human_message)
         
-        # Initialize agent with message
-        logging.info_with_emoji("🤖 Invoking order agent...")
-        agent_response = await agent.ainvoke(agent_state)
-        
-        # Extract the last message from the response
-        if agent_response.get("messages"):
-            last_message = agent_response["messages"][-1]
-            content = last_message.content if isinstance(last_message, AIMessage) else str(last_message)
-            # Add AI response to memory
-            memory_store.add_message(agent_id, AIMessage(content=content))
+        if intent:
+            logging.info_with_emoji("⚡ Fast path: %s (confidence %s)", intent.describe(), intent.confidence)
+            path = "fast_path"
+            events = iter_fast_path_events(intent, run_config)
         else:
-            content = str(agent_response.get("structured_response", "No response generated"))
-            memory_store.add_message(agent_id, AIMessage(content=content))
+            # Create agent state with the rolling summary and recent history
+            agent_state = {
+                "messages": memory_store.get_prompt_messages(session),
+                "structured_response": None
+            }
             
-        # Check if the response indicates an error
-        if any(error_phrase in content.lower() for error_phrase in ["error", "failed", "couldn't", "invalid", "not configured"]):
-            logging.error_with_emoji(f"❌ Order failed: {content}")
-            processing_time = time.time() - start_time
-            logging.info_with_emoji(f"⚠️ Order processing failed in {processing_time:.2f} seconds")
-        else:
-            processing_time = time.time() - start_time
-            logging.info_with_emoji(f"✅ Order processed successfully in {processing_time:.2f} seconds")
+            # Stream the agent run as it happens
+            logging.info_with_emoji("🤖 Invoking order agent...")
+            events = iter_agent_events(agent, agent_state, run_config)
         
-        # Stream the response
-        response_chunk = ChatResponse(
-            role="assistant",
-            content=content
-        )
-        
-        yield json.dumps(response_chunk.model_dump()) + "\n"
+        async for event, payload in events:
+            if event == "message":
+                content = payload["content"]
+                # Add AI response to memory
+                memory_store.add_message(session, AIMessage(content=content))
+                # Fold older turns into the summary off the request path
+                summarizer.maybe_schedule(session)
+                
+                # Check if the response indicates an error
+                processing_time = time.time() - start_time
+                if any(error_phrase in content.lower() for error_phrase in ["error", "failed", "couldn't", "invalid", "not configured"]):
+                    logging.error_with_emoji("❌ Order failed: %s", content)
+                    logging.info_with_emoji("⚠️ Order processing failed in %.2f seconds", processing_time)
+                else:
+                    logging.info_with_emoji("✅ Order processed successfully in %.2f seconds", processing_time)
+                
+                payload = ChatResponse(role="assistant", content=content).model_dump()
+            yield format_sse(event, payload)
         
     except Exception as e:
+        path = "error"
         error_msg = f"Failed to process order: {str(e)}"
-        logging.error_with_emoji(f"❌ {error_msg}")
+        logging.error_with_emoji("❌ %s", error_msg)
         error_chunk = ChatResponse(
             role="assistant",
             content=error_msg
         )
-        yield json.dumps(error_chunk.model_dump()) + "\n"
+        yield format_sse("error", error_chunk.model_dump())
+    
+    processing_time = time.time() - start_time
+    agent_response_seconds.observe(processing_time, ORDER_AGENT_CONFIG.agent_name, path)
+    yield format_sse("done", {"processing_time": round(processing_time, 3)})
 
 @router.post("/chat", 
     description="""
@@ -156,8 +221,19 @@ async def chat_with_agent(request: ChatRequest):
     Returns:
         StreamingResponse: Streamed agent responses
     """
-    logging.info_with_emoji(f"📨 Received order request: {request.message}")
+    session = SessionKey.for_agent(AGENT_ID, request.user_id, request.conversation_id)
+    bind_session(session.id)
+    memory_store.refresh(session)
+    logging.info_with_emoji("📨 Received order request: %s", request.message)
     return StreamingResponse(
-        stream_agent_response(request.message),
-        media_type="text/event-stream"
+        with_heartbeat(
+            stream_agent_response(
+                request.message,
+                session,
+                request.request_id
+            ),
+            get_settings().STREAM_HEARTBEAT_INTERVAL
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
     )
\ No newline at end of file
@@ -6,21 +6,27 @@ Social Media:
 Date: January 2024
 """
 
-from langgraph.prebuilt import create_react_agent
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
-from app.api.v1.tools.position import get_crypto_positions, get_open_position, close_a_position
+from app.api.v1.tools.position import get_crypto_positions, get_open_position, close_a_position, get_portfolio_analytics
 from ..settings import api_keys_store
-from langchain_openai import ChatOpenAI
 from typing import AsyncGenerator, Optional
 from pydantic import BaseModel, Field
 from langchain_core.messages import HumanMessage, AIMessage
-from app.core.logging import logging
-from app.core.init_agent import setup_base_agent
-from app.core.memory import memory_store
-import json
+from app.core.logging import bind_session, logging
+from app.core.init_agent import AgentConfig
+from app.core.agent_factory import agent_factory
+from app.core.memory import memory_store, SessionKey
+from app.core.summarizer import summarizer
+from app.core.config import get_settings
+from app.core.streaming import SSE_HEADERS, format_sse, iter_agent_events, with_heartbeat
+from app.core.response_cache import response_cache, response_cache_key
+from app.core.metrics import agent_response_seconds
+from app.core.tracing import tracing_callback
 import time
 
+AGENT_ID = "position-agent"  # Unique identifier for position agent
+
 router = APIRouter(prefix="/agents/position-agent", tags=["agents"])
 
 class ChatRequest(BaseModel):
@@ -30,34 +36,35 @@ class ChatRequest(BaseModel):
         description="The message to send to the agent",
         example="What are my current crypto positions?"
     )
+    user_id: Optional[str] = Field(
+        None,
+        description="Identifier of the user chatting with the agent"
+    )
+    conversation_id: Optional[str] = Field(
+        None,
+        description="Identifier of the conversation, used to scope memory"
+    )
 
 class ChatResponse(BaseModel):
     """Response model for chat endpoint."""
     role: str = Field("assistant", description="The role of the message sender")
     content: str = Field(..., description="The message content")
 
-# Global variable to store the agent instance
-_position_agent: Optional[object] = None
+POSITION_AGENT_CONFIG = AgentConfig(
+    agent_name="Alpaca-Trading-Position-Agent-Trading-Bot",
+    tools=[get_crypto_positions, get_open_position, close_a_position, get_portfolio_analytics],
+    system_prompt="You are a trader bot. You will be given tasks to carry out which involve: opening a position, closing a position and getting details about a specific position. For totals, profit and loss, allocation or exposure questions, use get_portfolio_analytics and report its figures rather than calculating them yourself."
+)
 
-def setup_position_agent():
-    """
-    Sets up and returns the position agent using the base agent setup.
-    
-    Returns:
-        The configured position agent
-        
-    Raises:
-        HTTPException: If API keys are not configured or other setup errors occur
-    """
-    return setup_base_agent(
-        agent_name="Alpaca-Trading-Position-Agent-Trading-Bot",
-        tools=[get_crypto_positions, get_open_position, close_a_position],
-        system_prompt="You are a trader bot. You will be given tasks to carry out which involve: opening a position, closing a position and getting details about a specific position."
-    )
+# Compiled once per model/config and credentials, then shared across requests
+agent_factory.register(POSITION_AGENT_CONFIG)
+
+# Tools that only read account state; answers built from them alone may be cached
+READ_ONLY_TOOLS = {get_crypto_positions.name, get_open_position.name, get_portfolio_analytics.name}
 
 def get_agent():
     """
-    Get or create the position agent instance.
+    Get the cached position agent instance, building it on first use.
     
     Returns:
         The position agent instance
@@ -65,65 +72,79 @@ def get_agent():
     Raises:
         HTTPException: If agent setup fails
     """
-    global _position_agent
-    logging.info_with_emoji("🤖 Getting position agent instance...")
-    if _position_agent is None:
-        logging.info_with_emoji("🆕 Creating new position agent instance...")
-        _position_agent = setup_position_agent()
-    return _position_agent
+    return agent_factory.get(POSITION_AGENT_CONFIG.agent_name)
 
-async def stream_agent_response(message: str) -> AsyncGenerator[str, None]:
-    """Stream the agent's response."""
+async def stream_agent_response(message: str, session: SessionKey) -> AsyncGenerator[str, None]:
+    """Stream the agent's tokens, tool progress and final answer as SSE events."""
     start_time = time.time()
-    agent_id = "position-agent"  # Unique identifier for position agent
-    logging.info_with_emoji(f"📝 Processing message: {message}")
+    logging.info_with_emoji("📝 Processing message: %s", message)
+    yield format_sse("start", {"agent": session.agent_id, "conversation_id": session.conversation_id})
+    path = "agent"
     
     try:
+        human_message = HumanMessage(content=message)
+        
+        # Read-only questions are keyed by the account's position version, so trades invalidate them
+        cache_key = response_cache_key(AGENT_ID, api_keys_store.get("current"), message)
+        cached = response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            memory_store.add_message(session, human_message)
+            memory_store.add_message(session, AIMessage(content=cached))
+            processing_time = time.time() - start_time
+            logging.info_with_emoji("⚡ Served cached answer in %.3f seconds", processing_time)
+            agent_response_seconds.observe(processing_time, POSITION_AGENT_CONFIG.agent_name, "cached")
+            yield format_sse("message", ChatResponse(role="assistant", content=cached).model_dump())
+            yield format_sse("done", {"processing_time": round(processing_time, 3), "cached": True})
+            return
+        
         # Get or initialize agent
         agent = get_agent()
         
         # Add user message to memory
-        human_message = HumanMessage(content=message)
-        memory_store.add_message(agent_id, human_message)
+        memory_store.add_message(session, human_message)
         
-        # Create agent state with full message history
+        # Create agent state with the rolling summary and recent history
         agent_state = {
-            "messages": memory_store.get_messages(agent_id),
+            "messages": memory_store.get_prompt_messages(session),
             "structured_response": None
         }
         
-        # Initialize agent with message
+        # Stream the agent run as it happens
         logging.info_with_emoji("🤖 Invoking agent...")
-        agent_response = await agent.ainvoke(agent_state)
-        
-        # Extract the last message from the response
-        if agent_response.get("messages"):
-            last_message = agent_response["messages"][-1]
-            content = last_message.content if isinstance(last_message, AIMessage) else str(last_message)
-            # Add AI response to memory
-            memory_store.add_message(agent_id, AIMessage(content=content))
-        else:
-            content = str(agent_response.get("structured_response", "No response generated"))
-            memory_store.add_message(agent_id, AIMessage(content=content))
-        
-        # Stream the response in chunks
-        response_chunk = ChatResponse(
-            role="assistant",
-            content=content
-        )
-        
-        processing_time = time.time() - start_time
-        logging.info_with_emoji(f"✅ Response generated in {processing_time:.2f} seconds")
-        
-        yield json.dumps(response_chunk.model_dump()) + "\n"
+        tools_used = set()
+        tools_failed = False
+        async for event, payload in iter_agent_events(agent, agent_state, {"callbacks": [tracing_callback]}):
+            if event == "tool_start":
+                tools_used.add(payload["tool"])
+            elif event == "tool_end":
+                tools_failed = tools_failed or payload["status"] == "error"
+            elif event == "message":
+                content = payload["content"]
+                # Add AI response to memory
+                memory_store.add_message(session, AIMessage(content=content))
+                # Fold older turns into the summary off the request path
+                summarizer.maybe_schedule(session)
+                if cache_key and not tools_failed:
+                    response_cache.put(cache_key, content, tools_used, READ_ONLY_TOOLS)
+                
+                processing_time = time.time() - start_time
+                logging.info_with_emoji("✅ Response generated in %.2f seconds", processing_time)
+                
+                payload = ChatResponse(role="assistant", content=content).model_dump()
+            yield format_sse(event, payload)
         
     except Exception as e:
-        logging.error_with_emoji(f"❌ Error generating response: {str(e)}")
+        path = "error"
+        logging.error_with_emoji("❌ Error generating response: %s", e)
         error_chunk = ChatResponse(
             role="assistant",
             content=f"Error: {str(e)}"
         )
-        yield json.dumps(error_chunk.model_dump()) + "\n"
+        yield format_sse("error", error_chunk.model_dump())
+    
+    processing_time = time.time() - start_time
+    agent_response_seconds.observe(processing_time, POSITION_AGENT_CONFIG.agent_name, path)
+    yield format_sse("done", {"processing_time": round(processing_time, 3)})
 
 @router.post("/chat", 
     description="""
@@ -146,8 +167,18 @@ async def chat_with_agent(request: ChatRequest):
     Returns:
         StreamingResponse: Streamed agent responses
     """
-    logging.info_with_emoji(f"📨 Received chat request: {request.message}")
+    session = SessionKey.for_agent(AGENT_ID, request.user_id, request.conversation_id)
+    bind_session(session.id)
+    memory_store.refresh(session)
+    logging.info_with_emoji("📨 Received chat request: %s", request.message)
     return StreamingResponse(
-        stream_agent_response(request.message),
-        media_type="text/event-stream"
+        with_heartbeat(
+            stream_agent_response(
+                request.message,
+                session
+            ),
+            get_settings().STREAM_HEARTBEAT_INTERVAL
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
     )
\ No newline at end of file
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from app.core.logging import logging
 from app.core.config import get_trading_client
+from app.core.broker import call_broker, BrokerTimeoutError
+from app.core.asset_cache import asset_catalogue
+from app.core.asset_index import AssetIndex
 from alpaca.trading.requests import GetAssetsRequest
 from alpaca.trading.enums import AssetClass, AssetStatus
-from .settings import api_keys_store
+from .settings import api_keys_store, on_keys_saved
 from typing import List, Dict
 from alpaca.trading.models import Asset
 
@@ -26,14 +29,57 @@ def asset_to_dict(asset: Asset) -> Dict:
         "symbol": asset.symbol,
         "name": asset.name,
         "min_order_size": asset.min_order_size,
+        "min_trade_increment": asset.min_trade_increment,
         "price_increment": asset.price_increment
     }
 
-@router.get("/crypto")
-async def get_all_available_crypto_assets() -> List[Dict]:
+async def load_crypto_assets(keys: Dict[str, str]) -> List[Dict]:
+    """
+    Fetch all active crypto assets from Alpaca and convert them to dictionaries.
+    
+    Args:
+        keys: Stored API keys used to resolve the trading client
+        
+    Returns:
+        List[Dict]: Asset dictionaries as produced by asset_to_dict
+    """
+    trading_client = get_trading_client(keys)
+    
+    # Search specifically for crypto assets
+    search_params = GetAssetsRequest(status=AssetStatus.ACTIVE, asset_class=AssetClass.CRYPTO)
+    
+    logging.info_with_emoji("Fetching all crypto assets from Alpaca")
+    assets = await call_broker(trading_client.get_all_assets, search_params)
+    
+    # Convert assets to dictionary format
+    return [asset_to_dict(asset) for asset in assets]
+
+async def get_asset_index(keys: Dict[str, str]) -> AssetIndex:
+    """
+    Get the symbol index over the cached crypto asset catalogue.
+    
+    Args:
+        keys: Stored API keys used to load the catalogue on a cold cache
+        
+    Returns:
+        AssetIndex: Index keyed by symbol, base currency and asset id
+    """
+    snapshot = await asset_catalogue.get(lambda: load_crypto_assets(keys))
+    return snapshot.index
+
+@on_keys_saved
+def prewarm_asset_catalogue(keys: Dict[str, str]) -> None:
+    """Preload the asset catalogue in the background once keys are available."""
+    asset_catalogue.prefetch(lambda: load_crypto_assets(keys))
+
+@router.get("/crypto", response_model=List[Dict])
+async def get_all_available_crypto_assets(request: Request) -> Response:
     """
     Retrieves ALL Alpaca trading crypto assets which are available to be traded.
     
+    The catalogue is served from the in-process asset cache. Responses carry an
+    ETag, and a matching If-None-Match header short-circuits to 304 Not Modified.
+    
     Returns:
         List[Dict]: List of available crypto assets including:
         - Symbol
@@ -47,9 +93,10 @@ async def get_all_available_crypto_assets() -> List[Dict]:
     Raises:
         HTTPException: 
             - 500: Internal server error if Alpaca API call fails
+            - 504: If the Alpaca API call times out
             - 404: If API keys are not configured
     """
-    logging.info_with_emoji("Crypto Asset Retrieval has begun...")
+    logging.debug_with_emoji("Crypto Asset Retrieval has begun...")
     
     try:
         if "current" not in api_keys_store:
@@ -60,30 +107,29 @@ async def get_all_available_crypto_assets() -> List[Dict]:
             )
             
         keys = api_keys_store["current"]
-        logging.info_with_emoji("Getting Alpaca Trading Client instance")
+        snapshot = await asset_catalogue.get(lambda: load_crypto_assets(keys))
+        headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
         
-        trading_client = get_trading_client(keys)
+        # Conditional request: the client already holds this version
+        if_none_match = request.headers.get("if-none-match", "")
+        if snapshot.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
         
-        # Search specifically for crypto assets
-        search_params = GetAssetsRequest(status=AssetStatus.ACTIVE, asset_class=AssetClass.CRYPTO)
-        
-        logging.info_with_emoji("Fetching all crypto assets from Alpaca")
-        assets = trading_client.get_all_assets(search_params)
-        
-        # Convert assets to dictionary format
-        asset_dicts = [asset_to_dict(asset) for asset in assets]
-        
-        logging.info_with_emoji(f"Successfully retrieved {len(asset_dicts)} crypto assets")
-        return asset_dicts
+        logging.info_with_emoji("Successfully retrieved %s crypto assets", len(snapshot.assets))
+        return Response(content=snapshot.body, media_type="application/json", headers=headers)
         
     except HTTPException as he:
-        logging.error_with_emoji(f"HTTP Exception: {str(he)}")
+        logging.error_with_emoji("HTTP Exception: %s", he)
         raise he
+    except BrokerTimeoutError as te:
+        logging.error_with_emoji("Broker timeout: %s", te)
+        raise HTTPException(
+            status_code=504,
+            detail=str(te)
+        )
     except Exception as e:
-        logging.error_with_emoji(f"Unexpected error: {str(e)}")
+        logging.error_with_emoji("Unexpected error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get crypto assets: {str(e)}"
         )
-
-    
\ No newline at end of file
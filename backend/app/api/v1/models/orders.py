@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class OrderLeg(BaseModel):
+    """
+    One order of a batch.
+    """
+    symbol: str = Field(..., description="Crypto pair or base currency, e.g. 'BTC/USD' or 'ETH'")
+    side: str = Field(..., description="'buy' or 'sell'")
+    type: str = Field("market", description="'market', 'limit', 'stop' or 'stop_limit'")
+    qty: Optional[float] = Field(None, description="Quantity of coins to trade")
+    notional: Optional[float] = Field(None, description="Dollar amount to trade (alternative to qty)")
+    time_in_force: str = Field("gtc", description="Time in force ('gtc' or 'ioc' for crypto)")
+    limit_price: Optional[float] = Field(None, description="Limit price for limit and stop-limit orders")
+    stop_price: Optional[float] = Field(None, description="Stop price for stop and stop-limit orders")
+
+class BatchOrderRequest(BaseModel):
+    """
+    Several orders submitted together.
+    """
+    legs: List[OrderLeg] = Field(..., min_length=1, description="The orders to place")
+    all_or_nothing: bool = Field(
+        False,
+        description="Submit nothing unless every leg validates, and cancel accepted legs if any submission fails"
+    )
+    request_id: Optional[str] = Field(
+        None,
+        description="Client-chosen id of this batch; resending the same id within the dedup window never places it twice"
+    )
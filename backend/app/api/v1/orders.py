@@ -0,0 +1,109 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Any, Dict, List, Optional
+from app.core.logging import logging
+from app.core.order_book import order_book
+from app.core.trade_updates import trade_update_consumer
+from app.core.idempotency import order_scope, turn_id
+from .models.orders import BatchOrderRequest
+from .tools.orders import submit_order_batch
+from .settings import api_keys_store
+
+router = APIRouter(prefix="/orders", tags=["orders"])
+
+@router.get("", response_model=List[Dict])
+async def list_orders(
+    status: str = Query("open", pattern="^(open|closed|all)$", description="open, closed or all"),
+    symbol: Optional[str] = Query(None, description="Only orders for this pair, e.g. BTC/USD")
+):
+    """
+    List orders from the local order book, newest first.
+
+    The book is kept current by the trade-updates stream, so this never polls Alpaca.
+
+    Returns:
+        List[Dict]: Orders with status and fill progress
+    """
+    orders = order_book.orders(status=status, symbol=symbol)
+    logging.info_with_emoji("📘 Listing %s %s orders from the order book", len(orders), status)
+    return [order.to_dict() for order in orders]
+
+@router.get("/positions", response_model=List[Dict])
+async def list_book_positions():
+    """
+    List position quantities and entry prices implied by the seed snapshot and streamed fills.
+
+    Returns:
+        List[Dict]: Non-flat positions
+    """
+    return [position.to_dict() for position in order_book.positions()]
+
+@router.get("/stream/status")
+async def get_stream_status():
+    """
+    Report the trade-updates consumer and order book state.
+
+    Returns:
+        Dict: Consumer connection state and counters, plus order book counters
+    """
+    return {
+        "consumer": trade_update_consumer.stats(),
+        "book": order_book.stats()
+    }
+
+@router.post("/batch", response_model=Dict[str, Any])
+async def create_order_batch(request: BatchOrderRequest):
+    """
+    Validate and submit several orders concurrently.
+    
+    Every leg is validated locally first; valid legs are then submitted in
+    parallel (bounded by BATCH_ORDER_CONCURRENCY). With all_or_nothing,
+    nothing is sent unless every leg validates, and accepted legs are
+    canceled if another leg's submission fails.
+    
+    Returns:
+        Dict: Overall status ("success", "partial", "failed", "rejected" or "rolled_back") and per-leg results
+        
+    Raises:
+        HTTPException: 
+            - 404: If API keys are not configured
+            - 400: If the batch is empty or too large
+    """
+    if "current" not in api_keys_store:
+        logging.error_with_emoji("API keys not found in store")
+        raise HTTPException(
+            status_code=404,
+            detail="Alpaca API keys not configured"
+        )
+    
+    # Only a resend with the same request id counts as a retry; identical legs may be a deliberate repeat
+    scope = order_scope("orders-api", turn_id(request.request_id))
+    try:
+        result = await submit_order_batch(
+            api_keys_store["current"],
+            request.legs,
+            all_or_nothing=request.all_or_nothing,
+            scope=scope
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    logging.info_with_emoji("📦 Batch of %s orders: %s in %ss", len(request.legs), result['status'], result['elapsed_seconds'])
+    return result
+
+@router.get("/{order_id}", response_model=Dict)
+async def get_order(order_id: str):
+    """
+    Get one order by Alpaca order id or client order id.
+
+    Raises:
+        HTTPException: 404 if the order is not in the local order book
+    """
+    order = order_book.get_order(order_id)
+    if order is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Order {order_id} not found in the order book"
+        )
+    return order.to_dict()
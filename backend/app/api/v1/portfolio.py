@@ -0,0 +1,59 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Any, Dict, Optional
+from app.core.logging import logging
+from app.core.broker import BrokerTimeoutError
+from .tools.position import load_crypto_analytics
+from .settings import api_keys_store
+
+router = APIRouter(prefix="/portfolio", tags=["portfolio"])
+
+@router.get("/analytics", response_model=Dict[str, Any])
+async def get_portfolio_analytics(
+    top: Optional[int] = Query(None, ge=1, description="Only list the largest N positions (totals still cover all)")
+):
+    """
+    Compute portfolio analytics over the open crypto positions.
+    
+    Returns:
+        Dict: 
+        - totals: market value, cost basis, unrealized and intraday P/L
+        - exposure: long, short, gross and net market value
+        - concentration: largest weight, Herfindahl index, effective number of positions
+        - winners / losers: symbols in profit / at a loss
+        - positions: per-position weight and P/L, largest first
+        
+    Raises:
+        HTTPException: 
+            - 500: Internal server error if Alpaca API call fails
+            - 504: If the Alpaca API call times out
+            - 404: If API keys are not configured
+    """
+    logging.debug_with_emoji("Starting portfolio analytics")
+    
+    try:
+        if "current" not in api_keys_store:
+            logging.error_with_emoji("API keys not found in store")
+            raise HTTPException(
+                status_code=404,
+                detail="Alpaca API keys not configured"
+            )
+            
+        analytics = await load_crypto_analytics(api_keys_store["current"], top=top)
+        logging.info_with_emoji("Portfolio analytics computed over %s positions", analytics['count'])
+        return analytics
+        
+    except HTTPException as he:
+        logging.error_with_emoji("HTTP Exception: %s", he)
+        raise he
+    except BrokerTimeoutError as te:
+        logging.error_with_emoji("Broker timeout: %s", te)
+        raise HTTPException(
+            status_code=504,
+            detail=str(te)
+        )
+    except Exception as e:
+        logging.error_with_emoji("Unexpected error: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to compute portfolio analytics: {str(e)}"
+        )
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, List, Optional
+from app.core.logging import logging
+from app.core.quotes import quote_store
+from app.core.market_data import market_data_feed
+
+router = APIRouter(prefix="/quotes", tags=["quotes"])
+
+@router.get("", response_model=List[Dict])
+async def get_quotes(
+    symbols: Optional[str] = Query(None, description="Comma-separated pairs, e.g. BTC/USD,ETH/USD (default: all)"),
+    max_age: Optional[float] = Query(None, gt=0, description="Skip quotes older than this many seconds")
+):
+    """
+    Get the latest bid, ask and last trade price from the streamed quote store.
+    
+    Returns:
+        List[Dict]: One entry per known symbol
+        
+    Raises:
+        HTTPException: 404 if specific symbols were requested and none are known
+    """
+    requested = [symbol.strip() for symbol in symbols.split(",") if symbol.strip()] if symbols else None
+    quotes = quote_store.get_many(requested)
+    if max_age is not None:
+        quotes = [quote for quote in quotes if quote.age <= max_age]
+    
+    if requested and not quotes:
+        logging.error_with_emoji("❌ No quotes for %s", symbols)
+        raise HTTPException(
+            status_code=404,
+            detail=f"No quotes available for {symbols}"
+        )
+    return [quote.to_dict() for quote in quotes]
+
+@router.get("/status")
+async def get_feed_status():
+    """
+    Report the market data feed and quote store state.
+    
+    Returns:
+        Dict: Connection state, subscription size and update counters
+    """
+    return market_data_feed.stats()
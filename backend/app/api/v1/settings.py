@@ -1,4 +1,6 @@
+import inspect
 from fastapi import APIRouter, HTTPException
+from typing import Callable, Dict, List
 from app.core.logging import mask_sensitive_data, logging
 from .models.settings import APIKeys
 
@@ -7,6 +9,24 @@ router = APIRouter(prefix="/settings", tags=["settings"])
 # In-memory storage (this will be lost when server restarts)
 api_keys_store = {}
 
+# Callbacks run after new keys are saved (cache prewarming and invalidation)
+_keys_saved_listeners: List[Callable[[Dict[str, str]], None]] = []
+
+def on_keys_saved(listener: Callable[[Dict[str, str]], None]) -> Callable[[Dict[str, str]], None]:
+    """Register a callback (sync or async) that receives the newly saved keys."""
+    _keys_saved_listeners.append(listener)
+    return listener
+
+async def _notify_keys_saved(keys: Dict[str, str]) -> None:
+    """Run every registered listener; a failing listener never fails the save."""
+    for listener in _keys_saved_listeners:
+        try:
+            result = listener(keys)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logging.error_with_emoji("Keys-saved listener %s failed: %s", listener.__name__, e)
+
 def mask_key(key: str, visible_chars: int = 4) -> str:
     """Mask sensitive key data, showing only the last few characters."""
     if not key:
@@ -18,6 +38,7 @@ async def save_api_keys(keys: APIKeys):
     try:
         # Store keys in memory
         api_keys_store["current"] = keys.model_dump()
+        await _notify_keys_saved(api_keys_store["current"])
         
         # Log masked versions of the keys using enhanced logging
         masked_data = mask_sensitive_data({
@@ -28,11 +49,11 @@ async def save_api_keys(keys: APIKeys):
         })
         
         logging.info_with_emoji(
-            f"API Keys Saved Successfully | Data: {masked_data}"
+            "API Keys Saved Successfully | Data: %s", masked_data
         )
         return {"message": "API keys saved successfully"}
     except Exception as e:
-        logging.error_with_emoji(f"Failed to save API keys: {str(e)}")
+        logging.error_with_emoji("Failed to save API keys: %s", e)
         raise HTTPException(
             status_code=500,
             detail=str(e)
@@ -46,10 +67,10 @@ async def get_api_keys():
             return {"message": "No API keys found"}
             
         masked_keys = mask_sensitive_data(api_keys_store["current"])
-        logging.info_with_emoji(f"API Keys Retrieved | Data: {masked_keys}")
+        logging.info_with_emoji("API Keys Retrieved | Data: %s", masked_keys)
         return api_keys_store["current"]
     except Exception as e:
-        logging.error_with_emoji(f"Failed to retrieve API keys: {str(e)}")
+        logging.error_with_emoji("Failed to retrieve API keys: %s", e)
         raise HTTPException(
             status_code=500,
             detail=str(e)
@@ -6,24 +6,105 @@ Social Media:
 Date: January 2024
 """
 
+import asyncio
+import time
 from fastapi import HTTPException
 from app.core.logging import logging
-from app.core.config import get_trading_client
+from app.core.config import get_settings, get_trading_client
+from app.core.broker import call_broker
+from app.core.asset_index import OrderValues
+from app.core.positions import account_id, position_store
+from app.core.order_book import order_book
+from app.core.quotes import quote_store, check_limit_price
+from app.core.idempotency import client_order_id, order_dedup, order_leg_key, scope_from_config
 from alpaca.trading.enums import AssetClass, OrderSide, OrderType, TimeInForce
 from alpaca.trading.models import Order
-from alpaca.trading.requests import MarketOrderRequest, LimitOrderRequest, StopOrderRequest, StopLimitOrderRequest
+from alpaca.trading.requests import OrderRequest, MarketOrderRequest, LimitOrderRequest, StopOrderRequest, StopLimitOrderRequest
 from ..settings import api_keys_store
-from typing import List, Union, Optional
+from ..assets import get_asset_index
+from ..models.orders import OrderLeg
+from typing import Any, Dict, List, Tuple, Union, Optional
 from uuid import UUID
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
 
 logger = logging.getLogger(__name__)
 
+async def validate_order_locally(
+    keys: Dict[str, str],
+    symbol: str,
+    qty: Optional[float] = None,
+    limit_price: Optional[float] = None,
+    stop_price: Optional[float] = None
+) -> OrderValues:
+    """
+    Validate and round an order against the cached asset index before it is sent.
+    
+    Args:
+        keys: Stored API keys, used to load the asset catalogue on a cold cache
+        symbol: Symbol, base currency or asset id as given by the user
+        qty: Order quantity, if any
+        limit_price: Limit price, if any
+        stop_price: Stop price, if any
+        
+    Returns:
+        OrderValues: Canonical symbol with rounded quantity and prices
+        
+    Raises:
+        ValueError: If the symbol is unknown or the quantity is below the minimum order size
+    """
+    try:
+        index = await get_asset_index(keys)
+    except Exception as e:
+        # Alpaca remains the authority; without a catalogue we only normalize the symbol
+        logger.warning("⚠️ Asset catalogue unavailable, skipping local validation: %s", e)
+        symbol = symbol.upper()
+        if "/" not in symbol and not symbol.endswith("USD"):
+            symbol = f"{symbol}/USD"
+        return OrderValues(symbol=symbol, qty=qty, limit_price=limit_price, stop_price=stop_price)
+    
+    return index.validate_order(symbol, qty=qty, limit_price=limit_price, stop_price=stop_price)
+
+async def submit_order_once(
+    keys: Optional[Dict[str, str]],
+    trading_client: Any,
+    order_request: OrderRequest,
+    scope: Optional[str],
+    leg: Optional[int] = None
+) -> Tuple[Order, bool]:
+    """
+    Submit an order at most once per turn and leg.
+    
+    With a scope (the chat turn or batch request the order belongs to), the
+    request gets a deterministic client_order_id and a retry returns the
+    order that was already placed. Without one the order is simply submitted.
+    
+    Args:
+        keys: Stored API keys
+        trading_client: The account's TradingClient
+        order_request: The validated order request
+        scope: Order scope from idempotency.order_scope(), if any
+        leg: Index of the order within a batch
+        
+    Returns:
+        Tuple[Order, bool]: The order, and whether it had already been placed
+    """
+    if scope is None:
+        return await call_broker(trading_client.submit_order, order_request), False
+    
+    order_request.client_order_id = client_order_id(account_id(keys), scope, order_leg_key(order_request, leg))
+    return await order_dedup.submit(
+        order_request.client_order_id,
+        lambda: call_broker(trading_client.submit_order, order_request),
+        lambda: call_broker(trading_client.get_order_by_client_id, order_request.client_order_id)
+    )
+
 @tool
-def quick_crypto_order(
+async def quick_crypto_order(
     action: str,
     quantity: float,
-    crypto: str
+    crypto: str,
+    config: RunnableConfig = None
 ) -> Union[Order, str]:
     """
     Create a simple market order for crypto with minimal parameters.
@@ -37,22 +118,19 @@ def quick_crypto_order(
         # Check if API keys are configured
         if "current" not in api_keys_store:
             error_msg = "Alpaca API keys not configured"
-            logger.error_with_emoji(f"🚫 {error_msg}")
+            logger.error("🚫 %s", error_msg)
             return f"{error_msg}"
             
         keys = api_keys_store["current"]
         
-        # Format crypto symbol
-        symbol = f"{crypto.upper()}/USD"
-        
         # Log order attempt
-        logger.info(f"Attempting quick {action} order for {quantity} {crypto}")
+        logger.info("Attempting quick %s order for %s %s", action, quantity, crypto)
         
         # Validate action and convert to OrderSide enum
         action = action.upper()
         if action not in ['BUY', 'SELL']:
             error_msg = f"Invalid action: {action}. Must be 'buy' or 'sell'"
-            logger.warning(f"⚠️ {error_msg}")
+            logger.warning("⚠️ %s", error_msg)
             return error_msg
         
         # Convert action to OrderSide enum
@@ -61,35 +139,50 @@ def quick_crypto_order(
         # Validate quantity
         if quantity <= 0:
             error_msg = "Quantity must be greater than 0"
-            logger.warning(f"⚠️ {error_msg}")
+            logger.warning("⚠️ %s", error_msg)
             return error_msg
         
+        # Resolve the symbol and round the quantity locally
+        values = await validate_order_locally(keys, crypto, qty=quantity)
+        
         # Create market order
         order_request = MarketOrderRequest(
-            symbol=symbol,
-            qty=quantity,
+            symbol=values.symbol,
+            qty=values.qty,
             side=order_side,
             time_in_force=TimeInForce.GTC
         )
         
-        # Submit order with API keys
+        # Submit order with API keys (once per turn, however often the call is retried)
         trading_client = get_trading_client(keys)
-        order = trading_client.submit_order(order_request)
-        logger.info(f"✅ Successfully created market order for {quantity} {crypto}")
-        return f"Successfully created market order for {quantity} {crypto} \nHere is the order: {order}"
+        order, duplicate = await submit_order_once(keys, trading_client, order_request, scope_from_config(config))
+        if duplicate:
+            logger.info("♻️ Market order for %s %s was already placed", values.qty, values.symbol)
+            return f"This market order for {values.qty} {values.symbol} was already placed \nHere is the order: {order}"
+        position_store.invalidate(account_id(keys))
+        order_book.record_order(order)
+        logger.info("✅ Successfully created market order for %s %s", values.qty, values.symbol)
+        
+        # Give the user a rough idea of the order's value from the live quote
+        estimate = ""
+        quote = quote_store.get(values.symbol, max_age=get_settings().QUOTE_MAX_AGE)
+        price = quote.reference_price(order_side) if quote else None
+        if price:
+            estimate = f" (about ${values.qty * price:,.2f} at {price})"
+        return f"Successfully created market order for {values.qty} {values.symbol}{estimate} \nHere is the order: {order}"
         
     except ValueError as e:
         error_msg = f"Validation error: {str(e)}"
-        logger.warning(f"⚠️ {error_msg}")
+        logger.warning("⚠️ %s", error_msg)
         return error_msg
         
     except Exception as e:
         error_msg = f"Failed to create order: {str(e)}"
-        logger.error(f"❌ {error_msg}")
+        logger.error("❌ %s", error_msg)
         return error_msg
 
-@tool
-def create_new_order(
+async def prepare_order_request(
+    keys: Optional[Dict[str, str]],
     symbol: str,
     side: str,
     type: str,
@@ -98,6 +191,132 @@ def create_new_order(
     time_in_force: str = "day",
     limit_price: Optional[float] = None,
     stop_price: Optional[float] = None
+) -> OrderRequest:
+    """
+    Validate one order locally and build its Alpaca request without submitting it.
+    
+    Args:
+        keys: Stored API keys, used to load the asset catalogue on a cold cache
+        symbol: Trading symbol (crypto pair)
+        side: Order side ('buy' or 'sell')
+        type: Order type ('market', 'limit', 'stop', 'stop_limit')
+        qty: Quantity of coins to trade
+        notional: Dollar amount to trade (alternative to qty)
+        time_in_force: Time in force for the order
+        limit_price: Limit price for limit and stop-limit orders
+        stop_price: Stop price for stop and stop-limit orders
+        
+    Returns:
+        OrderRequest: The market, limit, stop or stop-limit request
+        
+    Raises:
+        ValueError: If any parameter is invalid for the order type or the asset
+    """
+    # Input validation
+    if not symbol or not isinstance(symbol, str):
+        raise ValueError("Invalid symbol provided")
+    
+    if not (qty or notional):
+        raise ValueError("Either quantity or notional amount must be provided")
+    
+    if qty and notional:
+        raise ValueError("Cannot specify both quantity and notional amount")
+        
+    if qty and qty <= 0:
+        raise ValueError("Quantity must be greater than 0")
+        
+    if notional and notional <= 0:
+        raise ValueError("Notional amount must be greater than 0")
+    
+    # Validate and convert order side
+    try:
+        order_side = OrderSide(side.lower())
+    except ValueError:
+        raise ValueError(f"Invalid order side: {side}. Must be 'buy' or 'sell'")
+    
+    # Validate and convert time in force
+    try:
+        time_in_force = TimeInForce(time_in_force.lower())
+    except ValueError:
+        raise ValueError(f"Invalid time in force: {time_in_force}")
+    
+    # Alpaca only takes notional amounts on market orders; convert to a quantity at the order's price
+    settings = get_settings()
+    quote = quote_store.get(symbol, max_age=settings.QUOTE_MAX_AGE)
+    if notional and type.lower() != "market":
+        price = limit_price or stop_price or (quote.reference_price(order_side.value) if quote else None)
+        if not price:
+            raise ValueError(f"Cannot convert ${notional} to a quantity without a price for this {type} order")
+        qty, notional = notional / price, None
+        logger.info("Converted notional to qty %s at %s", qty, price)
+    
+    # Resolve the symbol and round quantity/prices locally
+    values = await validate_order_locally(
+        keys,
+        symbol,
+        qty=qty,
+        limit_price=limit_price,
+        stop_price=stop_price
+    )
+    symbol, qty = values.symbol, values.qty
+    limit_price, stop_price = values.limit_price, values.stop_price
+    
+    # Catch limit prices that would trade far through the live market (likely typos)
+    if limit_price and quote is not None:
+        check_limit_price(order_side.value, limit_price, quote, settings.LIMIT_PRICE_MAX_DEVIATION)
+    
+    # Create appropriate order request based on type
+    type = type.lower()
+    
+    if type == "market":
+        return MarketOrderRequest(
+            symbol=symbol,
+            qty=qty,
+            notional=notional,
+            side=order_side,
+            time_in_force=time_in_force
+        )
+    elif type == "limit" and limit_price:
+        return LimitOrderRequest(
+            symbol=symbol,
+            qty=qty,
+            notional=notional,
+            side=order_side,
+            time_in_force=time_in_force,
+            limit_price=limit_price
+        )
+    elif type == "stop" and stop_price:
+        return StopOrderRequest(
+            symbol=symbol,
+            qty=qty,
+            notional=notional,
+            side=order_side,
+            time_in_force=time_in_force,
+            stop_price=stop_price
+        )
+    elif type == "stop_limit" and stop_price and limit_price:
+        return StopLimitOrderRequest(
+            symbol=symbol,
+            qty=qty,
+            notional=notional,
+            side=order_side,
+            time_in_force=time_in_force,
+            stop_price=stop_price,
+            limit_price=limit_price
+        )
+    raise ValueError(f"Invalid order type or missing required price parameters for {type} order")
+
+@tool
+async def create_new_order(
+    symbol: str,
+    side: str,
+    type: str,
+    qty: Optional[float] = None,
+    notional: Optional[float] = None,
+    time_in_force: str = "day",
+    limit_price: Optional[float] = None,
+    stop_price: Optional[float] = None,
+    config: RunnableConfig = None
 ) -> Union[Order, str]:
     """
     Create a new trading order with comprehensive error handling and logging.
@@ -114,91 +333,218 @@ def create_new_order(
     """
     try:
         # Log order attempt
-        logger.info(f"Attempting to create {type} order for {symbol}")
+        logger.info("Attempting to create %s order for %s", type, symbol)
         
-        # Input validation
-        if not symbol or not isinstance(symbol, str):
-            raise ValueError("Invalid symbol provided")
+        keys = api_keys_store.get("current")
+        order_request = await prepare_order_request(
+            keys, symbol, side, type,
+            qty=qty,
+            notional=notional,
+            time_in_force=time_in_force,
+            limit_price=limit_price,
+            stop_price=stop_price
+        )
         
-        if not (qty or notional):
-            raise ValueError("Either quantity or notional amount must be provided")
+        # Submit order (once per turn, however often the call is retried)
+        trading_client = get_trading_client(keys)
+        order, duplicate = await submit_order_once(keys, trading_client, order_request, scope_from_config(config))
+        if duplicate:
+            logger.info("%s order for %s was already placed", type, order_request.symbol)
+            return order
+        position_store.invalidate(account_id(keys))
+        order_book.record_order(order)
+        logger.info("Successfully created %s order for %s", type, order_request.symbol)
+        return order
         
-        if qty and notional:
-            raise ValueError("Cannot specify both quantity and notional amount")
-            
-        if qty and qty <= 0:
-            raise ValueError("Quantity must be greater than 0")
-            
-        if notional and notional <= 0:
-            raise ValueError("Notional amount must be greater than 0")
-        
-        # Validate and convert order side
-        try:
-            order_side = OrderSide(side.upper())
-        except ValueError:
-            raise ValueError(f"Invalid order side: {side}. Must be 'buy' or 'sell'")
-        
-        # Validate and convert time in force
-        try:
-            time_in_force = TimeInForce(time_in_force.upper())
-        except ValueError:
-            raise ValueError(f"Invalid time in force: {time_in_force}")
-        
-        # Get trading client
-        trading_client = get_trading_client()
-        
-        # Create appropriate order request based on type
-        order_request = None
-        type = type.lower()
-        
-        if type == "market":
-            order_request = MarketOrderRequest(
-                symbol=symbol,
-                qty=qty,
-                notional=notional,
-                side=order_side,
-                time_in_force=time_in_force
-            )
-        elif type == "limit" and limit_price:
-            order_request = LimitOrderRequest(
-                symbol=symbol,
-                qty=qty,
-                notional=notional,
-                side=order_side,
-                time_in_force=time_in_force,
-                limit_price=limit_price
-            )
-        elif type == "stop" and stop_price:
-            order_request = StopOrderRequest(
-                symbol=symbol,
-                qty=qty,
-                notional=notional,
-                side=order_side,
-                time_in_force=time_in_force,
-                stop_price=stop_price
-            )
-        elif type == "stop_limit" and stop_price and limit_price:
-            order_request = StopLimitOrderRequest(
-                symbol=symbol,
-                qty=qty,
-                notional=notional,
-                side=order_side,
-                time_in_force=time_in_force,
-                stop_price=stop_price,
-                limit_price=limit_price
+    except ValueError as e:
+        logger.error("Validation error in create_new_order: %s", e)
+        return f"I apologize, but I couldn't create the order: {str(e)}"
+        
+    except Exception as e:
+        logger.error("Unexpected error in create_new_order: %s", e)
+        return "I encountered an unexpected error while trying to create your order. Please try again or contact support if the issue persists."
+
+async def submit_order_batch(
+    keys: Optional[Dict[str, str]],
+    legs: List[OrderLeg],
+    all_or_nothing: bool = False,
+    scope: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Validate every leg locally, then submit the valid ones concurrently.
+    
+    Submissions share the broker pool but are capped at BATCH_ORDER_CONCURRENCY
+    at a time, so a large batch cannot starve other requests. In all-or-nothing
+    mode nothing is submitted unless every leg validates, and if any submission
+    fails the legs that were accepted are canceled. Market orders usually fill
+    before they can be canceled; those legs are reported as "cancel_failed".
+    
+    Args:
+        keys: Stored API keys
+        legs: The orders to place
+        all_or_nothing: Cancel the whole batch if any leg fails
+        scope: Order scope of the turn or request; resubmitting the same scope returns the orders already placed
+        
+    Returns:
+        Dict[str, Any]: Overall status, counts, elapsed time and a result per leg
+    """
+    settings = get_settings()
+    start_time = time.perf_counter()
+    if not legs:
+        raise ValueError("A batch needs at least one order")
+    if len(legs) > settings.BATCH_ORDER_MAX_LEGS:
+        raise ValueError(f"A batch can hold at most {settings.BATCH_ORDER_MAX_LEGS} orders")
+    
+    results: List[Dict[str, Any]] = [
+        {"index": i, "symbol": leg.symbol, "side": leg.side, "type": leg.type, "status": "pending", "order_id": None, "error": None}
+        for i, leg in enumerate(legs)
+    ]
+    
+    # Validation is local (asset index and quote cache), so every leg is checked before anything is sent
+    requests = await asyncio.gather(
+        *(
+            prepare_order_request(
+                keys, leg.symbol, leg.side, leg.type,
+                qty=leg.qty,
+                notional=leg.notional,
+                time_in_force=leg.time_in_force,
+                limit_price=leg.limit_price,
+                stop_price=leg.stop_price
             )
+            for leg in legs
+        ),
+        return_exceptions=True
+    )
+    for result, request in zip(results, requests):
+        if isinstance(request, Exception):
+            result.update(status="invalid", error=str(request))
         else:
-            raise ValueError(f"Invalid order type or missing required price parameters for {type} order")
+            result.update(symbol=request.symbol, qty=request.qty, notional=request.notional)
+    
+    valid = [(result, request) for result, request in zip(results, requests) if not isinstance(request, Exception)]
+    if all_or_nothing and len(valid) < len(legs):
+        for result, _ in valid:
+            result["status"] = "not_submitted"
+    else:
+        trading_client = get_trading_client(keys)
+        semaphore = asyncio.Semaphore(settings.BATCH_ORDER_CONCURRENCY)
         
-        # Submit order
-        order = trading_client.submit_order(order_request)
-        logger.info(f"Successfully created {type} order for {symbol}")
-        return order
+        async def submit(result: Dict[str, Any], request: OrderRequest) -> Optional[Order]:
+            async with semaphore:
+                try:
+                    order, duplicate = await submit_order_once(keys, trading_client, request, scope, leg=result["index"])
+                except Exception as e:
+                    result.update(status="failed", error=str(e))
+                    return None
+            order_book.record_order(order)
+            result.update(
+                status="submitted",
+                order_id=str(order.id),
+                order_status=str(getattr(order.status, "value", order.status)),
+                duplicate=duplicate
+            )
+            return order
+        
+        orders = await asyncio.gather(*(submit(result, request) for result, request in valid))
+        if any(order is not None for order in orders):
+            position_store.invalidate(account_id(keys))
+        
+        if all_or_nothing and any(order is None for order in orders):
+            async def cancel(result: Dict[str, Any], order: Order) -> None:
+                async with semaphore:
+                    try:
+                        await call_broker(trading_client.cancel_order_by_id, order.id)
+                        result["status"] = "canceled"
+                    except Exception as e:
+                        result.update(status="cancel_failed", error=f"Could not cancel after a partial failure: {str(e)}")
+            
+            logger.warning("⚠️ Batch partially failed, canceling the submitted orders")
+            await asyncio.gather(*(
+                cancel(result, order) for (result, _), order in zip(valid, orders) if order is not None
+            ))
+    
+    submitted = sum(1 for result in results if result["status"] == "submitted")
+    if submitted == len(legs):
+        status = "success"
+    elif all_or_nothing:
+        status = "rolled_back" if any(result["status"] in ("canceled", "cancel_failed") for result in results) else "rejected"
+    else:
+        status = "partial" if submitted else "failed"
+    
+    logger.info("Batch of %s orders finished: %s (%s submitted)", len(legs), status, submitted)
+    return {
+        "status": status,
+        "all_or_nothing": all_or_nothing,
+        "submitted": submitted,
+        "failed": len(legs) - submitted,
+        "elapsed_seconds": round(time.perf_counter() - start_time, 3),
+        "legs": results
+    }
+
+@tool
+async def create_batch_orders(
+    legs: List[OrderLeg],
+    all_or_nothing: bool = False,
+    config: RunnableConfig = None
+) -> Union[Dict, str]:
+    """
+    Place several crypto orders at once, e.g. "buy 0.1 ETH, 0.01 BTC and 5 SOL".
+    Use this instead of calling an order tool once per order.
+    
+    Args:
+        legs: One entry per order (symbol, side, type, qty or notional, prices)
+        all_or_nothing: Only place the orders if every one of them can be placed
+    """
+    try:
+        if "current" not in api_keys_store:
+            return "Alpaca API keys not configured"
+        
+        logger.info("Attempting batch of %s orders", len(legs))
+        legs = [leg if isinstance(leg, OrderLeg) else OrderLeg(**leg) for leg in legs]
+        return await submit_order_batch(
+            api_keys_store["current"],
+            legs,
+            all_or_nothing=all_or_nothing,
+            scope=scope_from_config(config)
+        )
         
     except ValueError as e:
-        logger.error(f"Validation error in create_new_order: {str(e)}")
-        return f"I apologize, but I couldn't create the order: {str(e)}"
+        logger.error("Validation error in create_batch_orders: %s", e)
+        return f"I apologize, but I couldn't place these orders: {str(e)}"
+        
+    except Exception as e:
+        logger.error("Unexpected error in create_batch_orders: %s", e)
+        return "I encountered an unexpected error while trying to place these orders. Please try again or contact support if the issue persists."
+
+@tool
+async def get_order_status(
+    order_id: Optional[str] = None,
+    symbol: Optional[str] = None,
+    status: str = "open"
+) -> Union[Dict, List[Dict], str]:
+    """
+    Look up orders and their fill progress from the live order book.
+    
+    Args:
+        order_id: Alpaca order id or client order id of a single order
+        symbol: Only list orders for this crypto pair (e.g. 'BTC/USD')
+        status: When listing: 'open', 'closed' or 'all'
+    """
+    try:
+        if order_id:
+            state = order_book.get_order(order_id)
+            if state is not None:
+                return state.to_dict()
+            
+            # Orders from before the stream started are not in the book; ask Alpaca once
+            logger.info("Order %s not in the local order book, fetching it", order_id)
+            trading_client = get_trading_client(api_keys_store.get("current"))
+            order = await call_broker(trading_client.get_order_by_id, order_id)
+            return order_book.record_order(order).to_dict()
+        
+        orders = order_book.orders(status=status.lower(), symbol=symbol)
+        return [state.to_dict() for state in orders]
         
     except Exception as e:
-        logger.error(f"Unexpected error in create_new_order: {str(e)}")
-        return "I encountered an unexpected error while trying to create your order. Please try again or contact support if the issue persists."
\ No newline at end of file
+        logger.error("Failed to get order status: %s", e)
+        return f"I couldn't find that order: {str(e)}"
@@ -1,14 +1,114 @@
 from fastapi import HTTPException
 from app.core.logging import logging
 from app.core.config import get_trading_client
+from app.core.broker import call_broker, BrokerTimeoutError
+from app.core.positions import PositionRecord, PositionSnapshot, account_id, position_store
+from app.core.portfolio import analyze_positions, summarize_analytics
 from alpaca.trading.enums import AssetClass
 from alpaca.trading.models import Order
 from ..settings import api_keys_store
-from typing import List, Union
+from typing import Any, Dict, List, Optional, Union
 from uuid import UUID
+from decimal import Decimal
 from ..models.position import CryptoPosition
 from langchain_core.tools import tool
 
+ZERO = Decimal("0")
+
+def render_position(position: PositionRecord) -> CryptoPosition:
+    """
+    Render a parsed position at the API boundary.
+    
+    Numbers are already validated Decimals, so the model is constructed
+    without a second validation pass.
+    """
+    return CryptoPosition.model_construct(**position.as_strings())
+
+async def load_position_snapshot(keys: Optional[Dict[str, str]]) -> PositionSnapshot:
+    """
+    Get the account's open positions from the snapshot store.
+    
+    Fresh snapshots are served from memory and concurrent callers share one
+    get_all_positions call, so an agent turn that uses several position tools
+    makes at most one upstream request.
+    
+    Args:
+        keys: Stored API keys
+        
+    Returns:
+        PositionSnapshot: Open positions indexed by symbol and asset id
+    """
+    trading_client = get_trading_client(keys)
+    return await position_store.get(
+        account_id(keys) or "default",
+        lambda: call_broker(trading_client.get_all_positions)
+    )
+
+async def load_crypto_analytics(keys: Optional[Dict[str, str]], top: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Compute portfolio analytics over the account's open crypto positions.
+    
+    Args:
+        keys: Stored API keys
+        top: Only list the largest N positions (totals still cover all of them)
+        
+    Returns:
+        Dict[str, Any]: Output of analyze_positions()
+    """
+    snapshot = await load_position_snapshot(keys)
+    return analyze_positions(
+        [position for position in snapshot.positions if position.asset_class == AssetClass.CRYPTO],
+        top=top
+    )
+
+@tool
+async def get_portfolio_analytics() -> str:
+    """
+    Computes portfolio totals over all open crypto positions: total market value,
+    cost basis, unrealized and today's P/L, allocation weight of each position,
+    concentration, long/short exposure, and which positions are in profit or at a loss.
+    Use this for any question about totals, P/L or allocation instead of adding up
+    positions yourself.
+    
+    Returns:
+        str: Pre-computed portfolio summary
+    
+    Raises:
+        HTTPException: 
+            - 404: If API keys are not configured
+            - 500: Internal server error if Alpaca API call fails
+            - 504: If the Alpaca API call times out
+    """
+    logging.debug_with_emoji("🧮 Computing portfolio analytics...")
+    
+    try:
+        if "current" not in api_keys_store:
+            logging.error_with_emoji("🚫 API keys not found in store")
+            raise HTTPException(
+                status_code=404,
+                detail="Alpaca API keys not configured"
+            )
+            
+        analytics = await load_crypto_analytics(api_keys_store["current"])
+        logging.info_with_emoji("✅ Computed analytics over %s crypto positions", analytics['count'])
+        return summarize_analytics(analytics)
+        
+    except HTTPException as he:
+        logging.error_with_emoji("❌ HTTP Exception: %s", he)
+        raise he
+    except BrokerTimeoutError as te:
+        logging.error_with_emoji("❌ Broker timeout: %s", te)
+        raise HTTPException(
+            status_code=504,
+            detail=str(te)
+        )
+    except Exception as e:
+        logging.error_with_emoji("❌ Unexpected error: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to compute portfolio analytics: {str(e)}"
+        )
+
 @tool
 async def get_crypto_positions() -> List[CryptoPosition]:
     """
@@ -21,9 +121,10 @@ async def get_crypto_positions() -> List[CryptoPosition]:
     Raises:
         HTTPException: 
             - 500: Internal server error if Alpaca API call fails
+            - 504: If the Alpaca API call times out
             - 404: If API keys are not configured
     """
-    logging.info_with_emoji("🔍 Starting crypto positions retrieval...")
+    logging.debug_with_emoji("🔍 Starting crypto positions retrieval...")
     
     try:
         if "current" not in api_keys_store:
@@ -34,60 +135,34 @@ async def get_crypto_positions() -> List[CryptoPosition]:
             )
             
         keys = api_keys_store["current"]
-        logging.info_with_emoji("🔑 Initializing Alpaca Trading Client")
-        
-        trading_client = get_trading_client(keys)
         
-        logging.info_with_emoji("📊 Fetching all positions from Alpaca")
-        all_positions = trading_client.get_all_positions()
+        logging.debug_with_emoji("📊 Fetching all positions")
+        all_positions = (await load_position_snapshot(keys)).positions
         
-        logging.info_with_emoji("🔎 Filtering for crypto positions")
+        logging.debug_with_emoji("🔎 Filtering for crypto positions")
         crypto_positions = [
             position for position in all_positions 
             if position.asset_class == AssetClass.CRYPTO
         ]
         
-        logging.info_with_emoji("🧹 Cleaning position data and removing null values")
-        cleaned_positions = []
-        null_field_count = 0
-        
-        for position in crypto_positions:
-            position_dict = position.dict()
-            # Remove asset_id
-            position_dict.pop('asset_id', None)
-            
-            # Convert numeric nulls to "0"
-            numeric_fields = [
-                'market_value', 'unrealized_pl', 'unrealized_plpc',
-                'unrealized_intraday_pl', 'unrealized_intraday_plpc',
-                'current_price', 'lastday_price', 'change_today',
-                'swap_rate', 'avg_entry_swap_rate', 'qty_available'
-            ]
-            
-            for field in numeric_fields:
-                if position_dict.get(field) is None:
-                    position_dict[field] = "0"
-                    null_field_count += 1
-            
-            cleaned_positions.append(CryptoPosition(**position_dict))
-            
-        logging.info_with_emoji(f"🔄 Converted {null_field_count} null numeric values to '0'")
-        
-        logging.info_with_emoji("📈 Sorting positions by current price")
-        sorted_positions = sorted(
-            cleaned_positions,
-            key=lambda x: float(x.current_price),
-            reverse=True
-        )
+        logging.debug_with_emoji("📈 Sorting positions by current price")
+        crypto_positions.sort(key=lambda position: position.current_price or ZERO, reverse=True)
+        sorted_positions = [render_position(position) for position in crypto_positions]
         
-        logging.info_with_emoji(f"✅ Successfully retrieved and cleaned {len(sorted_positions)} crypto positions")
+        logging.info_with_emoji("✅ Successfully retrieved and cleaned %s crypto positions", len(sorted_positions))
         return sorted_positions
         
     except HTTPException as he:
-        logging.error_with_emoji(f"❌ HTTP Exception: {str(he)}")
+        logging.error_with_emoji("❌ HTTP Exception: %s", he)
         raise he
+    except BrokerTimeoutError as te:
+        logging.error_with_emoji("❌ Broker timeout: %s", te)
+        raise HTTPException(
+            status_code=504,
+            detail=str(te)
+        )
     except Exception as e:
-        logging.error_with_emoji(f"❌ Unexpected error: {str(e)}")
+        logging.error_with_emoji("❌ Unexpected error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get crypto positions: {str(e)}"
@@ -109,22 +184,19 @@ async def get_open_position(symbol_or_asset_id: Union[UUID, str]) -> CryptoPosit
             - 404: Position not found or API keys not configured
             - 400: Invalid asset type (non-crypto)
             - 500: Internal server error
+            - 504: Alpaca API call timed out
     """
-    logging.info_with_emoji(f"🔍 Fetching open position for {symbol_or_asset_id}...")
+    logging.debug_with_emoji("🔍 Fetching open position for %s...", symbol_or_asset_id)
     
     try:
-        trading_client = get_trading_client()
-        
-        # Get the position
-        try:
-            position = trading_client.get_open_position(str(symbol_or_asset_id))
-        except Exception as e:
-            if "position does not exist" in str(e).lower():
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"No open position found for {symbol_or_asset_id}"
-                )
-            raise
+        # Get the position from the account's snapshot
+        snapshot = await load_position_snapshot(api_keys_store.get("current"))
+        position = snapshot.lookup(symbol_or_asset_id)
+        if position is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No open position found for {symbol_or_asset_id}"
+            )
             
         # Validate it's a crypto position
         if position.asset_class != AssetClass.CRYPTO:
@@ -133,32 +205,22 @@ async def get_open_position(symbol_or_asset_id: Union[UUID, str]) -> CryptoPosit
                 detail=f"Asset {symbol_or_asset_id} is not a cryptocurrency"
             )
             
-        # Clean the position data
-        position_dict = position.dict()
-        position_dict.pop('asset_id', None)
-        
-        # Convert numeric nulls to "0"
-        numeric_fields = [
-            'market_value', 'unrealized_pl', 'unrealized_plpc',
-            'unrealized_intraday_pl', 'unrealized_intraday_plpc',
-            'current_price', 'lastday_price', 'change_today',
-            'swap_rate', 'avg_entry_swap_rate', 'qty_available'
-        ]
-        
-        for field in numeric_fields:
-            if position_dict.get(field) is None:
-                position_dict[field] = "0"
-                
-        cleaned_position = CryptoPosition(**position_dict)
-        logging.info_with_emoji(f"✅ Successfully retrieved position for {symbol_or_asset_id}")
+        cleaned_position = render_position(position)
+        logging.info_with_emoji("✅ Successfully retrieved position for %s", symbol_or_asset_id)
         
         return cleaned_position
         
     except HTTPException as he:
-        logging.error_with_emoji(f"❌ HTTP Exception: {str(he)}")
+        logging.error_with_emoji("❌ HTTP Exception: %s", he)
         raise he
+    except BrokerTimeoutError as te:
+        logging.error_with_emoji("❌ Broker timeout: %s", te)
+        raise HTTPException(
+            status_code=504,
+            detail=str(te)
+        )
     except Exception as e:
-        logging.error_with_emoji(f"❌ Unexpected error: {str(e)}")
+        logging.error_with_emoji("❌ Unexpected error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get position: {str(e)}"
@@ -180,14 +242,21 @@ async def close_a_position(symbol_or_asset_id: Union[UUID, str]) -> Order:
             - 404: Position not found
             - 400: Invalid asset type (non-crypto)
             - 500: Internal server error
+            - 504: Alpaca API call timed out
     """
-    logging.info_with_emoji(f"🔄 Starting closure of position for {symbol_or_asset_id}...")
+    logging.info_with_emoji("🔄 Starting closure of position for %s...", symbol_or_asset_id)
     
     try:
-        trading_client = get_trading_client()
+        keys = api_keys_store.get("current")
+        trading_client = get_trading_client(keys)
         
-        # Verify it's a crypto position first
-        position = trading_client.get_open_position(str(symbol_or_asset_id))
+        # Verify it's a crypto position first (from the snapshot, no extra round-trip)
+        position = (await load_position_snapshot(keys)).lookup(symbol_or_asset_id)
+        if position is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"No open position found for {symbol_or_asset_id}"
+            )
         if position.asset_class != AssetClass.CRYPTO:
             raise HTTPException(
                 status_code=400,
@@ -195,20 +264,27 @@ async def close_a_position(symbol_or_asset_id: Union[UUID, str]) -> Order:
             )
             
         # Close the position
-        logging.info_with_emoji(f"📉 Closing position for {symbol_or_asset_id}")
-        closure_result = trading_client.close_position(str(symbol_or_asset_id))
+        logging.debug_with_emoji("📉 Closing position for %s", symbol_or_asset_id)
+        closure_result = await call_broker(trading_client.close_position, position.symbol)
+        position_store.invalidate(account_id(keys))
         
         # Log the closure details
-        logging.info_with_emoji(f"✅ Successfully closed position for {symbol_or_asset_id}")
-        logging.info_with_emoji(f"📊 Closure details: {closure_result}")
+        logging.info_with_emoji("✅ Successfully closed position for %s", symbol_or_asset_id)
+        logging.info_with_emoji("📊 Closure details: %s", closure_result)
         
         return f"Here are the details of the sucessful closure: {closure_result}"
         
     except HTTPException as he:
-        logging.error_with_emoji(f"❌ HTTP Exception: {str(he)}")
+        logging.error_with_emoji("❌ HTTP Exception: %s", he)
         raise he
+    except BrokerTimeoutError as te:
+        logging.error_with_emoji("❌ Broker timeout: %s", te)
+        raise HTTPException(
+            status_code=504,
+            detail=str(te)
+        )
     except Exception as e:
-        logging.error_with_emoji(f"❌ Unexpected error while closing position: {str(e)}")
+        logging.error_with_emoji("❌ Unexpected error while closing position: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to close position: {str(e)}"
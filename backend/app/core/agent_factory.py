@@ -0,0 +1,132 @@
+"""
+Agent Factory
+
+This module owns the compiled agent graphs. Agents register their AgentConfig
+once at import time; compiled graphs are cached by
+(agent name, model, temperature, credential fingerprint), so a chat request
+resolves its agent with a dict lookup instead of rebuilding the LLM client
+and ReAct graph. Saving new keys drops graphs built with other credentials
+and prewarms the new ones in the background.
+
+A compiled graph holds no per-run state (there is no checkpointer; history
+is passed in with every call), so one instance is shared safely across
+concurrent requests.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import threading
+from typing import Any, Dict, Optional, Set, Tuple
+from fastapi import HTTPException
+from app.core.logging import logging
+from app.core.config import credential_fingerprint
+from app.core.init_agent import AgentConfig, setup_base_agent
+from app.api.v1.settings import api_keys_store, on_keys_saved
+
+AgentCacheKey = Tuple[str, str, float, str]
+
+
+class AgentFactory:
+    """Registry of agent configurations and cache of their compiled graphs."""
+
+    def __init__(self):
+        self._configs: Dict[str, AgentConfig] = {}
+        self._agents: Dict[AgentCacheKey, Any] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "builds": 0, "invalidations": 0}
+
+    def register(self, config: AgentConfig) -> None:
+        """Register (or replace) the configuration for an agent name."""
+        self._configs[config.agent_name] = config
+
+    def get(self, agent_name: str, api_keys: Optional[Dict[str, str]] = None) -> Any:
+        """
+        Get the compiled agent for the given (or stored) keys, building it on first use.
+
+        Args:
+            agent_name: Name the agent was registered under
+            api_keys: Keys to use; defaults to the stored keys
+
+        Returns:
+            The compiled agent graph
+
+        Raises:
+            HTTPException: If API keys are not configured or the agent fails to build
+        """
+        keys = api_keys if api_keys is not None else api_keys_store.get("current")
+        if keys is None:
+            logging.error_with_emoji("🔑 API keys not found in store")
+            raise HTTPException(
+                status_code=404,
+                detail="API keys not configured"
+            )
+
+        config = self._configs[agent_name]
+        key = self._cache_key(config, keys)
+        agent = self._agents.get(key)
+        if agent is not None:
+            self._stats["hits"] += 1
+            return agent
+
+        # Compiled outside the lock, so a request on the event loop never waits on a prewarm
+        # thread; if two callers race, both graphs are equivalent and the first one is kept
+        agent = setup_base_agent(
+            agent_name=config.agent_name,
+            tools=config.tools,
+            system_prompt=config.system_prompt,
+            model=config.model,
+            temperature=config.temperature,
+            max_retries=config.max_retries,
+            api_keys=keys
+        )
+        with self._lock:
+            self._stats["builds"] += 1
+            return self._agents.setdefault(key, agent)
+
+    def prewarm(self, api_keys: Dict[str, str]) -> None:
+        """Build every registered agent for the given keys."""
+        for agent_name in self._configs:
+            try:
+                self.get(agent_name, api_keys)
+            except HTTPException as he:
+                logging.error_with_emoji("❌ Failed to prewarm %s: %s", agent_name, he.detail)
+
+    def invalidate(self, keep_fingerprint: Optional[str] = None) -> None:
+        """Drop cached agents, except those built with keep_fingerprint."""
+        with self._lock:
+            stale = [key for key in self._agents if key[3] != keep_fingerprint]
+            for key in stale:
+                del self._agents[key]
+            self._stats["invalidations"] += len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache size and hit/build/invalidation counters."""
+        return {**self._stats, "cached_agents": len(self._agents), "registered": len(self._configs)}
+
+    @staticmethod
+    def _cache_key(config: AgentConfig, keys: Dict[str, str]) -> AgentCacheKey:
+        return (config.agent_name, config.model, config.temperature, credential_fingerprint(keys["groq"]))
+
+
+# Global instance
+agent_factory = AgentFactory()
+
+# Prewarms still running (referenced so their failures are logged, not dropped)
+_prewarm_futures: Set[asyncio.Future] = set()
+
+@on_keys_saved
+async def rotate_agents(keys: Dict[str, str]) -> None:
+    """Drop agents built with old keys and compile the new ones off the event loop."""
+    agent_factory.invalidate(keep_fingerprint=credential_fingerprint(keys["groq"]))
+    future = asyncio.get_running_loop().run_in_executor(None, agent_factory.prewarm, keys)
+    _prewarm_futures.add(future)
+    future.add_done_callback(_prewarm_done)
+
+def _prewarm_done(future: asyncio.Future) -> None:
+    _prewarm_futures.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logging.error_with_emoji("❌ Agent prewarm failed: %s", future.exception())
@@ -0,0 +1,149 @@
+"""
+Alpaca Stream Runner
+
+alpaca-py's websocket streams (TradingStream, CryptoDataStream) own their
+event loop in run(), reconnect by themselves when a connection drops, and
+log and retry a failed connect or login forever. This module runs a stream
+through its public run()/stop_ws() in a dedicated thread and hands its
+messages to the app's event loop, so the consumers never touch the private
+_run_forever().
+
+A failed (re)connect or login stops the stream instead of being retried
+silently; the runner then exits and iterating over it raises
+ConnectionError, which the trade-update consumer and market-data feed treat
+as a disconnect (their own retry and backoff apply).
+
+Components:
+- StopOnConnectError: stream mixin that records a connect/login error and stops
+- TradeUpdatesStream / CryptoQuotesStream: the alpaca-py streams with the mixin
+- StreamRunner: runs a stream in its thread and buffers messages into an asyncio queue
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Optional
+from alpaca.data.live.crypto import CryptoDataStream
+from alpaca.trading.stream import TradingStream
+from app.core.logging import logging
+
+# Queued by the runner's done callback so a blocked reader wakes up
+_STOPPED = object()
+
+
+class StopOnConnectError:
+    """Mixin for alpaca-py streams: stop on a failed connect or login instead of retrying it."""
+
+    connected = False
+    error: Optional[BaseException] = None
+
+    async def _start_ws(self) -> None:
+        # The only hook into the reconnect loop; run() itself swallows this error
+        try:
+            await super()._start_ws()
+        except Exception as e:
+            self.error = e
+            await self.stop_ws()
+            raise
+        self.connected = True
+
+    async def close(self) -> None:
+        self.connected = False
+        await super().close()
+
+
+class TradeUpdatesStream(StopOnConnectError, TradingStream):
+    """Alpaca's trade_updates websocket."""
+
+
+class CryptoQuotesStream(StopOnConnectError, CryptoDataStream):
+    """Alpaca's crypto market-data websocket."""
+
+
+class StreamRunner:
+    """Runs an alpaca-py stream in a dedicated thread and buffers its messages."""
+
+    def __init__(self, stream: StopOnConnectError, name: str, max_queue: int, shed: bool = False, stop_timeout: float = 10.0):
+        """
+        Args:
+            stream: The stream, with its handlers subscribed to put() (or put_latest())
+            name: Used for the thread name and error messages
+            max_queue: Messages buffered before the stream waits (or sheds)
+            shed: Drop messages when the queue is full instead of blocking the websocket reader
+            stop_timeout: Seconds close() waits for the stream to stop
+        """
+        self.stream = stream
+        self.name = name
+        self.shed = shed
+        self.stop_timeout = stop_timeout
+        self.dropped = 0
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name.replace(" ", "-"))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[asyncio.Future] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.stream.connected and self._runner is not None and not self._runner.done()
+
+    def start(self) -> None:
+        """Start the stream's run() in the runner thread."""
+        self._loop = asyncio.get_running_loop()
+        self._runner = self._loop.run_in_executor(self._executor, self.stream.run)
+        self._runner.add_done_callback(self._stopped)
+
+    async def put(self, message: Any) -> None:
+        """Stream handler: queue a message, waiting while the queue is full."""
+        # Runs on the stream's loop; the queue belongs to the app's loop
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._queue.put(message), self._loop))
+
+    async def put_latest(self, message: Any) -> None:
+        """Stream handler: queue a message, dropping it if the queue is full."""
+        self._loop.call_soon_threadsafe(self._put_nowait, message)
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        while True:
+            if self._queue.empty() and self._runner.done():
+                self._raise_stopped()
+            message = await self._queue.get()
+            if message is _STOPPED:
+                self._raise_stopped()
+            yield message
+
+    async def close(self) -> None:
+        """Stop the stream and wait (bounded) for its thread to finish."""
+        if self._runner is not None:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.stop_timeout
+            # Repeated, as a stop sent before run() starts its loop is forgotten
+            while not self._runner.done() and loop.time() < deadline:
+                await self.stream.stop_ws()
+                await asyncio.wait({self._runner}, timeout=1)
+            if not self._runner.done():
+                logging.error_with_emoji("❌ %s stream did not stop within %ss", self.name, self.stop_timeout)
+        self._executor.shutdown(wait=False)
+
+    def _put_nowait(self, message: Any) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _stopped(self, runner: asyncio.Future) -> None:
+        try:
+            self._queue.put_nowait(_STOPPED)
+        except asyncio.QueueFull:
+            # The reader drains the queue and then sees the runner is done
+            pass
+
+    def _raise_stopped(self) -> None:
+        error = self.stream.error
+        if error is None and not self._runner.cancelled():
+            error = self._runner.exception()
+        if error is not None:
+            raise ConnectionError(f"{self.name} stream stopped: {error}") from error
+        raise ConnectionError(f"{self.name} stream stopped")
@@ -0,0 +1,142 @@
+"""
+Asset Catalogue Cache
+
+This module keeps the tradable crypto asset catalogue in process memory.
+The catalogue changes rarely, so it is served from cache for ASSET_CACHE_TTL
+seconds, then served stale while a single background refresh runs. Concurrent
+cold misses are collapsed into one upstream call.
+
+Components:
+- CatalogueSnapshot: immutable view of one catalogue fetch (assets, body, ETag, symbol index)
+- AssetCatalogue: TTL + stale-while-revalidate cache with single-flight loading
+- asset_catalogue: process-wide instance used by the assets endpoint
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.core.logging import logging
+from .asset_index import AssetIndex
+from .config import get_settings
+
+AssetLoader = Callable[[], Awaitable[List[Dict]]]
+
+
+@dataclass(frozen=True)
+class CatalogueSnapshot:
+    """One fetched version of the asset catalogue."""
+    assets: List[Dict]
+    body: bytes
+    etag: str
+    index: AssetIndex
+    fetched_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def build(cls, assets: List[Dict]) -> "CatalogueSnapshot":
+        """Serialize the assets once, derive a content-based ETag and index the symbols."""
+        body = json.dumps(assets, separators=(",", ":"), default=str).encode("utf-8")
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        return cls(assets=assets, body=body, etag=etag, index=AssetIndex(assets))
+
+
+class AssetCatalogue:
+    """In-process asset catalogue with TTL, stale-while-revalidate and single-flight loads."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogueSnapshot] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+
+    @property
+    def snapshot(self) -> Optional[CatalogueSnapshot]:
+        """The most recently loaded snapshot, fresh or stale."""
+        return self._snapshot
+
+    def is_fresh(self) -> bool:
+        """Whether the cached snapshot is within its TTL."""
+        return (
+            self._snapshot is not None
+            and time.monotonic() - self._snapshot.fetched_at < self.ttl
+        )
+
+    async def get(self, loader: AssetLoader) -> CatalogueSnapshot:
+        """
+        Return the catalogue, loading or refreshing it as needed.
+
+        Args:
+            loader: Coroutine factory that fetches the asset dicts upstream
+
+        Returns:
+            CatalogueSnapshot: Fresh or stale catalogue snapshot
+
+        Raises:
+            Exception: Whatever the loader raised, only when there is no snapshot to fall back on
+        """
+        if self.is_fresh():
+            self._stats["hits"] += 1
+            return self._snapshot
+
+        if self._snapshot is not None:
+            # Serve stale data while a single background refresh runs
+            self._stats["stale_hits"] += 1
+            self._ensure_refresh(loader)
+            return self._snapshot
+
+        self._stats["misses"] += 1
+        return await asyncio.shield(self._ensure_refresh(loader))
+
+    def prefetch(self, loader: AssetLoader) -> None:
+        """Start a background load unless the cached snapshot is still fresh."""
+        if not self.is_fresh():
+            self._ensure_refresh(loader)
+
+    def invalidate(self) -> None:
+        """Drop the cached snapshot so the next read reloads it."""
+        self._snapshot = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current snapshot age."""
+        age = time.monotonic() - self._snapshot.fetched_at if self._snapshot else None
+        return {
+            **self._stats,
+            "ttl": self.ttl,
+            "size": len(self._snapshot.assets) if self._snapshot else 0,
+            "age_seconds": age,
+            "refreshing": self._refresh_task is not None and not self._refresh_task.done(),
+        }
+
+    def _ensure_refresh(self, loader: AssetLoader) -> asyncio.Task:
+        """Start a refresh unless one is already running on this loop."""
+        task = self._refresh_task
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            return task
+        task = asyncio.create_task(self._refresh(loader))
+        # Background refresh failures are logged in _refresh; mark them retrieved
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._refresh_task = task
+        return task
+
+    async def _refresh(self, loader: AssetLoader) -> CatalogueSnapshot:
+        self._stats["refreshes"] += 1
+        try:
+            snapshot = CatalogueSnapshot.build(await loader())
+        except Exception as e:
+            self._stats["refresh_errors"] += 1
+            logging.error_with_emoji("❌ Asset catalogue refresh failed: %s", e)
+            raise
+        self._snapshot = snapshot
+        logging.info_with_emoji("📦 Asset catalogue refreshed with %s assets", len(snapshot.assets))
+        return snapshot
+
+
+# Global instance
+asset_catalogue = AssetCatalogue(ttl=get_settings().ASSET_CACHE_TTL)
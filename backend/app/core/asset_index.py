@@ -0,0 +1,180 @@
+"""
+Asset Symbol Index
+
+This module builds an in-memory index over the asset catalogue so that order
+tools can resolve symbols and validate/round quantity and price locally,
+without a network round-trip to Alpaca.
+
+Components:
+- AssetSpec: trading constraints of a single asset (Decimal-backed)
+- AssetIndex: lookups by symbol ("ETH/USD", "ETHUSD"), base currency ("ETH") and asset id
+- OrderValues: the rounded quantity and prices for an order
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP, InvalidOperation
+from typing import Dict, Iterable, List, Optional
+
+QUOTE_CURRENCY = "USD"
+
+
+def _to_decimal(value) -> Optional[Decimal]:
+    """Convert a catalogue number to Decimal, treating missing/zero values as None."""
+    if value is None:
+        return None
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        return None
+    return number if number > 0 else None
+
+
+@dataclass(frozen=True)
+class AssetSpec:
+    """Trading constraints for a single asset."""
+    id: str
+    symbol: str
+    base: str
+    quote: str
+    name: str
+    min_order_size: Optional[Decimal]
+    min_trade_increment: Optional[Decimal]
+    price_increment: Optional[Decimal]
+
+    @classmethod
+    def from_dict(cls, asset: Dict) -> "AssetSpec":
+        """Build a spec from a dict produced by asset_to_dict."""
+        symbol = asset["symbol"].upper()
+        base, _, quote = symbol.partition("/")
+        return cls(
+            id=str(asset["id"]),
+            symbol=symbol,
+            base=base,
+            quote=quote or QUOTE_CURRENCY,
+            name=asset.get("name") or symbol,
+            min_order_size=_to_decimal(asset.get("min_order_size")),
+            min_trade_increment=_to_decimal(asset.get("min_trade_increment")),
+            price_increment=_to_decimal(asset.get("price_increment")),
+        )
+
+
+@dataclass(frozen=True)
+class OrderValues:
+    """Quantity and prices after local validation and rounding."""
+    symbol: str
+    qty: Optional[float] = None
+    limit_price: Optional[float] = None
+    stop_price: Optional[float] = None
+
+
+class AssetIndex:
+    """Dictionary index over the asset catalogue for O(1) lookups."""
+
+    def __init__(self, assets: Iterable[Dict]):
+        self._by_symbol: Dict[str, AssetSpec] = {}
+        self._by_base: Dict[str, AssetSpec] = {}
+        self._by_id: Dict[str, AssetSpec] = {}
+
+        for asset in assets:
+            spec = AssetSpec.from_dict(asset)
+            self._by_symbol[spec.symbol] = spec
+            self._by_symbol[spec.base + spec.quote] = spec
+            self._by_id[spec.id] = spec
+            # Prefer the USD pair when a base currency trades against several quotes
+            if spec.base not in self._by_base or spec.quote == QUOTE_CURRENCY:
+                self._by_base[spec.base] = spec
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def symbols(self) -> List[str]:
+        """Canonical symbols ("ETH/USD") of every asset in the index."""
+        return [spec.symbol for spec in self._by_id.values()]
+
+    def lookup(self, key: str) -> Optional[AssetSpec]:
+        """
+        Resolve an asset by symbol, base currency or asset id.
+
+        Args:
+            key: "ETH/USD", "ETHUSD", "eth" or an asset id
+
+        Returns:
+            Optional[AssetSpec]: The matching asset, or None if unknown
+        """
+        key = str(key).strip()
+        upper = key.upper()
+        return (
+            self._by_symbol.get(upper)
+            or self._by_base.get(upper)
+            or self._by_id.get(key.lower())
+        )
+
+    def validate_order(
+        self,
+        key: str,
+        qty: Optional[float] = None,
+        limit_price: Optional[float] = None,
+        stop_price: Optional[float] = None
+    ) -> OrderValues:
+        """
+        Resolve the symbol and round quantity/prices to the asset's increments.
+
+        Quantities are rounded down to min_trade_increment so an order never
+        exceeds what was asked for; prices are rounded to the nearest
+        price_increment.
+
+        Args:
+            key: Symbol, base currency or asset id
+            qty: Order quantity, if the order is quantity-based
+            limit_price: Limit price, if any
+            stop_price: Stop price, if any
+
+        Returns:
+            OrderValues: Canonical symbol and rounded values
+
+        Raises:
+            ValueError: If the asset is unknown, or the quantity is not positive or below the minimum order size
+        """
+        spec = self.lookup(key)
+        if spec is None:
+            raise ValueError(f"Unknown or untradable crypto asset: {key}")
+
+        rounded_qty = None
+        if qty is not None:
+            value = Decimal(str(qty))
+            if value <= 0:
+                raise ValueError(f"Quantity must be positive, got {qty} for {spec.symbol}")
+            if spec.min_trade_increment:
+                value = (value / spec.min_trade_increment).to_integral_value(ROUND_DOWN) * spec.min_trade_increment
+            if value <= 0:
+                raise ValueError(
+                    f"Quantity {qty} rounds down to zero at the trade increment of {spec.min_trade_increment} for {spec.symbol}"
+                )
+            if spec.min_order_size and value < spec.min_order_size:
+                raise ValueError(
+                    f"Quantity {qty} is below the minimum order size of {spec.min_order_size} for {spec.symbol}"
+                )
+            rounded_qty = float(value)
+
+        return OrderValues(
+            symbol=spec.symbol,
+            qty=rounded_qty,
+            limit_price=self._round_price(spec, limit_price),
+            stop_price=self._round_price(spec, stop_price),
+        )
+
+    @staticmethod
+    def _round_price(spec: AssetSpec, price: Optional[float]) -> Optional[float]:
+        if price is None:
+            return None
+        value = Decimal(str(price))
+        if spec.price_increment:
+            value = (value / spec.price_increment).to_integral_value(ROUND_HALF_UP) * spec.price_increment
+        if value <= 0:
+            raise ValueError(f"Price {price} is not valid for {spec.symbol}")
+        return float(value)
@@ -0,0 +1,228 @@
+"""
+Broker Access Layer
+
+This module runs the blocking Alpaca SDK calls (TradingClient is built on
+`requests`) on a bounded thread pool so that a slow Alpaca round-trip never
+stalls the event loop serving every other request and agent stream.
+
+Components:
+- BrokerExecutor: bounded executor with per-call timeouts and queue metrics
+- call_broker: coroutine helper used by endpoints and agent tools; waits for
+  the credential's rate-limit token first (see rate_limit.py) and requeues
+  calls Alpaca rejects with 429
+- BrokerTimeoutError: raised when a call exceeds its timeout
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from alpaca.common.exceptions import APIError
+from .config import get_settings
+from .logging import logging
+from .metrics import broker_call_seconds
+from .tracing import get_tracer
+from .rate_limit import Priority, credential_of, get_rate_limiter, priority_for
+
+
+class BrokerTimeoutError(TimeoutError):
+    """Raised when a broker call does not complete within its timeout."""
+
+
+class BrokerExecutor:
+    """Bounded thread-pool executor for blocking broker calls."""
+
+    def __init__(self, max_workers: int, default_timeout: float):
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="alpaca-broker"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._max_queue_depth = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        timeout: Optional[float] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        Run a blocking callable on the broker pool and await its result.
+
+        Args:
+            fn: The blocking callable (usually a TradingClient method)
+            timeout: Seconds to wait for the result, defaults to BROKER_CALL_TIMEOUT
+
+        Returns:
+            Whatever the callable returns
+
+        Raises:
+            BrokerTimeoutError: If the call does not finish within the timeout
+        """
+        timeout = self.default_timeout if timeout is None else timeout
+        submitted_at = time.perf_counter()
+        state = {"started": False}
+
+        with self._lock:
+            self._queued += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queued)
+
+        def _call() -> Any:
+            started_at = time.perf_counter()
+            with self._lock:
+                state["started"] = True
+                self._queued -= 1
+                self._in_flight += 1
+                self._total_wait += started_at - submitted_at
+            try:
+                result = fn(*args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self._failed += 1
+                raise
+            else:
+                with self._lock:
+                    self._completed += 1
+                return result
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                    self._total_run += time.perf_counter() - started_at
+
+        loop = asyncio.get_running_loop()
+        # Carry the caller's context (log correlation ids) into the worker thread
+        future = loop.run_in_executor(self._executor, contextvars.copy_context().run, _call)
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timeouts += 1
+            raise BrokerTimeoutError(
+                f"Broker call {getattr(fn, '__name__', repr(fn))} timed out after {timeout:.1f}s"
+            )
+        finally:
+            # A call cancelled before a worker picked it up never decrements the queue
+            if future.cancelled():
+                with self._lock:
+                    if not state["started"]:
+                        state["started"] = True
+                        self._queued -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Return a snapshot of queue depth, concurrency and latency counters."""
+        with self._lock:
+            started = self._completed + self._failed
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self._queued,
+                "max_queue_depth": self._max_queue_depth,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timeouts": self._timeouts,
+                "avg_queue_wait_ms": (self._total_wait / started * 1000) if started else 0.0,
+                "avg_run_ms": (self._total_run / started * 1000) if started else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        """Stop accepting calls and release the worker threads."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_broker_executor: Optional[BrokerExecutor] = None
+_broker_lock = threading.Lock()
+
+def get_broker_executor() -> BrokerExecutor:
+    """Get the process-wide broker executor, creating it from settings on first use."""
+    global _broker_executor
+    if _broker_executor is None:
+        with _broker_lock:
+            if _broker_executor is None:
+                settings = get_settings()
+                _broker_executor = BrokerExecutor(
+                    max_workers=settings.BROKER_MAX_WORKERS,
+                    default_timeout=settings.BROKER_CALL_TIMEOUT
+                )
+    return _broker_executor
+
+async def call_broker(
+    fn: Callable[..., Any],
+    *args: Any,
+    timeout: Optional[float] = None,
+    priority: Optional[Priority] = None,
+    **kwargs: Any
+) -> Any:
+    """
+    Run a blocking broker call off the event loop. See BrokerExecutor.run.
+    
+    The call first waits for a token from its credential's rate-limit bucket
+    (order actions ahead of reads by default). If Alpaca still answers 429,
+    the call is queued again, up to BROKER_RATE_LIMIT_MAX_RETRIES times.
+    
+    Args:
+        fn: The blocking callable (usually a bound TradingClient method)
+        timeout: Seconds to wait for the call itself, defaults to BROKER_CALL_TIMEOUT
+        priority: Scheduling class, defaults to ORDER for order actions and READ otherwise
+    """
+    method = getattr(fn, "__name__", "unknown")
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with get_tracer().span(f"alpaca {method}", kind="client", attributes={"alpaca.method": method}):
+            result = await _call_broker(fn, *args, timeout=timeout, priority=priority, **kwargs)
+        outcome = "success"
+        return result
+    except BrokerTimeoutError:
+        outcome = "timeout"
+        raise
+    finally:
+        broker_call_seconds.observe(time.perf_counter() - started, method, outcome)
+
+async def _call_broker(
+    fn: Callable[..., Any],
+    *args: Any,
+    timeout: Optional[float] = None,
+    priority: Optional[Priority] = None,
+    **kwargs: Any
+) -> Any:
+    settings = get_settings()
+    executor = get_broker_executor()
+    if not settings.BROKER_RATE_LIMIT_ENABLED:
+        return await executor.run(fn, *args, timeout=timeout, **kwargs)
+    
+    limiter = get_rate_limiter()
+    credential = credential_of(fn)
+    priority = priority_for(fn) if priority is None else priority
+    for attempt in range(settings.BROKER_RATE_LIMIT_MAX_RETRIES + 1):
+        await limiter.acquire(credential, priority)
+        try:
+            return await executor.run(fn, *args, timeout=timeout, **kwargs)
+        except APIError as e:
+            if e.status_code != 429 or attempt == settings.BROKER_RATE_LIMIT_MAX_RETRIES:
+                raise
+            logging.warning_with_emoji("⏳ Broker call %s rate limited, requeueing", getattr(fn, '__name__', repr(fn)))
+
+def shutdown_broker_executor() -> None:
+    """Shut down the broker executor (called on application shutdown)."""
+    global _broker_executor
+    if _broker_executor is not None:
+        _broker_executor.shutdown()
+        _broker_executor = None
@@ -24,11 +24,16 @@ Social Media:
 """
 
 import os
+import hashlib
 import logging
-from typing import Optional, Dict
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 from alpaca.trading.client import TradingClient
+from .transport import BrokerTransport
 
 
 class Settings(BaseSettings):
@@ -42,6 +47,89 @@ class Settings(BaseSettings):
     # Logging Settings
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    LOG_JSON: bool = False  # One JSON object per line, with request and session ids
+    REQUEST_LOG_SAMPLE_RATE: float = 1.0  # Fraction of requests logged; errors and slow requests always are
+    REQUEST_LOG_SLOW_MS: float = 1000.0
+    
+    # Tracing Settings
+    TRACING_ENABLED: bool = True
+    TRACE_SAMPLE_RATE: float = 1.0
+    TRACE_BUFFER_SIZE: int = 100  # Finished traces kept for /debug/traces
+    TRACE_EXPORTER: str = "none"  # "none", "console" or "file" (OTLP/JSON lines)
+    TRACE_EXPORT_PATH: str = "traces.jsonl"
+    
+    # LLM Settings
+    LLM_BASE_URL: Optional[str] = None  # OpenAI-compatible endpoint for agents and the summarizer
+    
+    # Broker Settings
+    ALPACA_URL_OVERRIDE: Optional[str] = None  # Stand-in Alpaca server, e.g. the benchmark mock
+    BROKER_MAX_WORKERS: int = 16
+    BROKER_CALL_TIMEOUT: float = 15.0
+    TRADING_CLIENT_POOL_SIZE: int = 256
+    TRADING_CLIENT_IDLE_TIMEOUT: float = 1800.0
+    
+    # Broker HTTP Transport Settings
+    BROKER_HTTP_MAX_CONNECTIONS: int = 32
+    BROKER_HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    BROKER_HTTP_MAX_RETRIES: int = 2
+    BROKER_HTTP_BACKOFF_FACTOR: float = 0.3
+    
+    # Broker Rate Limit Settings
+    BROKER_RATE_LIMIT_ENABLED: bool = True
+    BROKER_RATE_LIMIT_PER_MINUTE: int = 200  # Alpaca's default per-key quota
+    BROKER_RATE_LIMIT_BURST: int = 20
+    BROKER_RATE_LIMIT_MAX_RETRIES: int = 3
+    
+    # Order Intent Fast Path Settings
+    ORDER_INTENT_FAST_PATH: bool = True
+    ORDER_INTENT_MIN_CONFIDENCE: float = 0.9
+    
+    # Batch Order Settings
+    BATCH_ORDER_MAX_LEGS: int = 10
+    BATCH_ORDER_CONCURRENCY: int = 4
+    
+    # Order Idempotency Settings
+    ORDER_DEDUP_TTL: float = 300.0
+    
+    # Position Snapshot Settings
+    POSITION_SNAPSHOT_TTL: float = 5.0
+    
+    # Trade Updates Settings
+    TRADE_UPDATES_ENABLED: bool = True
+    TRADE_UPDATES_SOURCE: str = "alpaca"  # "alpaca" or "replay"
+    TRADE_UPDATES_REPLAY_PATH: str = ""
+    TRADE_UPDATES_MAX_ORDERS: int = 1000
+    
+    # Market Data Settings
+    MARKET_DATA_ENABLED: bool = True
+    MARKET_DATA_SOURCE: str = "alpaca"  # "alpaca" or "replay"
+    MARKET_DATA_REPLAY_PATH: str = ""
+    QUOTE_MAX_AGE: float = 30.0  # Older quotes are not used for order checks
+    LIMIT_PRICE_MAX_DEVIATION: float = 0.2  # Reject limits this far through the market
+    
+    # Agent Response Cache Settings
+    RESPONSE_CACHE_TTL: float = 30.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    
+    # Streaming Settings
+    STREAM_HEARTBEAT_INTERVAL: float = 15.0
+    
+    # Conversation Memory Settings
+    MEMORY_MAX_MESSAGES: int = 50
+    MEMORY_TOKEN_BUDGET: int = 4000
+    MEMORY_MAX_SESSIONS: int = 1000
+    MEMORY_MAX_TOTAL_TOKENS: int = 2_000_000
+    MEMORY_SESSION_TTL: float = 3600.0
+    MEMORY_SUMMARY_TRIGGER_TOKENS: int = 2500
+    MEMORY_SUMMARY_KEEP_TOKENS: int = 1000
+    MEMORY_SUMMARY_MODEL: str = "gpt-4o-mini"
+    MEMORY_BACKEND: str = "sqlite"  # "sqlite" or "memory"
+    MEMORY_SQLITE_PATH: str = "data/memory.db"
+    MEMORY_WRITE_BATCH_SIZE: int = 64
+    MEMORY_FLUSH_INTERVAL: float = 0.25
+    
+    # Cache Settings
+    ASSET_CACHE_TTL: float = 3600.0
     
     class Config:
         """Pydantic config for environment variable loading."""
@@ -60,46 +148,165 @@ def setup_logging(settings: Settings) -> None:
         format=settings.LOG_FORMAT
     )
 
-# Cache for the TradingClient instance
-_trading_client_instance = None
+def credential_fingerprint(secret: str) -> str:
+    """Derive a short, non-reversible identifier for a credential (safe to log and use as a cache key)."""
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16]
+
+class TradingClientPool:
+    """
+    Keyed pool of TradingClient instances, one entry per credential set.
+    
+    Entries are kept in LRU order; the least recently used client is evicted
+    once the pool is full, and clients idle for longer than idle_timeout are
+    torn down on the next access. Every client mounts the same transport,
+    so connections are shared across credential sets.
+    """
+    
+    def __init__(self, max_size: int, idle_timeout: float, transport: BrokerTransport, url_override: Optional[str] = None):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.transport = transport
+        self.url_override = url_override
+        self._clients: "OrderedDict[Tuple[str, str], Tuple[TradingClient, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+    
+    def get(self, api_keys: Dict[str, str]) -> TradingClient:
+        """
+        Resolve the client for a credential set, creating it on first use.
+        
+        Args:
+            api_keys: Dictionary containing alpaca_api_key and alpaca_secret_key
+            
+        Returns:
+            TradingClient: Pooled client for these credentials
+        """
+        key = (api_keys["alpaca_api_key"], api_keys["alpaca_secret_key"])
+        now = time.monotonic()
+        
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients[key] = (entry[0], now)
+                self._clients.move_to_end(key)
+                self._stats["hits"] += 1
+                self._expire_idle(now)
+                return entry[0]
+            
+            self._stats["misses"] += 1
+            client = self._build_client(*key)
+            self._clients[key] = (client, now)
+            self._expire_idle(now)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+                self._stats["evictions"] += 1
+            return client
+    
+    def discard(self, api_keys: Dict[str, str]) -> None:
+        """Drop the client for a credential set (e.g. after the keys were rotated)."""
+        with self._lock:
+            self._clients.pop((api_keys["alpaca_api_key"], api_keys["alpaca_secret_key"]), None)
+    
+    def clear(self) -> None:
+        """Drop every pooled client."""
+        with self._lock:
+            self._clients.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        """Return pool size and hit/miss/eviction counters."""
+        with self._lock:
+            return {**self._stats, "size": len(self._clients), "max_size": self.max_size}
+    
+    def _build_client(self, api_key: str, secret_key: str) -> TradingClient:
+        client = TradingClient(
+            api_key=api_key,
+            secret_key=secret_key,
+            paper=True,
+            url_override=self.url_override
+        )
+        # Route every client through the shared connection pool
+        client._session.mount("https://", self.transport)
+        client._session.mount("http://", self.transport)
+        # 429s are requeued by the rate limiter instead of slept on in a worker thread
+        client._retry_codes = [code for code in client._retry_codes if code != 429]
+        return client
+    
+    def _expire_idle(self, now: float) -> None:
+        # The least recently used entry is first, so stop at the first active one.
+        # Connections belong to the shared transport, so dropping the client is enough.
+        while self._clients:
+            key, (_, last_used) = next(iter(self._clients.items()))
+            if now - last_used <= self.idle_timeout:
+                break
+            del self._clients[key]
+            self._stats["expired"] += 1
+
+# Pool of TradingClient instances keyed by credentials
+_trading_client_pool: Optional[TradingClientPool] = None
+_pool_lock = threading.Lock()
+
+# Credentials used when a caller does not pass any keys
+_default_api_keys: Optional[Dict[str, str]] = None
+
+def get_trading_client_pool() -> TradingClientPool:
+    """Get the process-wide TradingClient pool, creating it from settings on first use."""
+    global _trading_client_pool
+    if _trading_client_pool is None:
+        # Imported here: rate_limit and tracing depend on this module for settings
+        from .rate_limit import get_rate_limiter
+        from .tracing import get_tracer
+        with _pool_lock:
+            if _trading_client_pool is None:
+                settings = get_settings()
+                _trading_client_pool = TradingClientPool(
+                    max_size=settings.TRADING_CLIENT_POOL_SIZE,
+                    idle_timeout=settings.TRADING_CLIENT_IDLE_TIMEOUT,
+                    transport=BrokerTransport(
+                        max_connections=settings.BROKER_HTTP_MAX_CONNECTIONS,
+                        keepalive_expiry=settings.BROKER_HTTP_KEEPALIVE_EXPIRY,
+                        max_retries=settings.BROKER_HTTP_MAX_RETRIES,
+                        backoff_factor=settings.BROKER_HTTP_BACKOFF_FACTOR,
+                        response_hook=get_rate_limiter().observe_response,
+                        tracer=get_tracer()
+                    ),
+                    url_override=settings.ALPACA_URL_OVERRIDE
+                )
+    return _trading_client_pool
 
 def initialize_trading_client(api_keys: Dict[str, str]) -> None:
     """
-    Initialize the global TradingClient instance.
+    Warm the pool for a credential set and make it the default.
     
     Args:
         api_keys: Dictionary containing alpaca_api_key and alpaca_secret_key
     """
-    global _trading_client_instance
-    _trading_client_instance = TradingClient(
-        api_key=api_keys["alpaca_api_key"],
-        secret_key=api_keys["alpaca_secret_key"],
-        paper=True
-    )
+    global _default_api_keys
+    get_trading_client_pool().get(api_keys)
+    _default_api_keys = api_keys
 
 def get_trading_client(api_keys: Dict[str, str] = None) -> TradingClient:
     """
-    Get the cached TradingClient instance.
+    Get the pooled TradingClient for a credential set.
     
     Args:
-        api_keys: Optional dictionary containing API keys for initialization if needed
+        api_keys: Dictionary containing API keys; falls back to the default
+            credentials set by initialize_trading_client
         
     Returns:
-        TradingClient: Cached instance of the Alpaca TradingClient
+        TradingClient: Pooled instance of the Alpaca TradingClient
         
     Raises:
-        RuntimeError: If trading client is not initialized
+        RuntimeError: If no keys were given and no default credentials exist
     """
-    global _trading_client_instance
-    
-    if _trading_client_instance is None:
-        if api_keys is None:
+    if api_keys is None:
+        if _default_api_keys is None:
             raise RuntimeError("Trading client not initialized")
-        initialize_trading_client(api_keys)
+        api_keys = _default_api_keys
     
-    return _trading_client_instance
+    return get_trading_client_pool().get(api_keys)
 
 def reset_trading_client() -> None:
-    """Reset the cached TradingClient instance."""
-    global _trading_client_instance
-    _trading_client_instance = None
+    """Drop every pooled TradingClient and the default credentials."""
+    global _default_api_keys
+    _default_api_keys = None
+    get_trading_client_pool().clear()
@@ -0,0 +1,185 @@
+"""
+Idempotent Order Submission
+
+This module makes order placement safe to retry. Every order gets a
+deterministic client_order_id derived from the account, the chat turn that
+asked for it (session plus a turn id) and the leg (the order's parameters
+and its position in a batch). A retried tool call, a model retry that
+repeats the same tool call, or a client resending a request with the same
+request_id therefore produces the same id, and OrderDedupStore returns the
+order that was already placed instead of sending it again. A request
+without a request_id is a turn of its own, so repeating a command on
+purpose always places a new order.
+
+Components:
+- turn_id / order_scope: identify the chat turn an order belongs to
+- client_order_id: deterministic id for one leg of one turn
+- OrderDedupStore: TTL store of submitted (and in-flight) orders by client_order_id
+
+If a submission times out, the order may still have reached Alpaca. The next
+attempt with the same id first asks Alpaca for it by client_order_id. Alpaca
+also rejects duplicate client_order_ids, and that rejection is resolved the
+same way.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import hashlib
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from alpaca.common.exceptions import APIError
+from app.core.logging import logging
+from app.core.config import get_settings
+from app.core.broker import BrokerTimeoutError
+
+# RunnableConfig["configurable"] key that carries the order scope into tools
+ORDER_SCOPE_KEY = "order_scope"
+CLIENT_ORDER_ID_PREFIX = "kryptt-"
+
+OrderCall = Callable[[], Awaitable[Any]]
+
+
+def turn_id(request_id: Optional[str] = None) -> str:
+    """
+    Identify one chat turn (or one REST request).
+
+    A client-supplied request id wins, so a resent request is a retry of the
+    same turn; otherwise every call mints a new id.
+    """
+    return request_id or uuid.uuid4().hex
+
+
+def order_scope(session_id: str, turn: str) -> str:
+    """Scope shared by every order placed while handling one turn."""
+    return f"{session_id}|{turn}"
+
+
+def scope_from_config(config: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Read the order scope a caller put in a tool's RunnableConfig."""
+    if not config:
+        return None
+    return (config.get("configurable") or {}).get(ORDER_SCOPE_KEY)
+
+
+def order_leg_key(request: Any, leg: Optional[int] = None) -> str:
+    """Canonical description of an order request (and its index in a batch)."""
+    fields = [
+        request.symbol,
+        getattr(request.side, "value", request.side),
+        getattr(request.type, "value", request.type),
+        request.qty,
+        request.notional,
+        getattr(request.time_in_force, "value", request.time_in_force),
+        getattr(request, "limit_price", None),
+        getattr(request, "stop_price", None),
+        leg,
+    ]
+    return "|".join("" if field is None else str(field) for field in fields)
+
+
+def client_order_id(account: Optional[str], scope: str, leg_key: str) -> str:
+    """Deterministic Alpaca client_order_id for one leg of one turn."""
+    digest = hashlib.sha256(f"{account}|{scope}|{leg_key}".encode()).hexdigest()[:32]
+    return f"{CLIENT_ORDER_ID_PREFIX}{digest}"
+
+
+def is_duplicate_rejection(error: Exception) -> bool:
+    """Whether Alpaca rejected a submission because the client_order_id was already used."""
+    return isinstance(error, APIError) and "client_order_id" in str(error).lower()
+
+
+class OrderDedupStore:
+    """
+    Orders by client_order_id, kept for a TTL after submission.
+
+    Concurrent submissions of the same id share one broker call. Failed
+    submissions are forgotten so they can be retried, except that a
+    timed-out one is remembered as uncertain and looked up before the retry.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, asyncio.Task]] = {}
+        self._uncertain: Dict[str, float] = {}
+        self._stats = {"submitted": 0, "deduplicated": 0, "recovered": 0, "timeouts": 0}
+
+    async def submit(self, client_order_id: str, submit: OrderCall, recover: OrderCall) -> Tuple[Any, bool]:
+        """
+        Submit an order once per client_order_id.
+
+        Args:
+            client_order_id: The order's deterministic id
+            submit: Coroutine factory that submits the order
+            recover: Coroutine factory that fetches the order by client_order_id
+
+        Returns:
+            Tuple[Order, bool]: The order, and whether it had already been placed
+
+        Raises:
+            Exception: Whatever the submission raised
+        """
+        self._purge()
+        entry = self._entries.get(client_order_id)
+        if entry is not None:
+            task = entry[1]
+            # A finished submission can be reused anywhere; an in-flight one only from its own loop
+            if task.done() or task.get_loop() is asyncio.get_running_loop():
+                self._stats["deduplicated"] += 1
+                logging.info_with_emoji("♻️ Order %s was already placed, not resubmitting", client_order_id)
+                order, _ = task.result() if task.done() else await asyncio.shield(task)
+                return order, True
+
+        task = asyncio.create_task(self._submit(client_order_id, submit, recover))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        task.add_done_callback(lambda t: self._forget_failed(client_order_id, t))
+        self._entries[client_order_id] = (time.monotonic() + self.ttl, task)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of remembered orders and dedup counters."""
+        return {**self._stats, "entries": len(self._entries), "uncertain": len(self._uncertain), "ttl": self.ttl}
+
+    async def _submit(self, client_order_id: str, submit: OrderCall, recover: OrderCall) -> Tuple[Any, bool]:
+        if self._uncertain.pop(client_order_id, None) is not None:
+            # The last attempt timed out and may have reached Alpaca
+            try:
+                order = await recover()
+                self._stats["recovered"] += 1
+                return order, True
+            except Exception:
+                pass
+        try:
+            order = await submit()
+        except BrokerTimeoutError:
+            self._stats["timeouts"] += 1
+            self._uncertain[client_order_id] = time.monotonic() + self.ttl
+            raise
+        except Exception as e:
+            if not is_duplicate_rejection(e):
+                raise
+            self._stats["recovered"] += 1
+            return await recover(), True
+        self._stats["submitted"] += 1
+        return order, False
+
+    def _forget_failed(self, client_order_id: str, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is not None:
+            entry = self._entries.get(client_order_id)
+            if entry is not None and entry[1] is task:
+                del self._entries[client_order_id]
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, (expires_at, task) in self._entries.items() if expires_at <= now and task.done()]:
+            del self._entries[key]
+        for key in [key for key, expires_at in self._uncertain.items() if expires_at <= now]:
+            del self._uncertain[key]
+
+
+# Global instance
+order_dedup = OrderDedupStore(ttl=get_settings().ORDER_DEDUP_TTL)
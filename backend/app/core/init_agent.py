@@ -8,8 +8,10 @@ Date: January 2024
 
 from fastapi import HTTPException
 from app.core.logging import logging
+from app.core.metrics import agent_callback
+from app.core.config import get_settings
 from app.api.v1.settings import api_keys_store
-from typing import List, Callable, Optional
+from typing import Dict, List, Callable, Optional
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
 from langchain_core.tools import BaseTool
@@ -32,7 +34,8 @@ def setup_base_agent(
     system_prompt: str,
     model: str = "gpt-4o",
     temperature: float = 0.1,
-    max_retries: int = 2
+    max_retries: int = 2,
+    api_keys: Optional[Dict[str, str]] = None
 ) -> any:
     """
     Sets up and returns an agent with proper error handling.
@@ -44,6 +47,7 @@ def setup_base_agent(
         model: The LLM model to use
         temperature: Model temperature (0-1)
         max_retries: Maximum number of retries for API calls
+        api_keys: Keys to build the LLM client with (defaults to the stored keys)
         
     Returns:
         The configured agent
@@ -51,7 +55,7 @@ def setup_base_agent(
     Raises:
         HTTPException: If API keys are not configured or other setup errors occur
     """
-    logging.info_with_emoji(f"🤖 Setting up {agent_name}...")
+    logging.info_with_emoji("🤖 Setting up %s...", agent_name)
     
     try:
         # Create config
@@ -65,16 +69,22 @@ def setup_base_agent(
         )
         
         # Validate API keys
-        if "current" not in api_keys_store:
+        if api_keys is None and "current" not in api_keys_store:
             logging.error_with_emoji("🔑 API keys not found in store")
             raise HTTPException(
                 status_code=404,
                 detail="API keys not configured"
             )
             
-        keys = api_keys_store["current"]
+        keys = api_keys if api_keys is not None else api_keys_store["current"]
         logging.info_with_emoji("🔑 API keys retrieved successfully")
         
+        # Model and tool runs report latency and token usage. The callbacks are attached
+        # locally because a run's config (e.g. astream_events) replaces graph-level ones.
+        metrics_callback = agent_callback(config.agent_name)
+        for agent_tool in config.tools:
+            agent_tool.callbacks = [metrics_callback]
+        
         # Initialize LLM
         logging.info_with_emoji("🧠 Initializing ChatOpenAI model...")
         llm = ChatOpenAI(
@@ -84,10 +94,12 @@ def setup_base_agent(
             max_tokens=None,
             timeout=None,
             max_retries=config.max_retries,
+            base_url=get_settings().LLM_BASE_URL,
+            callbacks=[metrics_callback],
         )
         
         # Create agent
-        logging.info_with_emoji(f"🛠️ Creating {config.agent_name}...")
+        logging.info_with_emoji("🛠️ Creating %s...", config.agent_name)
         agent = create_react_agent(
             model=llm,
             tools=config.tools,
@@ -95,14 +107,14 @@ def setup_base_agent(
             prompt=config.system_prompt
         )
         
-        logging.info_with_emoji(f"✅ {config.agent_name} setup completed successfully")
+        logging.info_with_emoji("✅ %s setup completed successfully", config.agent_name)
         return agent
         
     except HTTPException as he:
-        logging.error_with_emoji(f"❌ HTTP Exception during agent setup: {str(he)}")
+        logging.error_with_emoji("❌ HTTP Exception during agent setup: %s", he)
         raise he
     except Exception as e:
-        logging.error_with_emoji(f"❌ Unexpected error during agent setup: {str(e)}")
+        logging.error_with_emoji("❌ Unexpected error during agent setup: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to setup {agent_name}: {str(e)}"
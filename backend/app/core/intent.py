@@ -0,0 +1,253 @@
+"""
+Order Intent Parser
+
+This module recognizes simple order commands ("Buy 0.1 ETH", "Sell 0.05 BTC at
+$70k", "Set a stop loss order for 0.1 BTC at $40000") without an LLM. The order
+agent dispatches confident parses straight to its order tools and falls back
+to the ReAct loop for anything ambiguous: questions, negations, multi-leg
+requests, pronouns, unknown words or conflicting numbers.
+
+Prices are only read right after "at", "@", "limit" or "stop"; any other
+extra number, a "for $N" amount, a number with a comma or any character
+outside the grammar (a percent sign, a minus sign, ...) sends the message
+to the LLM. Confidence starts at 1.0 and drops for every word the grammar
+does not know and when the symbol could not be checked against the asset
+catalogue (then only the common tickers are accepted at all).
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Anything the grammar does not know ("%", "-", "$" without a number, ...) is an "other" token
+TOKEN_PATTERN = re.compile(r"\$?\d[\d,]*(?:\.\d+)?k?|\.\d+|[a-z]+(?:/[a-z]+)?|[@?]|(?P<other>\S)")
+
+ALIASES = {"bitcoin": "btc", "ethereum": "eth", "ether": "eth", "solana": "sol", "dogecoin": "doge", "litecoin": "ltc"}
+SIDES = {"buy": "buy", "purchase": "buy", "sell": "sell"}
+PRICE_MARKERS = {"at", "@"}
+CURRENCY_WORDS = {"usd", "dollars", "dollar", "bucks"}
+FILLER = {
+    "please", "place", "put", "submit", "create", "make", "execute", "open", "new", "quick",
+    "a", "an", "the", "order", "orders", "trade", "to", "me", "for", "of", "in", "some",
+    "worth", "now", "i", "want", "would", "like", "go", "set", "with", "price", "crypto",
+    "coin", "coins", "kryptt", "hey", "hi", "pls", "plz", "gtc", "market",
+}
+# Words that make a request conditional, negated, multi-step or relative; always left to the LLM
+BLOCKERS = {
+    "?", "not", "don", "dont", "never", "cancel", "close", "if", "when", "and", "then", "or", "but",
+    "should", "could", "can", "what", "how", "why", "which", "all", "half", "everything",
+    "it", "that", "this", "them", "those", "more", "same", "again", "another", "percent",
+    "each", "every", "above", "below", "than", "after", "before", "until", "instead",
+}
+# Words that keep a keyword's price slot open: "stop at 40000", "stop loss 40000"
+SLOT_CONTINUATIONS = {"at", "@", "loss", "price"}
+# Punctuation that never changes an order; every other unknown character sends the message to the LLM
+SEPARATORS = {".", ",", "!", "'"}
+
+UNKNOWN_WORD_PENALTY = 0.25
+UNVERIFIED_SYMBOL_PENALTY = 0.05
+UNVERIFIED_SYMBOLS = set(ALIASES.values())
+TICKER_PATTERN = re.compile(r"^[a-z]{2,6}(?:/usd[a-z]?)?$")
+
+
+@dataclass(frozen=True)
+class OrderIntent:
+    """A parsed order command and how confident the parser is about it."""
+    side: str
+    symbol: str
+    order_type: str  # "market", "limit", "stop" or "stop_limit"
+    qty: Optional[float] = None
+    notional: Optional[float] = None
+    limit_price: Optional[float] = None
+    stop_price: Optional[float] = None
+    confidence: float = 1.0
+
+    def tool_call(self) -> Tuple[str, Dict[str, Any]]:
+        """
+        Map the intent onto the order tool the agent would have picked.
+
+        Returns:
+            Tuple[str, Dict]: Tool name and its arguments
+        """
+        if self.order_type == "market" and self.qty is not None:
+            return "quick_crypto_order", {"action": self.side, "quantity": self.qty, "crypto": self.symbol}
+
+        # Alpaca crypto orders accept gtc/ioc only, not the tool's "day" default
+        args: Dict[str, Any] = {"symbol": self.symbol, "side": self.side, "type": self.order_type, "time_in_force": "gtc"}
+        if self.qty is not None:
+            args["qty"] = self.qty
+        if self.notional is not None:
+            args["notional"] = self.notional
+        if self.limit_price is not None:
+            args["limit_price"] = self.limit_price
+        if self.stop_price is not None:
+            args["stop_price"] = self.stop_price
+        return "create_new_order", args
+
+    def describe(self) -> str:
+        """Human-readable summary, e.g. 'limit buy order for 0.2 ETH (limit 2000)'."""
+        amount = f"${self.notional:g} of" if self.notional is not None else f"{self.qty:g}"
+        text = f"{self.order_type.replace('_', '-')} {self.side} order for {amount} {self.symbol}"
+        prices = []
+        if self.stop_price is not None:
+            prices.append(f"stop {self.stop_price:g}")
+        if self.limit_price is not None:
+            prices.append(f"limit {self.limit_price:g}")
+        return f"{text} ({', '.join(prices)})" if prices else text
+
+
+def _to_number(token: str) -> Optional[float]:
+    token = token.lstrip("$").replace(",", "")
+    multiplier = 1000.0 if token.endswith("k") else 1.0
+    try:
+        return float(token.rstrip("k")) * multiplier
+    except ValueError:
+        return None
+
+
+def parse_order_intent(
+    message: str,
+    is_known_symbol: Optional[Callable[[str], bool]] = None
+) -> Optional[OrderIntent]:
+    """
+    Parse a simple buy/sell/limit/stop command.
+
+    Args:
+        message: The user's chat message
+        is_known_symbol: Checks a candidate symbol against the asset catalogue, when it is loaded
+
+    Returns:
+        Optional[OrderIntent]: The parsed intent, or None if the message is not a simple order
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(message.lower()):
+        if match.lastgroup == "other":
+            # "50%", "-0.5" or "at -2000" would otherwise lose their sign or unit
+            if match.group() not in SEPARATORS:
+                return None
+            continue
+        tokens.append(match.group())
+    if not tokens:
+        return None
+
+    side = None
+    symbol = None
+    qty = None
+    notional = None
+    prices: Dict[str, Optional[float]] = {"limit": None, "stop": None, "any": None}
+    has_limit = has_stop = stop_loss = False
+    slot: Optional[str] = None
+    unknown = 0
+
+    for index, token in enumerate(tokens):
+        if token in BLOCKERS:
+            return None
+
+        number = _to_number(token) if token[0] in "$.0123456789" else None
+        if number is not None:
+            # "1,5" may be a decimal comma or a thousands separator; never guess
+            if number <= 0 or "," in token:
+                return None
+            following = tokens[index + 1] if index + 1 < len(tokens) else ""
+            monetary = token.startswith("$") or following in CURRENCY_WORDS
+            if slot is not None:
+                if prices[slot] is not None:
+                    return None
+                prices[slot] = number
+            elif monetary and notional is None and qty is None and side is not None and symbol is None:
+                # "buy $100 of BTC": a dollar amount before the asset is a notional order
+                notional = number
+            elif not monetary and qty is None and notional is None:
+                qty = number
+            else:
+                # Prices only count right after at/@/limit/stop; "buy 2 eth 3" or "for $2000" is ambiguous
+                return None
+            slot = None
+            continue
+
+        if token in SLOT_CONTINUATIONS and slot is not None:
+            stop_loss = stop_loss or token == "loss"
+            continue
+        if token in PRICE_MARKERS:
+            slot = "any"
+            continue
+        slot = None
+
+        if token in SIDES:
+            if side is not None and side != SIDES[token]:
+                return None
+            side = SIDES[token]
+        elif token == "limit":
+            has_limit, slot = True, "limit"
+        elif token == "stop":
+            has_stop, slot = True, "stop"
+        elif token == "loss":
+            stop_loss = True
+        elif token in FILLER or token in CURRENCY_WORDS:
+            continue
+        elif symbol is None and (token in ALIASES or TICKER_PATTERN.match(token)):
+            symbol = ALIASES.get(token, token)
+        else:
+            unknown += 1
+
+    if stop_loss and not has_stop:
+        return None
+    if side is None and stop_loss:
+        side = "sell"
+    if side is None or symbol is None or (qty is None) == (notional is None):
+        return None
+
+    limit_price, stop_price, any_price = prices["limit"], prices["stop"], prices["any"]
+    if has_stop and has_limit:
+        order_type = "stop_limit"
+        if any_price is not None:
+            if stop_price is None and limit_price is not None:
+                stop_price = any_price
+            elif limit_price is None and stop_price is not None:
+                limit_price = any_price
+            else:
+                return None
+        if stop_price is None or limit_price is None:
+            return None
+    elif has_stop:
+        order_type = "stop"
+        stop_price = stop_price if stop_price is not None else any_price
+        if stop_price is None or (any_price is not None and any_price != stop_price):
+            return None
+    elif has_limit or any_price is not None:
+        order_type = "limit"
+        limit_price = limit_price if limit_price is not None else any_price
+        if limit_price is None or (prices["limit"] is not None and any_price is not None):
+            return None
+    else:
+        order_type = "market"
+
+    # Alpaca only accepts notional amounts on market orders
+    if notional is not None and order_type != "market":
+        return None
+
+    confidence = 1.0 - unknown * UNKNOWN_WORD_PENALTY
+    symbol = symbol.upper()
+    if is_known_symbol is None:
+        # Without the catalogue only the common tickers are trusted
+        if symbol.lower() not in UNVERIFIED_SYMBOLS:
+            return None
+        confidence -= UNVERIFIED_SYMBOL_PENALTY
+    elif not is_known_symbol(symbol):
+        return None
+
+    return OrderIntent(
+        side=side,
+        symbol=symbol,
+        order_type=order_type,
+        qty=qty,
+        notional=notional,
+        limit_price=limit_price,
+        stop_price=stop_price,
+        confidence=round(max(confidence, 0.0), 2)
+    )
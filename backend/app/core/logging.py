@@ -2,7 +2,14 @@
 Logging Configuration
 
 This module configures logging for the API, including request/response logging
-and general application logging.
+and general application logging. Request logging is a pure ASGI middleware
+that also records per-route latency histograms (see request_metrics).
+
+Records are put on an in-memory queue by the calling code and formatted and
+written by a QueueListener thread, so log I/O and message formatting stay
+off the event loop. Every record carries the request and session correlation
+ids of the code that emitted it; LOG_JSON switches the output to one JSON
+object per line.
 
 Project: Kryptt
 Author: Jon
@@ -10,12 +17,19 @@ Social Media:
 - Twitter: @jondoescoding
 """
 
+import atexit
+import json
 import logging
+import queue
 import time
-from typing import Any, Dict
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from .config import Settings
+import uuid
+from bisect import bisect_left
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from random import random
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .config import Settings, get_settings
 
 # Emoji constants for different log types
 LOG_EMOJIS = {
@@ -51,79 +65,335 @@ def mask_sensitive_data(data: Dict[str, Any]) -> Dict[str, Any]:
     
     return recursive_mask(masked_data)
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware for logging HTTP requests and responses."""
+# Correlation ids of the code currently running; copied into every log record
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+session_id_var: ContextVar[Optional[str]] = ContextVar("session_id", default=None)
+REQUEST_ID_HEADER = "x-request-id"
+
+def bind_session(session_id: str) -> None:
+    """Tag the log records of the current request with a chat session id."""
+    session_id_var.set(session_id)
+
+class CorrelationFilter(logging.Filter):
+    """Stamps records with the request and session ids of the emitting context."""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.session_id = session_id_var.get()
+        return True
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+    
+    The stock handler formats the message before enqueueing it, which is the
+    work the queue is meant to take off the caller. Records are enqueued as
+    they are; their arguments are interpolated when the listener writes them,
+    so callers must not mutate objects they passed as log arguments.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class EmojiFormatter(logging.Formatter):
+    """Text formatter that puts the record's emoji (see info_with_emoji) in front of the message."""
+    
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        emoji = getattr(record, "emoji", None)
+        if emoji:
+            record.message = f"{emoji} {record.message}"
+        return super().formatMessage(record)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with correlation ids when they are set."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in ("request_id", "session_id"):
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, float("inf"))
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+    
+    __slots__ = ("counts", "count", "total", "max")
+    
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def observe(self, value_ms: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile (None if empty)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, round(self.max, 3))
+        return self.max
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max, 3),
+        }
+
+class RequestMetrics:
+    """
+    Per-route latency histograms for time to first byte and time to last byte.
+    
+    Routes are keyed by method and path template ("/api/v1/orders/{order_id}"),
+    so path parameters do not multiply the number of series.
+    """
+    
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    
+    def observe(self, method: str, route: str, status: int, ttfb_ms: float, ttlb_ms: float) -> None:
+        entry = self.routes.get((method, route))
+        if entry is None:
+            entry = self.routes[(method, route)] = {"ttfb": LatencyHistogram(), "ttlb": LatencyHistogram(), "status": {}}
+        entry["ttfb"].observe(ttfb_ms)
+        entry["ttlb"].observe(ttlb_ms)
+        status_class = f"{status // 100}xx"
+        entry["status"][status_class] = entry["status"].get(status_class, 0) + 1
+    
+    def reset(self) -> None:
+        self.routes.clear()
     
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Per-route request counts by status class and TTFB/TTLB summaries."""
+        return [
+            {
+                "method": method,
+                "route": route,
+                "status": dict(entry["status"]),
+                "ttfb": entry["ttfb"].snapshot(),
+                "ttlb": entry["ttlb"].snapshot(),
+            }
+            for (method, route), entry in sorted(self.routes.items(), key=lambda item: item[0][1])
+        ]
+
+# Process-wide request metrics, filled by RequestLoggingMiddleware
+request_metrics = RequestMetrics()
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """
+    Path template of the route that served a request, e.g. "/api/v1/orders/{order_id}".
+    
+    The router stores the matched route in the scope. Routes of included routers
+    may only know their own part of the path, so the leading segments of the
+    concrete path supply the prefix. Unmatched paths share one series.
+    """
+    template = getattr(scope.get("route"), "path", None)
+    if not template:
+        return "<unmatched>"
+    path = scope["path"]
+    if "{" not in template:
+        return path
+    segments = path.strip("/").split("/")
+    template_segments = template.strip("/").split("/")
+    if len(segments) < len(template_segments):
+        return template
+    return "/" + "/".join(segments[:len(segments) - len(template_segments)] + template_segments)
+
+class RequestLoggingMiddleware:
+    """
+    Pure ASGI middleware that times and logs HTTP requests.
+    
+    It only wraps `send`, so responses (including the agents' SSE streams)
+    pass through unbuffered. Time to first byte is taken at the first body
+    chunk and time to last byte at the final one, so a streamed response
+    records how long the client waited for it to start and to finish.
+    
+    Every request is recorded in request_metrics; only a sample of them is
+    logged (REQUEST_LOG_SAMPLE_RATE), plus every server error and every
+    request slower to first byte than REQUEST_LOG_SLOW_MS.
+    
+    Args:
+        app: The wrapped ASGI application
+        sample_rate: Fraction of requests to log, defaults to REQUEST_LOG_SAMPLE_RATE
+        slow_request_ms: Always log requests slower than this to first byte, defaults to REQUEST_LOG_SLOW_MS
+        metrics: Where latencies are recorded, defaults to request_metrics
+    """
+    
+    def __init__(
+        self,
+        app: Any,
+        sample_rate: Optional[float] = None,
+        slow_request_ms: Optional[float] = None,
+        metrics: Optional[RequestMetrics] = None
+    ):
+        settings = get_settings()
+        self.app = app
+        self.sample_rate = settings.REQUEST_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.slow_request_ms = settings.REQUEST_LOG_SLOW_MS if slow_request_ms is None else slow_request_ms
+        self.metrics = request_metrics if metrics is None else metrics
+    
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Log request start
-        logging.info(
-            f"{LOG_EMOJIS['request']} Request Started | "
-            f"Method: {request.method} | "
-            f"Path: {request.url.path} | "
-            f"Client: {request.client.host if request.client else 'Unknown'}"
-        )
+        start = time.perf_counter()
+        timing = {"status": 500, "first_byte": None, "last_byte": None}
+        request_id = _request_id(scope)
+        request_token = request_id_var.set(request_id)
+        session_token = session_id_var.set(None)
+    
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                timing["status"] = message["status"]
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER.encode(), request_id.encode())]
+            elif message_type == "http.response.body":
+                now = time.perf_counter()
+                if timing["first_byte"] is None:
+                    timing["first_byte"] = now
+                if not message.get("more_body", False):
+                    timing["last_byte"] = now
+            await send(message)
         
+        error: Optional[BaseException] = None
         try:
-            # Process request
-            response = await call_next(request)
-            
-            # Calculate processing time
-            process_time = (time.time() - start_time) * 1000  # Convert to milliseconds
-            
-            # Determine emoji based on status code
-            status_emoji = LOG_EMOJIS['success'] if response.status_code < 400 else LOG_EMOJIS['error']
-            
-            # Log response
-            logging.info(
-                f"{status_emoji} Request Completed | "
-                f"Method: {request.method} | "
-                f"Path: {request.url.path} | "
-                f"Status: {response.status_code} | "
-            )
-            
-            return response
-            
-        except Exception as e:
-            logging.error(
-                f"{LOG_EMOJIS['error']} Request Failed | "
-                f"Method: {request.method} | "
-                f"Path: {request.url.path} | "
-                f"Error: {str(e)}"
-            )
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            error = e
             raise
+        finally:
+            self._record(scope, start, timing, error)
+            session_id_var.reset(session_token)
+            request_id_var.reset(request_token)
+    
+    def _record(self, scope: Dict[str, Any], start: float, timing: Dict[str, Any], error: Optional[BaseException]) -> None:
+        end = time.perf_counter()
+        ttfb_ms = ((timing["first_byte"] or end) - start) * 1000
+        ttlb_ms = ((timing["last_byte"] or end) - start) * 1000
+        status = timing["status"]
+        method = scope["method"]
+        route = route_template(scope)
+        self.metrics.observe(method, route, status, ttfb_ms, ttlb_ms)
+        
+        if error is None and status < 500 and ttfb_ms < self.slow_request_ms and random() >= self.sample_rate:
+            return
+        client = scope.get("client")
+        summary = "Method: %s | Path: %s | Status: %s | TTFB: %.1fms | TTLB: %.1fms | Client: %s"
+        args = (method, scope["path"], status, ttfb_ms, ttlb_ms, client[0] if client else "Unknown")
+        if error is not None and not isinstance(error, Exception):
+            # Cancelled (client went away mid-stream); not an application error
+            _log(logging.INFO, LOG_EMOJIS["warning"], "Request Aborted | " + summary, *args)
+        elif error is not None:
+            _log(logging.ERROR, LOG_EMOJIS["error"], "Request Failed | " + summary + " | Error: %s", *args, error)
+        else:
+            status_emoji = LOG_EMOJIS["success"] if status < 400 else LOG_EMOJIS["error"]
+            _log(logging.INFO, status_emoji, "Request Completed | " + summary, *args)
+
+def _request_id(scope: Dict[str, Any]) -> str:
+    """The caller's X-Request-ID if it sent a usable one, otherwise a new id."""
+    for name, value in scope.get("headers", ()):
+        if name == REQUEST_ID_HEADER.encode():
+            request_id = value.decode("latin-1").strip()
+            if 0 < len(request_id) <= 128 and request_id.isprintable():
+                return request_id
+            break
+    return uuid.uuid4().hex
+
+def _log(level: int, emoji: str, msg: str, *args: Any, **kwargs: Any) -> None:
+    """Log on the root logger with an emoji, doing nothing (not even formatting) below the level."""
+    root = logging.getLogger()
+    if root.isEnabledFor(level):
+        kwargs["extra"] = {"emoji": emoji, **kwargs.get("extra", {})}
+        kwargs.setdefault("stacklevel", 3)
+        root.log(level, msg, *args, **kwargs)
+
+_listener: Optional[QueueListener] = None
 
 def setup_logging(settings: Settings) -> None:
-    """Configure logging for the application."""
-    log_level = logging.DEBUG if settings.DEBUG else logging.INFO
+    """
+    Configure logging for the application.
+
+    The root logger gets a single queue handler; a listener thread drains the
+    queue into a stream handler with the text or JSON formatter. Calling it
+    again replaces the previous pipeline.
+    """
+    global _listener
+    log_level = logging.DEBUG if settings.DEBUG else settings.LOG_LEVEL.upper()
     
     # Custom log format with timestamp and level
     log_format = '%(asctime)s | %(levelname)s | %(message)s'
     
-    logging.basicConfig(
-        level=log_level,
-        format=log_format,
-        handlers=[
-            logging.StreamHandler(),
-        ],
-    )
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter() if settings.LOG_JSON else EmojiFormatter(log_format))
+    
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    
+    logging.basicConfig(level=log_level, handlers=[queue_handler], force=True)
+    # No format uses them; skip the per-record process lookups
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    # Drain whatever the previous pipeline still holds
+    shutdown_logging()
+    _listener = listener
+    
+    # Add custom logging methods; the emoji is added by the formatter, not here
+    def debug_with_emoji(msg: str, *args, **kwargs):
+        _log(logging.DEBUG, LOG_EMOJIS['info'], msg, *args, **kwargs)
     
-    # Add custom logging methods
     def info_with_emoji(msg: str, *args, **kwargs):
-        logging.info(f"{LOG_EMOJIS['info']} {msg}", *args, **kwargs)
+        _log(logging.INFO, LOG_EMOJIS['info'], msg, *args, **kwargs)
     
     def error_with_emoji(msg: str, *args, **kwargs):
-        logging.error(f"{LOG_EMOJIS['error']} {msg}", *args, **kwargs)
+        _log(logging.ERROR, LOG_EMOJIS['error'], msg, *args, **kwargs)
     
     def warning_with_emoji(msg: str, *args, **kwargs):
-        logging.warning(f"{LOG_EMOJIS['warning']} {msg}", *args, **kwargs)
+        _log(logging.WARNING, LOG_EMOJIS['warning'], msg, *args, **kwargs)
     
     # Attach custom methods to logging
+    logging.debug_with_emoji = debug_with_emoji
     logging.info_with_emoji = info_with_emoji
     logging.error_with_emoji = error_with_emoji
     logging.warning_with_emoji = warning_with_emoji
     
     # Suppress noisy logs
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
-    logging.getLogger("fastapi").setLevel(logging.WARNING) 
\ No newline at end of file
+    logging.getLogger("fastapi").setLevel(logging.WARNING)
+
+def shutdown_logging() -> None:
+    """Stop the listener thread after it has written every queued record."""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,229 @@
+"""
+Crypto Market Data Feed
+
+This module runs a background asyncio task that subscribes to crypto quotes
+and trades for every pair in the asset catalogue and writes them into the
+quote store (see quotes.py).
+
+Sources:
+- AlpacaMarketDataSource: Alpaca's crypto market-data websocket (alpaca-py
+  CryptoDataStream, raw messages so no pydantic model is built per tick; run
+  by alpaca_stream.StreamRunner, a failed connect or login is a disconnect)
+- ReplayMarketDataSource: replays a recorded feed from a list or a JSONL file
+  of raw messages, a local stand-in for tests and development
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
+from app.core.logging import logging
+from app.core.alpaca_stream import CryptoQuotesStream, StreamRunner
+from app.core.config import get_settings
+from app.core.quotes import QuoteStore, quote_store
+from app.api.v1.settings import on_keys_saved
+
+
+class MarketDataSource(ABC):
+    """A stream of raw market-data messages ({"T": "q" | "t", "S": symbol, ...})."""
+
+    @property
+    def connected(self) -> bool:
+        """Whether messages can currently arrive (replays are always connected)."""
+        return True
+
+    async def open(self, symbols: List[str]) -> None:
+        """Subscribe to quotes and trades for the given symbols and start buffering."""
+
+    @abstractmethod
+    def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over messages as they arrive."""
+
+    async def close(self) -> None:
+        """Stop receiving messages and release the connection."""
+
+
+class AlpacaMarketDataSource(MarketDataSource):
+    """Alpaca's crypto market-data websocket, run in its own thread and buffered into an asyncio queue."""
+
+    def __init__(self, keys: Dict[str, str], url_override: Optional[str] = None, max_queue: int = 10_000):
+        self._stream = CryptoQuotesStream(
+            keys["alpaca_api_key"],
+            keys["alpaca_secret_key"],
+            raw_data=True,
+            url_override=url_override
+        )
+        # Only the latest price matters; shed ticks rather than block the websocket reader
+        self._runner = StreamRunner(self._stream, "Market data", max_queue, shed=True)
+
+    @property
+    def connected(self) -> bool:
+        return self._runner.connected
+
+    @property
+    def dropped(self) -> int:
+        return self._runner.dropped
+
+    async def open(self, symbols: List[str]) -> None:
+        self._stream.subscribe_quotes(self._runner.put_latest, *symbols)
+        self._stream.subscribe_trades(self._runner.put_latest, *symbols)
+        # The stream reconnects by itself when a connection drops; a failed
+        # connect or login ends the runner, and iterating raises ConnectionError
+        self._runner.start()
+
+    def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        return self._runner.__aiter__()
+
+    async def close(self) -> None:
+        await self._runner.close()
+
+
+class ReplayMarketDataSource(MarketDataSource):
+    """Replays recorded market-data messages, filtered to the subscribed symbols."""
+
+    def __init__(self, messages: Iterable[Dict[str, Any]], delay: float = 0.0):
+        self.messages = list(messages)
+        self.delay = delay
+        self._symbols: Optional[set] = None
+
+    @classmethod
+    def from_file(cls, path: str, delay: float = 0.0) -> "ReplayMarketDataSource":
+        """Load messages from a JSONL file, one raw quote/trade message per line."""
+        with open(path) as f:
+            return cls([json.loads(line) for line in f if line.strip()], delay=delay)
+
+    async def open(self, symbols: List[str]) -> None:
+        self._symbols = None if "*" in symbols else set(symbols)
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        for message in self.messages:
+            if self._symbols is not None and message.get("S") not in self._symbols:
+                continue
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield message
+
+
+SourceFactory = Callable[[Dict[str, str]], MarketDataSource]
+SymbolLoader = Callable[[Dict[str, str]], Any]
+
+
+def default_source_factory(keys: Dict[str, str]) -> MarketDataSource:
+    """Build the source selected by MARKET_DATA_SOURCE ("alpaca" or "replay")."""
+    settings = get_settings()
+    if settings.MARKET_DATA_SOURCE == "replay":
+        return ReplayMarketDataSource.from_file(settings.MARKET_DATA_REPLAY_PATH)
+    if settings.MARKET_DATA_SOURCE == "alpaca":
+        return AlpacaMarketDataSource(keys)
+    raise ValueError(f"Unknown market data source: {settings.MARKET_DATA_SOURCE}")
+
+
+async def catalogue_symbols(keys: Dict[str, str]) -> List[str]:
+    """Every tradable pair in the asset catalogue, or all pairs if it cannot be loaded."""
+    # Imported here: the assets API module depends on app.core, not the other way round
+    from app.api.v1.assets import get_asset_index
+    try:
+        index = await get_asset_index(keys)
+    except Exception as e:
+        logging.error_with_emoji("❌ Asset catalogue unavailable, subscribing to all pairs: %s", e)
+        return ["*"]
+    return index.symbols()
+
+
+class MarketDataFeed:
+    """Background task that keeps a QuoteStore current from a market-data source."""
+
+    def __init__(
+        self,
+        store: QuoteStore,
+        source_factory: SourceFactory = default_source_factory,
+        symbol_loader: SymbolLoader = catalogue_symbols,
+        retry_delay: float = 5.0
+    ):
+        self.store = store
+        self.source_factory = source_factory
+        self.symbol_loader = symbol_loader
+        self.retry_delay = retry_delay
+        self._task: Optional[asyncio.Task] = None
+        self._source: Optional[MarketDataSource] = None
+        self._symbols: List[str] = []
+        self._last_message_at: Optional[float] = None
+        self._stats = {"messages": 0, "errors": 0, "restarts": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, keys: Dict[str, str]) -> None:
+        """(Re)start the feed for the given keys with an empty store."""
+        await self.stop()
+        self.store.clear()
+        self._task = asyncio.create_task(self._run(keys))
+        logging.info_with_emoji("📈 Market data feed started")
+
+    async def stop(self) -> None:
+        """Stop the background task and close the source."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._source = None
+
+    async def wait_idle(self) -> None:
+        """Wait until the source is exhausted (replay sources end; live ones never do)."""
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return connection state, subscription size and counters."""
+        since = time.monotonic() - self._last_message_at if self._last_message_at else None
+        return {
+            **self._stats,
+            "running": self.running,
+            "connected": self._source is not None and self._source.connected,
+            "subscribed_symbols": len(self._symbols),
+            "seconds_since_last_message": since,
+            "store": self.store.stats(),
+        }
+
+    async def _run(self, keys: Dict[str, str]) -> None:
+        self._symbols = list(await self.symbol_loader(keys))
+        while True:
+            source = self._source = self.source_factory(keys)
+            try:
+                await source.open(self._symbols)
+                ingest = self.store.ingest
+                async for message in source:
+                    ingest(message)
+                    self._stats["messages"] += 1
+                    self._last_message_at = time.monotonic()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["errors"] += 1
+                logging.error_with_emoji("❌ Market data stream failed, retrying in %ss: %s", self.retry_delay, e)
+            finally:
+                self._source = None
+                await source.close()
+            self._stats["restarts"] += 1
+            await asyncio.sleep(self.retry_delay)
+
+
+# Global instance
+market_data_feed = MarketDataFeed(quote_store)
+
+@on_keys_saved
+async def restart_market_data(keys: Dict[str, str]) -> None:
+    """Resubscribe with the new keys once they are saved."""
+    if get_settings().MARKET_DATA_ENABLED:
+        await market_data_feed.start(keys)
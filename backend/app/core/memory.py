@@ -6,72 +6,310 @@ Social Media:
 Date: January 2024
 """
 
-from typing import Dict, List
-from langchain_core.messages import BaseMessage
-from pydantic import BaseModel
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, NamedTuple, Optional
+from langchain_core.messages import BaseMessage, SystemMessage
+from pydantic import BaseModel, ConfigDict, Field
 from app.core.logging import logging
+from app.core.config import get_settings
+from app.core.memory_backends import MemoryBackend, create_memory_backend
+
+DEFAULT_USER_ID = "anonymous"
+DEFAULT_CONVERSATION_ID = "default"
+
+# Rough token estimate (~4 characters per token) plus per-message framing overhead
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Estimate how many prompt tokens a message costs."""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return len(content) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+class SessionKey(NamedTuple):
+    """Identifies one conversation of one user with one agent."""
+    user_id: str
+    agent_id: str
+    conversation_id: str
+
+    @classmethod
+    def for_agent(
+        cls,
+        agent_id: str,
+        user_id: Optional[str] = None,
+        conversation_id: Optional[str] = None
+    ) -> "SessionKey":
+        """Build a key, falling back to the default user and conversation."""
+        return cls(user_id or DEFAULT_USER_ID, agent_id, conversation_id or DEFAULT_CONVERSATION_ID)
+
+    @property
+    def id(self) -> str:
+        """Stable string form used as the backend storage key."""
+        return "|".join(self)
 
 class ConversationMemory(BaseModel):
-    """Stores conversation history and summary for an agent."""
-    messages: List[BaseMessage] = []
+    """Stores conversation history and summary for one session."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    messages: Deque[BaseMessage] = Field(default_factory=deque)
+    token_counts: Deque[int] = Field(default_factory=deque)
     summary: str = ""
-    max_messages: int = 10  # Keep last N messages
+    max_messages: int = 50  # Ring buffer capacity
+    token_budget: int = 4000  # Trim oldest messages beyond this many tokens
+    token_count: int = 0
+    next_seq: int = 0  # Sequence number of the next persisted message
+    pending_fold: List[BaseMessage] = Field(default_factory=list)  # Evicted, not yet summarized
+    last_access: float = Field(default_factory=time.monotonic)
+
+    def model_post_init(self, __context) -> None:
+        self.messages = deque(self.messages, maxlen=self.max_messages)
+        self.token_counts = deque(
+            (estimate_tokens(message) for message in self.messages),
+            maxlen=self.max_messages
+        )
+        self.token_count = sum(self.token_counts)
+        self._trim()
+
+    def append(self, message: BaseMessage) -> int:
+        """
+        Append a message, evicting the oldest ones to respect capacity and token budget.
+
+        Returns:
+            int: Change in the session's token count
+        """
+        before = self.token_count
+        if len(self.messages) == self.messages.maxlen:
+            # The deque drops the oldest message on append; keep the count in step
+            self.pending_fold.append(self.messages[0])
+            self.token_count -= self.token_counts[0]
+        tokens = estimate_tokens(message)
+        self.messages.append(message)
+        self.token_counts.append(tokens)
+        self.token_count += tokens
+        self._trim()
+        return self.token_count - before
+
+    def _trim(self) -> None:
+        # Always keep the newest message, even if it alone exceeds the budget
+        # Trimmed messages are kept aside until the summarizer folds them in
+        while self.token_count > self.token_budget and len(self.messages) > 1:
+            self.pending_fold.append(self.messages.popleft())
+            self.token_count -= self.token_counts.popleft()
+
+    @property
+    def head_seq(self) -> int:
+        """Sequence number of the oldest message still held verbatim."""
+        return self.next_seq - len(self.messages)
+
+    @property
+    def summarized_seq(self) -> int:
+        """Sequence number of the oldest message the summary does not cover (pending ones included)."""
+        return self.head_seq - len(self.pending_fold)
 
 class GlobalMemoryStore:
-    """Global memory store for all agents."""
+    """
+    Global memory store for all agent sessions.
+
+    Sessions are keyed by (user, agent, conversation). The store is a hot set
+    in LRU order in front of a persistent backend (see memory_backends):
+    sessions idle past MEMORY_SESSION_TTL are evicted from the hot set, and
+    the least recently used sessions are evicted whenever the session count
+    or the total token count exceeds its global cap. Evicted sessions are
+    reloaded from the backend on their next access, including messages that
+    were evicted but not yet summarized.
+    """
     _instance = None
-    _memories: Dict[str, ConversationMemory] = {}
+    _memories: "OrderedDict[SessionKey, ConversationMemory]" = OrderedDict()
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(GlobalMemoryStore, cls).__new__(cls)
+            settings = get_settings()
+            cls._instance._lock = threading.RLock()
+            cls._instance._total_tokens = 0
+            cls._instance.max_sessions = settings.MEMORY_MAX_SESSIONS
+            cls._instance.max_total_tokens = settings.MEMORY_MAX_TOTAL_TOKENS
+            cls._instance.session_ttl = settings.MEMORY_SESSION_TTL
+            cls._instance.max_messages = settings.MEMORY_MAX_MESSAGES
+            cls._instance.token_budget = settings.MEMORY_TOKEN_BUDGET
+            cls._instance._backend = create_memory_backend(settings)
         return cls._instance
 
-    def get_memory(self, agent_id: str) -> ConversationMemory:
-        """Get or create memory for an agent."""
-        if agent_id not in self._memories:
-            logging.info_with_emoji(f"🧠 Creating new memory store for agent: {agent_id}")
-            self._memories[agent_id] = ConversationMemory()
-        return self._memories[agent_id]
-
-    def add_message(self, agent_id: str, message: BaseMessage) -> None:
-        """Add a message to an agent's memory."""
-        memory = self.get_memory(agent_id)
-        memory.messages.append(message)
-        
-        # Keep only the last N messages
-        if len(memory.messages) > memory.max_messages:
-            memory.messages = memory.messages[-memory.max_messages:]
-        
-        logging.info_with_emoji(f"📝 Added message to {agent_id}'s memory. Total messages: {len(memory.messages)}")
-
-    def get_messages(self, agent_id: str) -> List[BaseMessage]:
-        """Get all messages for an agent."""
-        return self.get_memory(agent_id).messages
-
-    def update_summary(self, agent_id: str, new_summary: str) -> None:
-        """Update the conversation summary for an agent."""
-        memory = self.get_memory(agent_id)
-        memory.summary = new_summary
-        logging.info_with_emoji(f"📚 Updated summary for {agent_id}")
-
-    def get_summary(self, agent_id: str) -> str:
-        """Get the conversation summary for an agent."""
-        return self.get_memory(agent_id).summary
-
-    def get_context(self, agent_id: str) -> Dict:
-        """Get the full context (messages + summary) for an agent."""
-        memory = self.get_memory(agent_id)
-        return {
-            "messages": memory.messages,
-            "summary": memory.summary
-        }
-
-    def clear_memory(self, agent_id: str) -> None:
-        """Clear an agent's memory."""
-        if agent_id in self._memories:
-            self._memories[agent_id] = ConversationMemory()
-            logging.info_with_emoji(f"🧹 Cleared memory for {agent_id}")
+    @property
+    def backend(self) -> MemoryBackend:
+        """The persistence backend behind the hot set."""
+        return self._backend
+
+    def get_memory(self, session: SessionKey) -> ConversationMemory:
+        """Get or create memory for a session."""
+        with self._lock:
+            now = time.monotonic()
+            memory = self._memories.get(session)
+            if memory is None:
+                memory = self._load(session)
+                self._memories[session] = memory
+                self._total_tokens += memory.token_count
+            else:
+                self._memories.move_to_end(session)
+            memory.last_access = now
+            self._evict(now, keep=session)
+            return memory
+
+    def refresh(self, session: SessionKey) -> None:
+        """
+        Drop the hot-set copy of a session if another process changed it in the backend.
+
+        Called once per request, before the session is used; the backend check
+        runs outside the store lock.
+        """
+        if not self._backend.shared:
+            return
+        with self._lock:
+            if session not in self._memories:
+                return
+        if self._backend.is_current(session.id):
+            return
+        with self._lock:
+            memory = self._memories.pop(session, None)
+            if memory is not None:
+                self._total_tokens -= memory.token_count
+        logging.debug_with_emoji("🔄 Reloading %s/%s, changed by another process", session.agent_id, session.conversation_id)
+
+    def add_message(self, session: SessionKey, message: BaseMessage) -> None:
+        """Add a message to a session's memory."""
+        with self._lock:
+            memory = self.get_memory(session)
+            self._backend.append(session.id, memory.next_seq, message)
+            memory.next_seq += 1
+            self._total_tokens += memory.append(message)
+            self._evict(time.monotonic(), keep=session)
+
+        logging.debug_with_emoji("📝 Added message to %s's memory. Total messages: %s", session.agent_id, len(memory.messages))
+
+    def get_messages(self, session: SessionKey) -> List[BaseMessage]:
+        """Get all messages for a session, oldest first."""
+        with self._lock:
+            return list(self.get_memory(session).messages)
+
+    def get_prompt_messages(self, session: SessionKey) -> List[BaseMessage]:
+        """Get the messages to send to an agent: the rolling summary (if any) followed by recent history."""
+        with self._lock:
+            memory = self.get_memory(session)
+            messages = list(memory.messages)
+            if memory.summary:
+                messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{memory.summary}"))
+            return messages
+
+    def update_summary(self, session: SessionKey, new_summary: str) -> None:
+        """Update the conversation summary for a session."""
+        with self._lock:
+            memory = self.get_memory(session)
+            memory.summary = new_summary
+            self._backend.save_summary(session.id, new_summary, memory.summarized_seq)
+        logging.info_with_emoji("📚 Updated summary for %s", session.agent_id)
+
+    def messages_to_fold(self, session: SessionKey, keep_tokens: int) -> List[BaseMessage]:
+        """
+        Select the messages the next summary should absorb.
+
+        Returns already-evicted messages plus the oldest held messages, so that
+        at most keep_tokens of recent history stays verbatim. Nothing is removed
+        until fold() is called with the resulting summary.
+        """
+        with self._lock:
+            memory = self.get_memory(session)
+            selected = list(memory.pending_fold)
+            remaining = memory.token_count
+            # Always leave at least the newest message verbatim
+            for message, tokens in list(zip(memory.messages, memory.token_counts))[:-1]:
+                if remaining <= keep_tokens:
+                    break
+                selected.append(message)
+                remaining -= tokens
+            return selected
+
+    def fold(self, session: SessionKey, folded: List[BaseMessage], new_summary: str) -> None:
+        """Drop messages that are now covered by the summary and store the new summary."""
+        with self._lock:
+            memory = self.get_memory(session)
+            folded_ids = {id(message) for message in folded}
+            memory.pending_fold = [m for m in memory.pending_fold if id(m) not in folded_ids]
+            # Messages appended meanwhile sit at the tail, so only the head can match
+            while memory.messages and id(memory.messages[0]) in folded_ids:
+                memory.messages.popleft()
+                tokens = memory.token_counts.popleft()
+                memory.token_count -= tokens
+                self._total_tokens -= tokens
+            self.update_summary(session, new_summary)
+
+    def get_summary(self, session: SessionKey) -> str:
+        """Get the conversation summary for a session."""
+        return self.get_memory(session).summary
+
+    def get_context(self, session: SessionKey) -> Dict:
+        """Get the full context (messages + summary) for a session."""
+        with self._lock:
+            memory = self.get_memory(session)
+            return {
+                "messages": list(memory.messages),
+                "summary": memory.summary
+            }
+
+    def clear_memory(self, session: SessionKey) -> None:
+        """Clear a session's memory."""
+        with self._lock:
+            memory = self._memories.pop(session, None)
+            if memory is not None:
+                self._total_tokens -= memory.token_count
+            self._backend.delete(session.id)
+            logging.info_with_emoji("🧹 Cleared memory for %s", session.agent_id)
+
+    def close(self) -> None:
+        """Flush buffered writes and close the backend (called on shutdown)."""
+        self._backend.close()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of live sessions and the tokens they hold."""
+        with self._lock:
+            return {
+                "sessions": len(self._memories),
+                "total_tokens": self._total_tokens,
+                "max_sessions": self.max_sessions,
+                "max_total_tokens": self.max_total_tokens
+            }
+
+    def _load(self, session: SessionKey) -> ConversationMemory:
+        messages, summary, next_seq = self._backend.load(session.id)
+        # The backend only returns messages not yet covered by the summary
+        if not messages:
+            logging.info_with_emoji("🧠 Creating new memory store for session: %s/%s", session.agent_id, session.conversation_id)
+        # Anything beyond the ring buffer was evicted before it could be summarized
+        held = messages[-self.max_messages:]
+        return ConversationMemory(
+            messages=deque(held),
+            pending_fold=messages[:len(messages) - len(held)],
+            summary=summary,
+            next_seq=next_seq,
+            max_messages=self.max_messages,
+            token_budget=self.token_budget
+        )
+
+    def _evict(self, now: float, keep: SessionKey) -> None:
+        # Oldest sessions first; the session being used is never evicted
+        while self._memories:
+            session, memory = next(iter(self._memories.items()))
+            if session == keep:
+                break
+            over_capacity = (
+                len(self._memories) > self.max_sessions
+                or self._total_tokens > self.max_total_tokens
+            )
+            if not over_capacity and now - memory.last_access <= self.session_ttl:
+                break
+            del self._memories[session]
+            self._total_tokens -= memory.token_count
 
 # Global instance
-memory_store = GlobalMemoryStore() 
\ No newline at end of file
+memory_store = GlobalMemoryStore()
@@ -0,0 +1,270 @@
+"""
+Conversation Memory Backends
+
+This module defines where conversation history is persisted. GlobalMemoryStore
+keeps a small LRU hot set of sessions in process memory and reads through to
+a backend on a miss, so histories survive restarts.
+
+A shared backend (SQLite) may also be written by other processes, e.g. a
+CLI or a second server on the same database file. Every change bumps a
+per-session version row, and the store checks that row once per request to
+drop a hot-set copy that another process has changed. Sequence numbers are
+allocated inside the write transaction, so concurrent writers never
+overwrite each other's messages.
+
+Components:
+- MemoryBackend: interface every backend implements
+- InMemoryBackend: no persistence (histories live only in the hot set)
+- SQLiteMemoryBackend: embedded SQLite store in WAL mode with batched writes
+- create_memory_backend: builds the backend selected by MEMORY_BACKEND
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from .config import Settings
+
+
+class MemoryBackend(ABC):
+    """Persistence interface for conversation history."""
+
+    # Whether other processes may write to the same store (hot set entries must be revalidated)
+    shared: bool = False
+
+    @abstractmethod
+    def load(self, session_id: str) -> Tuple[List[BaseMessage], str, int]:
+        """
+        Load every message not yet covered by the summary, and the summary itself.
+
+        Returns:
+            Tuple: (messages oldest first, summary, next sequence number)
+        """
+
+    @abstractmethod
+    def append(self, session_id: str, seq: int, message: BaseMessage) -> None:
+        """Persist one message at the given sequence number (or the next free one, if taken)."""
+
+    @abstractmethod
+    def save_summary(self, session_id: str, summary: str, upto_seq: int) -> None:
+        """Persist the rolling summary of a session, covering every message before upto_seq."""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Remove every message and the summary of a session."""
+
+    def is_current(self, session_id: str) -> bool:
+        """Whether the session is unchanged since this process last loaded or wrote it."""
+        return True
+
+    def flush(self) -> None:
+        """Write out any buffered changes."""
+
+    def close(self) -> None:
+        """Flush and release resources."""
+
+
+class InMemoryBackend(MemoryBackend):
+    """Backend that persists nothing; the hot set is the only copy."""
+
+    def load(self, session_id: str) -> Tuple[List[BaseMessage], str, int]:
+        return [], "", 0
+
+    def append(self, session_id: str, seq: int, message: BaseMessage) -> None:
+        pass
+
+    def save_summary(self, session_id: str, summary: str, upto_seq: int) -> None:
+        pass
+
+    def delete(self, session_id: str) -> None:
+        pass
+
+
+class SQLiteMemoryBackend(MemoryBackend):
+    """
+    Embedded SQLite backend.
+
+    Messages live in a WITHOUT ROWID table clustered on (session, seq), so
+    loading the unsummarized tail of a session is a single index range scan.
+    Appends are buffered and written in one transaction per batch, either
+    when batch_size messages are pending or every flush_interval seconds.
+    Another process sees a message once its batch is flushed.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, batch_size: int = 64, flush_interval: float = 0.25):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, int, str, float]] = []
+        # Version of each session as last loaded or written by this process
+        self._versions: Dict[str, int] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                session TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (session, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS summaries (
+                session TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                upto_seq INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS session_versions (
+                session TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            """
+        )
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop,
+            args=(flush_interval,),
+            name="memory-flusher",
+            daemon=True
+        )
+        self._flusher.start()
+
+    def load(self, session_id: str) -> Tuple[List[BaseMessage], str, int]:
+        self.flush()
+        with self._lock:
+            summary_row = self._conn.execute(
+                "SELECT summary, upto_seq FROM summaries WHERE session = ?",
+                (session_id,)
+            ).fetchone()
+            summary, upto_seq = summary_row if summary_row else ("", 0)
+            rows = self._conn.execute(
+                "SELECT seq, payload FROM messages WHERE session = ? AND seq >= ? ORDER BY seq",
+                (session_id, upto_seq)
+            ).fetchall()
+            self._versions[session_id] = self._version(session_id)
+
+        messages = messages_from_dict([json.loads(payload) for _, payload in rows])
+        next_seq = rows[-1][0] + 1 if rows else upto_seq
+        return messages, summary, next_seq
+
+    def is_current(self, session_id: str) -> bool:
+        with self._lock:
+            return self._version(session_id) == self._versions.get(session_id)
+
+    def append(self, session_id: str, seq: int, message: BaseMessage) -> None:
+        payload = json.dumps(message_to_dict(message))
+        with self._lock:
+            self._pending.append((session_id, seq, payload, time.time()))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def save_summary(self, session_id: str, summary: str, upto_seq: int) -> None:
+        with self._lock:
+            self._write(lambda: self._conn.execute(
+                "INSERT INTO summaries (session, summary, upto_seq, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(session) DO UPDATE SET summary = excluded.summary, "
+                "upto_seq = excluded.upto_seq, updated_at = excluded.updated_at",
+                (session_id, summary, upto_seq, time.time())
+            ), [session_id])
+
+    def delete(self, session_id: str) -> None:
+        self.flush()
+        with self._lock:
+            def remove() -> None:
+                self._conn.execute("DELETE FROM messages WHERE session = ?", (session_id,))
+                self._conn.execute("DELETE FROM summaries WHERE session = ?", (session_id,))
+            self._write(remove, [session_id])
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, []
+            try:
+                # The sequence number is taken inside the write transaction: if another
+                # process already used it, the message goes after that process's messages
+                self._write(lambda: self._conn.executemany(
+                    "INSERT INTO messages (session, seq, payload, created_at) "
+                    "SELECT ?, MAX(?, COALESCE(MAX(seq) + 1, 0)), ?, ? FROM messages WHERE session = ?",
+                    [(session, seq, payload, created_at, session) for session, seq, payload, created_at in batch]
+                ), {session for session, _, _, _ in batch})
+            except Exception:
+                self._pending = batch + self._pending
+                raise
+
+    def close(self) -> None:
+        self._stop.set()
+        self._flusher.join(timeout=1.0)
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, statements: Callable[[], Any], sessions: Iterable[str]) -> None:
+        # Caller holds self._lock. BEGIN IMMEDIATE takes the database write lock up front,
+        # so reading and bumping the versions cannot interleave with another process.
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            statements()
+            bumped = {}
+            for session_id in sessions:
+                before = self._version(session_id)
+                self._conn.execute(
+                    "INSERT INTO session_versions (session, version) VALUES (?, ?) "
+                    "ON CONFLICT(session) DO UPDATE SET version = excluded.version",
+                    (session_id, before + 1)
+                )
+                bumped[session_id] = before
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        for session_id, before in bumped.items():
+            # Only our own write happened since we last looked, so the hot-set copy is still current
+            if self._versions.get(session_id) == before:
+                self._versions[session_id] = before + 1
+
+    def _version(self, session_id: str) -> int:
+        row = self._conn.execute(
+            "SELECT version FROM session_versions WHERE session = ?",
+            (session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _flush_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                # Keep the batch pending and retry on the next tick
+                pass
+
+
+def create_memory_backend(settings: Settings) -> MemoryBackend:
+    """Build the memory backend selected by MEMORY_BACKEND ("sqlite" or "memory")."""
+    if settings.MEMORY_BACKEND == "memory":
+        return InMemoryBackend()
+    if settings.MEMORY_BACKEND == "sqlite":
+        return SQLiteMemoryBackend(
+            path=settings.MEMORY_SQLITE_PATH,
+            batch_size=settings.MEMORY_WRITE_BATCH_SIZE,
+            flush_interval=settings.MEMORY_FLUSH_INTERVAL
+        )
+    raise ValueError(f"Unknown memory backend: {settings.MEMORY_BACKEND}")
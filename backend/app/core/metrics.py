@@ -0,0 +1,449 @@
+"""
+Process Metrics
+
+This module is a small in-process metrics registry rendered in the Prometheus
+text exposition format at GET /metrics. Hot paths record into pre-declared
+counters and histograms (a dict lookup and a few additions per sample, no
+allocation once a label combination has been seen); everything that is
+already tracked by a component's stats() method is read only when the
+endpoint is scraped.
+
+Instrumented paths:
+- broker: Alpaca call latency by TradingClient method and outcome (call_broker)
+- LLM: call latency and token usage per agent (AgentMetricsCallback on the agent's model)
+- tools: invocation count and duration per agent and tool (same callback on its tools)
+- agents: response time per agent and the number of SSE streams in flight
+- components: cache hit ratios, memory store size, order book, feeds (stats() at scrape time)
+
+Samples are written from the event loop (LangChain callbacks run inline), so
+the primitives take no locks.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+
+NAMESPACE = "kryptt"
+
+# Upper bounds (seconds) for latency histograms; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+Labels = Tuple[str, ...]
+
+
+class Sample(NamedTuple):
+    """One exposition line: metric name suffix, labels and value."""
+    suffix: str
+    labels: Dict[str, str]
+    value: float
+
+
+class MetricFamily(NamedTuple):
+    """A metric as rendered: name, type, help text and its samples."""
+    name: str
+    type: str
+    help: str
+    samples: List[Sample]
+
+
+Collector = Callable[[], Iterable[MetricFamily]]
+
+
+class Counter:
+    """Monotonically increasing count per label combination."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def collect(self) -> MetricFamily:
+        return MetricFamily(self.name, self.type, self.help, [
+            Sample("", dict(zip(self.labelnames, labels)), value) for labels, value in self._values.items()
+        ])
+
+
+class Gauge(Counter):
+    """Value that goes up and down per label combination."""
+
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+
+class Histogram:
+    """Fixed-bucket histogram per label combination."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[Labels, List[Any]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def collect(self) -> MetricFamily:
+        samples: List[Sample] = []
+        for labels, (counts, total) in self._values.items():
+            samples.extend(histogram_samples(dict(zip(self.labelnames, labels)), self.buckets, counts, total))
+        return MetricFamily(self.name, self.type, self.help, samples)
+
+
+def histogram_samples(labels: Dict[str, str], buckets: Sequence[float], counts: Sequence[int], total: float) -> List[Sample]:
+    """Cumulative _bucket, _sum and _count samples from per-bucket counts (the last count is +Inf)."""
+    samples = []
+    cumulative = 0
+    for bound, count in zip((*buckets, math.inf), counts):
+        cumulative += count
+        samples.append(Sample("_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+    samples.append(Sample("_sum", labels, total))
+    samples.append(Sample("_count", labels, cumulative))
+    return samples
+
+
+class MetricsRegistry:
+    """Declared metrics plus collectors that are called at scrape time."""
+
+    def __init__(self, namespace: str = NAMESPACE):
+        self.namespace = namespace
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: Dict[str, Collector] = {}
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._declare(Counter(f"{self.namespace}_{name}", help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._declare(Gauge(f"{self.namespace}_{name}", help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._declare(Histogram(f"{self.namespace}_{name}", help, labelnames, buckets))
+
+    def register_collector(self, name: str, collector: Collector) -> None:
+        """Register (or replace) a collector called on every scrape."""
+        self._collectors[name] = collector
+
+    def collect(self) -> List[MetricFamily]:
+        families = [metric.collect() for metric in self._metrics.values()]
+        for collector in list(self._collectors.values()):
+            families.extend(collector())
+        return families
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for family in self.collect():
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.type}")
+            for sample in family.samples:
+                lines.append(f"{family.name}{sample.suffix}{_format_labels(sample.labels)} {_format_value(sample.value)}")
+        return "\n".join(lines) + "\n"
+
+    def _declare(self, metric: Any) -> Any:
+        # Declaring twice (e.g. a module reloaded in development) returns the existing metric
+        return self._metrics.setdefault(metric.name, metric)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def stats_collector(
+    subsystem: str,
+    stats: Callable[[], Dict[str, Any]],
+    counters: Iterable[str] = (),
+    help: str = ""
+) -> Collector:
+    """
+    Collector exporting the numeric fields of a component's stats() dict.
+
+    Every numeric (or boolean) field becomes a gauge named
+    <namespace>_<subsystem>_<field>; fields listed in counters are exported
+    as counters with a _total suffix. Nested dicts and missing values are skipped.
+    """
+    counters = set(counters)
+
+    def collect() -> List[MetricFamily]:
+        families = []
+        for field, value in stats().items():
+            if isinstance(value, bool):
+                value = float(value)
+            if not isinstance(value, (int, float)):
+                continue
+            description = f"{help or subsystem} {field.replace('_', ' ')}"
+            if field in counters:
+                families.append(MetricFamily(f"{NAMESPACE}_{subsystem}_{field}_total", "counter", description, [Sample("", {}, value)]))
+            else:
+                families.append(MetricFamily(f"{NAMESPACE}_{subsystem}_{field}", "gauge", description, [Sample("", {}, value)]))
+        return families
+
+    return collect
+
+
+def cache_collector(caches: Dict[str, Callable[[], Dict[str, Any]]]) -> Collector:
+    """
+    Collector exporting hits, misses and hit ratio of several caches under one "cache" label.
+
+    Each stats() dict must have "hits" and "misses"; a "size" or "entries" field is exported too.
+    """
+
+    def collect() -> List[MetricFamily]:
+        hits, misses, ratios, sizes = [], [], [], []
+        for name, stats in caches.items():
+            values = stats()
+            labels = {"cache": name}
+            hit, miss = values.get("hits", 0), values.get("misses", 0)
+            hits.append(Sample("", labels, hit))
+            misses.append(Sample("", labels, miss))
+            ratios.append(Sample("", labels, hit / (hit + miss) if hit + miss else 0.0))
+            size = values.get("size", values.get("entries"))
+            if size is not None:
+                sizes.append(Sample("", labels, size))
+        return [
+            MetricFamily(f"{NAMESPACE}_cache_hits_total", "counter", "Cache lookups served from the cache", hits),
+            MetricFamily(f"{NAMESPACE}_cache_misses_total", "counter", "Cache lookups that had to load", misses),
+            MetricFamily(f"{NAMESPACE}_cache_hit_ratio", "gauge", "Hits over lookups since startup", ratios),
+            MetricFamily(f"{NAMESPACE}_cache_entries", "gauge", "Entries currently cached", sizes),
+        ]
+
+    return collect
+
+
+# Global registry and hot-path metrics
+metrics = MetricsRegistry()
+
+broker_call_seconds = metrics.histogram(
+    "broker_call_seconds", "Alpaca call latency, including rate-limit queueing", ("method", "outcome")
+)
+llm_call_seconds = metrics.histogram("llm_call_seconds", "LLM call latency", ("agent", "model", "outcome"))
+llm_tokens = metrics.counter("llm_tokens_total", "LLM tokens used", ("agent", "model", "kind"))
+llm_tokens_per_call = metrics.histogram(
+    "llm_call_tokens", "Total tokens of one LLM call", ("agent", "model"), buckets=TOKEN_BUCKETS
+)
+tool_call_seconds = metrics.histogram("tool_call_seconds", "Tool invocation duration", ("agent", "tool", "outcome"))
+agent_response_seconds = metrics.histogram(
+    "agent_response_seconds", "Time from a chat request to the end of its stream", ("agent", "path")
+)
+streams_in_flight = metrics.gauge("agent_streams_in_flight", "SSE chat streams currently open")
+streams_in_flight.set(0)
+
+
+class AgentMetricsCallback(BaseCallbackHandler):
+    """
+    LangChain callback recording LLM and tool timings and token usage for one agent.
+
+    setup_base_agent attaches it to the agent's model and tools, so it also
+    sees tools called directly (the order agent's fast path). Start times
+    are kept by run id until the run ends.
+    """
+
+    # Called directly on the event loop instead of in a thread pool
+    run_inline = True
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self._started: Dict[UUID, Tuple[float, str]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = (time.perf_counter(), _model_name(serialized, kwargs))
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = (time.perf_counter(), _model_name(serialized, kwargs))
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        start, model = started
+        llm_call_seconds.observe(time.perf_counter() - start, self.agent, model, "success")
+        usage = _token_usage(response)
+        if usage:
+            for kind in ("input_tokens", "output_tokens"):
+                llm_tokens.inc(self.agent, model, kind[:-len("_tokens")], amount=usage.get(kind, 0))
+            llm_tokens_per_call.observe(usage.get("total_tokens", 0), self.agent, model)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            llm_call_seconds.observe(time.perf_counter() - started[0], self.agent, started[1], "error")
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = (time.perf_counter(), (serialized or {}).get("name") or kwargs.get("name") or "unknown")
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            tool_call_seconds.observe(time.perf_counter() - started[0], self.agent, started[1], "success")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            tool_call_seconds.observe(time.perf_counter() - started[0], self.agent, started[1], "error")
+
+
+def _model_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any]) -> str:
+    params = kwargs.get("invocation_params") or {}
+    return params.get("model") or params.get("model_name") or ((serialized or {}).get("kwargs") or {}).get("model_name") or "unknown"
+
+
+def _token_usage(response: Any) -> Optional[Dict[str, int]]:
+    """Token counts of an LLMResult, from the message usage metadata or the provider's llm_output."""
+    for generations in getattr(response, "generations", None) or []:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage
+    token_usage = (getattr(response, "llm_output", None) or {}).get("token_usage")
+    if token_usage:
+        return {
+            "input_tokens": token_usage.get("prompt_tokens", 0),
+            "output_tokens": token_usage.get("completion_tokens", 0),
+            "total_tokens": token_usage.get("total_tokens", 0),
+        }
+    return None
+
+
+_agent_callbacks: Dict[str, AgentMetricsCallback] = {}
+
+def agent_callback(agent: str) -> AgentMetricsCallback:
+    """The metrics callback of an agent (one per agent name)."""
+    callback = _agent_callbacks.get(agent)
+    if callback is None:
+        callback = _agent_callbacks.setdefault(agent, AgentMetricsCallback(agent))
+    return callback
+
+
+def register_component_collectors() -> None:
+    """Export the stats() of the long-lived components (called once at startup)."""
+    # Imported here: these modules are instrumented with the metrics above
+    from app.core.config import get_trading_client_pool
+    from app.core.broker import get_broker_executor
+    from app.core.rate_limit import get_rate_limiter
+    from app.core.logging import LATENCY_BUCKETS_MS, request_metrics
+    from app.core.agent_factory import agent_factory
+    from app.core.asset_cache import asset_catalogue
+    from app.core.positions import position_store
+    from app.core.response_cache import response_cache
+    from app.core.memory import memory_store
+    from app.core.idempotency import order_dedup
+    from app.core.order_book import order_book
+    from app.core.market_data import market_data_feed
+    from app.core.trade_updates import trade_update_consumer
+
+    def agent_cache_stats() -> Dict[str, Any]:
+        stats = agent_factory.stats()
+        return {"hits": stats["hits"], "misses": stats["builds"], "size": stats["cached_agents"]}
+
+    def position_cache_stats() -> Dict[str, Any]:
+        stats = position_store.stats()
+        return {**stats, "size": stats["accounts"]}
+
+    client_pool = get_trading_client_pool()
+    metrics.register_collector("caches", cache_collector({
+        "trading_clients": client_pool.stats,
+        "agents": agent_cache_stats,
+        "assets": asset_catalogue.stats,
+        "positions": position_cache_stats,
+        "responses": response_cache.stats,
+    }))
+    metrics.register_collector("broker_executor", stats_collector(
+        "broker_executor", get_broker_executor().metrics, counters=("completed", "failed", "timeouts"), help="Broker executor"
+    ))
+    metrics.register_collector("http_pool", stats_collector(
+        "http_pool", client_pool.transport.stats, counters=("checkouts", "reused", "new_connections", "expired_keepalive"),
+        help="Alpaca HTTP pool"
+    ))
+    metrics.register_collector("memory_store", stats_collector("memory_store", memory_store.stats, help="Conversation memory"))
+    metrics.register_collector("order_dedup", stats_collector(
+        "order_dedup", order_dedup.stats, counters=("submitted", "deduplicated", "recovered", "timeouts"), help="Order dedup"
+    ))
+    metrics.register_collector("order_book", stats_collector(
+        "order_book", order_book.stats, counters=("events", "fills", "stale_events", "duplicate_fills"), help="Order book"
+    ))
+    metrics.register_collector("market_data", stats_collector(
+        "market_data", market_data_feed.stats, counters=("messages", "errors", "restarts"), help="Market data feed"
+    ))
+    metrics.register_collector("trade_updates", stats_collector(
+        "trade_updates", trade_update_consumer.stats, counters=("events", "errors", "restarts"), help="Trade updates stream"
+    ))
+
+    def collect_rate_limits() -> List[MetricFamily]:
+        buckets = get_rate_limiter().stats()
+        fields = {
+            "tokens": ("gauge", "Tokens left in the credential's bucket"),
+            "queue_depth": ("gauge", "Broker calls waiting for a token"),
+            "granted": ("counter", "Tokens granted"),
+            "rate_limited": ("counter", "429 responses from Alpaca"),
+        }
+        return [
+            MetricFamily(
+                f"{NAMESPACE}_rate_limit_{field}" + ("_total" if kind == "counter" else ""), kind, description,
+                [Sample("", {"credential": credential}, stats[field]) for credential, stats in buckets.items()]
+            )
+            for field, (kind, description) in fields.items()
+        ]
+
+    def collect_requests() -> List[MetricFamily]:
+        bounds = tuple(bound / 1000 for bound in LATENCY_BUCKETS_MS[:-1])
+        families = []
+        for kind, description in (("ttfb", "time to first byte"), ("ttlb", "time to last byte")):
+            samples: List[Sample] = []
+            for (method, route), entry in list(request_metrics.routes.items()):
+                histogram = entry[kind]
+                samples.extend(histogram_samples(
+                    {"method": method, "route": route}, bounds, histogram.counts, histogram.total / 1000
+                ))
+            families.append(MetricFamily(f"{NAMESPACE}_http_request_{kind}_seconds", "histogram", f"HTTP request {description}", samples))
+        status = [
+            Sample("", {"method": method, "route": route, "status": status_class}, count)
+            for (method, route), entry in list(request_metrics.routes.items())
+            for status_class, count in entry["status"].items()
+        ]
+        families.append(MetricFamily(f"{NAMESPACE}_http_requests_total", "counter", "HTTP requests by status class", status))
+        return families
+
+    metrics.register_collector("rate_limits", collect_rate_limits)
+    metrics.register_collector("http_requests", collect_requests)
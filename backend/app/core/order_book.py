@@ -0,0 +1,314 @@
+"""
+Local Order Book
+
+This module keeps an in-memory view of the account's orders and positions,
+updated incrementally from trade-update events (see trade_updates.py) and
+from the orders Kryptt submits itself. Agent tools and REST endpoints read
+order status and position quantities from here instead of polling Alpaca.
+
+Order state machine:
+- Each event carries the order as Alpaca sees it; it replaces the local copy
+  unless it is older than what is already known (updated_at) or would move a
+  terminal order (filled, canceled, ...) back to a live state.
+- fill / partial_fill events move the position by the execution's quantity
+  at the execution's price. Execution ids are remembered so a replayed event
+  is never applied twice, and position_qty (when Alpaca sends it) overrides
+  the running quantity.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, List, Optional
+from app.core.config import get_settings
+
+TERMINAL_STATUSES = {"filled", "canceled", "expired", "rejected", "replaced", "done_for_day"}
+FILL_EVENTS = {"fill", "partial_fill"}
+ZERO = Decimal("0")
+
+
+def _decimal(value: Any) -> Optional[Decimal]:
+    if value is None or value == "":
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+def _value(enum_or_str: Any) -> Optional[str]:
+    """Plain string value of an Alpaca enum (or a string)."""
+    if enum_or_str is None:
+        return None
+    return str(getattr(enum_or_str, "value", enum_or_str))
+
+
+def position_key(symbol: str) -> str:
+    """Key positions so that "BTC/USD" and "BTCUSD" are the same position."""
+    return symbol.replace("/", "").upper()
+
+
+@dataclass
+class OrderState:
+    """The latest known state of one order."""
+    id: str
+    client_order_id: str
+    symbol: str
+    side: Optional[str]
+    type: Optional[str]
+    status: str
+    qty: Optional[Decimal]
+    notional: Optional[Decimal]
+    filled_qty: Decimal
+    filled_avg_price: Optional[Decimal]
+    limit_price: Optional[Decimal]
+    stop_price: Optional[Decimal]
+    submitted_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    last_event: Optional[str] = None
+
+    @classmethod
+    def from_order(cls, order: Any, event: Optional[str] = None) -> "OrderState":
+        """Build the state from an alpaca Order model."""
+        return cls(
+            id=str(order.id),
+            client_order_id=order.client_order_id,
+            symbol=order.symbol,
+            side=_value(order.side),
+            type=_value(order.type or order.order_type),
+            status=_value(order.status),
+            qty=_decimal(order.qty),
+            notional=_decimal(order.notional),
+            filled_qty=_decimal(order.filled_qty) or ZERO,
+            filled_avg_price=_decimal(order.filled_avg_price),
+            limit_price=_decimal(order.limit_price),
+            stop_price=_decimal(order.stop_price),
+            submitted_at=order.submitted_at,
+            updated_at=order.updated_at,
+            last_event=event,
+        )
+
+    @property
+    def is_open(self) -> bool:
+        return self.status not in TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-friendly representation (decimals as strings)."""
+        return {
+            "id": self.id,
+            "client_order_id": self.client_order_id,
+            "symbol": self.symbol,
+            "side": self.side,
+            "type": self.type,
+            "status": self.status,
+            "qty": str(self.qty) if self.qty is not None else None,
+            "notional": str(self.notional) if self.notional is not None else None,
+            "filled_qty": str(self.filled_qty),
+            "filled_avg_price": str(self.filled_avg_price) if self.filled_avg_price is not None else None,
+            "limit_price": str(self.limit_price) if self.limit_price is not None else None,
+            "stop_price": str(self.stop_price) if self.stop_price is not None else None,
+            "submitted_at": self.submitted_at.isoformat() if self.submitted_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "last_event": self.last_event,
+        }
+
+
+@dataclass
+class PositionState:
+    """Quantity and average entry price of one position, as implied by fills."""
+    symbol: str
+    qty: Decimal
+    avg_entry_price: Optional[Decimal]
+    updated_at: Optional[datetime] = None
+
+    def apply_fill(self, side: str, qty: Decimal, price: Optional[Decimal]) -> None:
+        """Move the position by one execution."""
+        signed = qty if side == "buy" else -qty
+        old_qty, new_qty = self.qty, self.qty + signed
+        adding = old_qty == ZERO or (old_qty > ZERO) == (signed > ZERO)
+        if new_qty == ZERO:
+            self.avg_entry_price = None
+        elif price is not None and adding:
+            # Opening or adding: weighted average of the old entry and this fill
+            old_cost = abs(old_qty) * (self.avg_entry_price or ZERO)
+            self.avg_entry_price = (old_cost + qty * price) / abs(new_qty)
+        elif price is not None and (old_qty > ZERO) != (new_qty > ZERO):
+            # Flipped through zero: the remainder was opened at this price
+            self.avg_entry_price = price
+        # Reducing keeps the entry price of what is left
+        self.qty = new_qty
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-friendly representation (decimals as strings)."""
+        return {
+            "symbol": self.symbol,
+            "qty": str(self.qty),
+            "avg_entry_price": str(self.avg_entry_price) if self.avg_entry_price is not None else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class OrderBook:
+    """In-memory orders and positions of one account."""
+
+    def __init__(self, max_orders: int = 1000):
+        self.max_orders = max_orders
+        self.account: Optional[str] = None
+        self._orders: "OrderedDict[str, OrderState]" = OrderedDict()
+        self._by_client_id: Dict[str, str] = {}
+        self._positions: Dict[str, PositionState] = {}
+        self._executions: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"events": 0, "fills": 0, "stale_events": 0, "duplicate_fills": 0}
+
+    def reset(self, account: Optional[str]) -> None:
+        """Forget everything, e.g. when the keys (and so the account) change."""
+        with self._lock:
+            self.account = account
+            self._orders.clear()
+            self._by_client_id.clear()
+            self._positions.clear()
+            self._executions.clear()
+
+    def record_order(self, order: Any, event: Optional[str] = None) -> Optional[OrderState]:
+        """
+        Merge an order as returned by Alpaca (submit_order, get_orders or an event).
+
+        Returns:
+            Optional[OrderState]: The stored state, or None if the order was older than the local copy
+        """
+        incoming = OrderState.from_order(order, event)
+        with self._lock:
+            current = self._orders.get(incoming.id)
+            if current is not None and self._is_stale(current, incoming):
+                self._stats["stale_events"] += 1
+                return None
+            self._orders[incoming.id] = incoming
+            self._orders.move_to_end(incoming.id)
+            self._by_client_id[incoming.client_order_id] = incoming.id
+            self._evict()
+            return incoming
+
+    def apply(self, update: Any) -> Optional[OrderState]:
+        """
+        Apply one trade-update event (alpaca TradeUpdate).
+
+        Returns:
+            Optional[OrderState]: The order's new state, or None if the event was stale
+        """
+        event = _value(update.event)
+        self._stats["events"] += 1
+        if event in FILL_EVENTS:
+            self._apply_fill(update)
+        return self.record_order(update.order, event)
+
+    def seed_positions(self, positions: Iterable[Any]) -> None:
+        """Replace the positions with a broker snapshot (alpaca Position models)."""
+        with self._lock:
+            self._positions = {
+                position_key(position.symbol): PositionState(
+                    symbol=position.symbol,
+                    qty=_decimal(position.qty) or ZERO,
+                    avg_entry_price=_decimal(position.avg_entry_price),
+                )
+                for position in positions
+            }
+
+    def get_order(self, order_id: str) -> Optional[OrderState]:
+        """Find an order by Alpaca order id or client order id."""
+        with self._lock:
+            order = self._orders.get(str(order_id))
+            if order is None and order_id in self._by_client_id:
+                order = self._orders.get(self._by_client_id[order_id])
+            return order
+
+    def orders(self, status: str = "open", symbol: Optional[str] = None) -> List[OrderState]:
+        """
+        List orders, newest first.
+
+        Args:
+            status: "open", "closed" or "all"
+            symbol: Only orders for this symbol ("BTC/USD" or "BTCUSD")
+        """
+        with self._lock:
+            orders = list(reversed(self._orders.values()))
+        if status == "open":
+            orders = [order for order in orders if order.is_open]
+        elif status == "closed":
+            orders = [order for order in orders if not order.is_open]
+        if symbol:
+            orders = [order for order in orders if position_key(order.symbol) == position_key(symbol)]
+        return orders
+
+    def positions(self) -> List[PositionState]:
+        """Non-flat positions implied by the seed snapshot and subsequent fills."""
+        with self._lock:
+            return [position for position in self._positions.values() if position.qty != ZERO]
+
+    def stats(self) -> Dict[str, int]:
+        """Return order/position counts and event counters."""
+        with self._lock:
+            open_orders = sum(1 for order in self._orders.values() if order.is_open)
+            return {
+                **self._stats,
+                "orders": len(self._orders),
+                "open_orders": open_orders,
+                "positions": sum(1 for position in self._positions.values() if position.qty != ZERO),
+            }
+
+    def _apply_fill(self, update: Any) -> None:
+        order = update.order
+        with self._lock:
+            if update.execution_id is not None:
+                execution = str(update.execution_id)
+                if execution in self._executions:
+                    self._stats["duplicate_fills"] += 1
+                    return
+                self._executions[execution] = None
+                while len(self._executions) > self.max_orders * 4:
+                    self._executions.popitem(last=False)
+
+            qty = _decimal(update.qty)
+            if qty is None:
+                # Older payloads omit the execution qty; derive it from the cumulative fill
+                previous = self._orders.get(str(order.id))
+                qty = (_decimal(order.filled_qty) or ZERO) - (previous.filled_qty if previous else ZERO)
+            if qty <= ZERO:
+                return
+
+            key = position_key(order.symbol)
+            position = self._positions.get(key) or PositionState(symbol=order.symbol, qty=ZERO, avg_entry_price=None)
+            position.apply_fill(_value(order.side), qty, _decimal(update.price) or _decimal(order.filled_avg_price))
+            if update.position_qty is not None:
+                position.qty = _decimal(update.position_qty)
+            position.updated_at = update.timestamp
+            self._positions[key] = position
+            self._stats["fills"] += 1
+
+    @staticmethod
+    def _is_stale(current: OrderState, incoming: OrderState) -> bool:
+        if not current.is_open and incoming.is_open:
+            return True
+        if current.updated_at and incoming.updated_at and incoming.updated_at < current.updated_at:
+            return True
+        return False
+
+    def _evict(self) -> None:
+        # Drop the oldest finished orders first; open orders are always kept
+        excess = len(self._orders) - self.max_orders
+        if excess <= 0:
+            return
+        for order_id in [order_id for order_id, order in self._orders.items() if not order.is_open][:excess]:
+            order = self._orders.pop(order_id)
+            self._by_client_id.pop(order.client_order_id, None)
+
+
+# Global instance
+order_book = OrderBook(max_orders=get_settings().TRADE_UPDATES_MAX_ORDERS)
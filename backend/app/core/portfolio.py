@@ -0,0 +1,184 @@
+"""
+Portfolio Analytics
+
+This module turns a list of open positions into a compact summary: totals,
+profit and loss, allocation weights, concentration and exposure. Positions
+are converted into NumPy columns once and every figure is computed with
+whole-column operations, so the cost does not grow with Python-level loops
+over rows and the agent gets exact numbers instead of doing arithmetic over
+stringified positions.
+
+Figures:
+- totals: market value, cost basis, unrealized and intraday P/L
+- exposure: long, short, gross and net market value
+- concentration: largest weight, Herfindahl index and effective number of positions
+- positions: per-position weight and P/L, largest first
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+
+COLUMNS = (
+    "qty", "avg_entry_price", "current_price", "lastday_price",
+    "market_value", "cost_basis", "unrealized_pl", "unrealized_intraday_pl"
+)
+
+
+def _number(value: Any) -> float:
+    """Float from a Decimal or decimal string, with missing values as NaN."""
+    if value is None or value == "":
+        return np.nan
+    return float(value)
+
+
+def _round(value: float, digits: int = 2) -> Optional[float]:
+    """JSON-friendly rounding (NaN and inf become None)."""
+    # + 0.0 turns -0.0 into 0.0
+    return round(float(value), digits) + 0.0 if np.isfinite(value) else None
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Elementwise numerator / denominator with NaN where the denominator is 0."""
+    out = np.full(np.shape(numerator), np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def position_columns(positions: Iterable[Any]) -> Dict[str, np.ndarray]:
+    """
+    Convert positions (PositionRecords or alpaca Position models) into float columns.
+
+    Missing market values and cost bases are derived from qty and prices so
+    every later step is a plain array operation.
+
+    Returns:
+        Dict[str, np.ndarray]: One array per field in COLUMNS, plus "symbol"
+    """
+    rows = list(positions)
+    columns = {
+        name: np.fromiter((_number(getattr(row, name, None)) for row in rows), dtype=np.float64, count=len(rows))
+        for name in COLUMNS
+    }
+    columns["symbol"] = np.array([row.symbol for row in rows], dtype=object)
+
+    qty = columns["qty"]
+    columns["market_value"] = np.where(np.isnan(columns["market_value"]), qty * columns["current_price"], columns["market_value"])
+    columns["cost_basis"] = np.where(np.isnan(columns["cost_basis"]), qty * columns["avg_entry_price"], columns["cost_basis"])
+    columns["unrealized_pl"] = np.where(
+        np.isnan(columns["unrealized_pl"]),
+        columns["market_value"] - columns["cost_basis"],
+        columns["unrealized_pl"]
+    )
+    columns["unrealized_intraday_pl"] = np.where(
+        np.isnan(columns["unrealized_intraday_pl"]),
+        qty * (columns["current_price"] - columns["lastday_price"]),
+        columns["unrealized_intraday_pl"]
+    )
+    return columns
+
+
+def analyze_positions(positions: Iterable[Any], top: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Summarize open positions in one vectorized pass.
+
+    Args:
+        positions: PositionRecords from a position snapshot (or alpaca Position models)
+        top: Only list the largest N positions (totals still cover all of them)
+
+    Returns:
+        Dict[str, Any]: totals, exposure, concentration, winners/losers and positions
+    """
+    columns = position_columns(positions)
+    symbols = columns["symbol"]
+    market_value = np.nan_to_num(columns["market_value"])
+    cost_basis = np.nan_to_num(columns["cost_basis"])
+    unrealized_pl = np.nan_to_num(columns["unrealized_pl"])
+    intraday_pl = np.nan_to_num(columns["unrealized_intraday_pl"])
+
+    # Shorts carry a negative market value; weights are of gross exposure
+    gross_values = np.abs(market_value)
+    gross = gross_values.sum()
+    weights = gross_values / gross if gross else np.zeros_like(gross_values)
+    plpc = _ratio(unrealized_pl, np.abs(cost_basis))
+
+    total_value = market_value.sum()
+    total_cost = cost_basis.sum()
+    total_pl = unrealized_pl.sum()
+    total_intraday = intraday_pl.sum()
+    previous_value = total_value - total_intraday
+    hhi = float(np.square(weights).sum())
+
+    order = np.argsort(-gross_values, kind="stable")
+    if top is not None:
+        order = order[:top]
+
+    return {
+        "count": int(len(symbols)),
+        "totals": {
+            "market_value": _round(total_value),
+            "cost_basis": _round(total_cost),
+            "unrealized_pl": _round(total_pl),
+            "unrealized_plpc": _round(total_pl / abs(total_cost) if total_cost else np.nan, 4),
+            "intraday_pl": _round(total_intraday),
+            "intraday_plpc": _round(total_intraday / abs(previous_value) if previous_value else np.nan, 4),
+        },
+        "exposure": {
+            "long": _round(market_value[market_value > 0].sum()),
+            "short": _round(-market_value[market_value < 0].sum()),
+            "gross": _round(gross),
+            "net": _round(total_value),
+        },
+        "concentration": {
+            "largest_symbol": symbols[order[0]] if len(order) else None,
+            "largest_weight": _round(weights.max(), 4) if len(weights) else None,
+            "herfindahl_index": _round(hhi, 4),
+            "effective_positions": _round(1 / hhi, 2) if hhi else None,
+        },
+        "winners": symbols[unrealized_pl > 0].tolist(),
+        "losers": symbols[unrealized_pl < 0].tolist(),
+        "positions": [
+            {
+                "symbol": symbols[i],
+                "qty": _round(columns["qty"][i], 8),
+                "current_price": _round(columns["current_price"][i], 8),
+                "market_value": _round(market_value[i]),
+                "weight": _round(weights[i], 4),
+                "unrealized_pl": _round(unrealized_pl[i]),
+                "unrealized_plpc": _round(plpc[i], 4),
+                "intraday_pl": _round(intraday_pl[i]),
+            }
+            for i in order.tolist()
+        ],
+    }
+
+
+def summarize_analytics(analytics: Dict[str, Any]) -> str:
+    """Short plain-text summary of analyze_positions() output for an agent prompt."""
+    if not analytics["count"]:
+        return "No open crypto positions."
+    totals, exposure, concentration = analytics["totals"], analytics["exposure"], analytics["concentration"]
+    lines: List[str] = [
+        f"Open positions: {analytics['count']}",
+        f"Total market value: ${totals['market_value']:,.2f} (cost basis ${totals['cost_basis']:,.2f})",
+        f"Unrealized P/L: ${totals['unrealized_pl']:,.2f} ({(totals['unrealized_plpc'] or 0):.2%})",
+        f"Today's P/L: ${totals['intraday_pl']:,.2f} ({(totals['intraday_plpc'] or 0):.2%})",
+        f"Exposure: long ${exposure['long']:,.2f}, short ${exposure['short']:,.2f}, net ${exposure['net']:,.2f}",
+        f"Largest position: {concentration['largest_symbol']} at {concentration['largest_weight']:.1%} "
+        f"(effective positions {concentration['effective_positions']})",
+        f"In profit: {', '.join(analytics['winners']) or 'none'}",
+        f"At a loss: {', '.join(analytics['losers']) or 'none'}",
+        "Positions (symbol, qty, price, value, weight, P/L):",
+    ]
+    for position in analytics["positions"]:
+        plpc = position["unrealized_plpc"]
+        lines.append(
+            f"- {position['symbol']}: {position['qty']} @ {position['current_price']}, "
+            f"${position['market_value']:,.2f}, {position['weight']:.1%}, "
+            f"${position['unrealized_pl']:,.2f}" + (f" ({plpc:.2%})" if plpc is not None else "")
+        )
+    return "\n".join(lines)
@@ -0,0 +1,261 @@
+"""
+Position State
+
+This module tracks a version stamp per brokerage account and caches a
+snapshot of each account's open positions. Anything that can change an
+account's positions (an order being submitted or filling, a position being
+closed) bumps the version; caches that derive from positions include it in
+their keys or compare against it, so their stale entries simply stop
+matching.
+
+Components:
+- PositionVersions: per-account version counters
+- PositionRecord: one position with its numbers parsed to Decimal once, at ingestion
+- PositionSnapshot: one account's open positions, indexed by symbol and asset id
+- PositionStore: per-account snapshots with a short TTL and single-flight fetches
+
+Accounts are identified by a fingerprint of the Alpaca API key, never the
+key itself.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.logging import logging
+from app.core.config import credential_fingerprint, get_settings
+
+QUOTE_CURRENCY = "USD"
+
+PositionLoader = Callable[[], Awaitable[List[Any]]]
+
+
+def account_id(keys: Optional[Dict[str, str]]) -> Optional[str]:
+    """Stable, non-secret identifier of the Alpaca account behind a set of keys."""
+    if not keys or not keys.get("alpaca_api_key"):
+        return None
+    return credential_fingerprint(keys["alpaca_api_key"])
+
+
+class PositionVersions:
+    """Monotonic per-account counters of position-changing events."""
+
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def current(self, account: str) -> int:
+        """Return the account's current version (0 until something changes)."""
+        return self._versions.get(account, 0)
+
+    def bump(self, account: Optional[str]) -> int:
+        """
+        Record that the account's positions may have changed.
+
+        Args:
+            account: Account identifier from account_id(); ignored if None
+
+        Returns:
+            int: The new version
+        """
+        if account is None:
+            return 0
+        with self._lock:
+            version = self._versions.get(account, 0) + 1
+            self._versions[account] = version
+        return version
+
+
+def _decimal(value: Any) -> Optional[Decimal]:
+    if value is None or value == "":
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+class PositionRecord:
+    """
+    Compact internal form of an Alpaca Position.
+
+    Numeric fields are Decimals (None when Alpaca sent null), parsed once when
+    the snapshot is built; consumers compare and sort them directly and only
+    the API boundary renders them back to strings (see as_strings()).
+    """
+
+    TEXT_FIELDS = ("symbol", "asset_id", "exchange", "asset_class", "side")
+    NUMERIC_FIELDS = (
+        "avg_entry_price", "qty", "market_value", "cost_basis",
+        "unrealized_pl", "unrealized_plpc", "unrealized_intraday_pl", "unrealized_intraday_plpc",
+        "current_price", "lastday_price", "change_today",
+        "swap_rate", "avg_entry_swap_rate", "qty_available"
+    )
+    __slots__ = TEXT_FIELDS + NUMERIC_FIELDS + ("asset_marginable",)
+
+    def __init__(self, **fields: Any):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_position(cls, position: Any) -> "PositionRecord":
+        """Parse an alpaca Position model (or a dict of its fields)."""
+        get = position.get if isinstance(position, dict) else lambda name: getattr(position, name, None)
+        fields: Dict[str, Any] = {}
+        for name in cls.TEXT_FIELDS:
+            value = get(name)
+            fields[name] = None if value is None else str(getattr(value, "value", value))
+        for name in cls.NUMERIC_FIELDS:
+            fields[name] = _decimal(get(name))
+        fields["asset_marginable"] = bool(get("asset_marginable"))
+        return cls(**fields)
+
+    def as_strings(self, exclude: Tuple[str, ...] = ("asset_id",)) -> Dict[str, Any]:
+        """Render for the API: numbers as Alpaca-style strings, with nulls as "0"."""
+        fields: Dict[str, Any] = {name: getattr(self, name) for name in self.TEXT_FIELDS if name not in exclude}
+        fields["asset_marginable"] = self.asset_marginable
+        for name in self.NUMERIC_FIELDS:
+            value = getattr(self, name)
+            # Fixed-point like Alpaca's own strings; str() would give "5E-8" for tiny quantities
+            fields[name] = "0" if value is None else format(value, "f")
+        return fields
+
+    def __repr__(self) -> str:
+        return f"PositionRecord(symbol={self.symbol!r}, qty={self.qty}, market_value={self.market_value})"
+
+
+@dataclass(frozen=True)
+class PositionSnapshot:
+    """Open positions of one account as of one fetch."""
+    positions: Tuple[PositionRecord, ...]
+    version: int
+    fetched_at: float
+    index: Dict[str, PositionRecord] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, positions: List[Any], version: int) -> "PositionSnapshot":
+        """Parse positions into records and index them by symbol ("BTC/USD" and "BTCUSD"), base currency and asset id."""
+        records = [PositionRecord.from_position(position) for position in positions]
+        index: Dict[str, PositionRecord] = {}
+        for position in records:
+            symbol = position.symbol.upper()
+            if "/" in symbol:
+                base, _, quote = symbol.partition("/")
+            elif symbol.endswith(QUOTE_CURRENCY):
+                base, quote = symbol[:-len(QUOTE_CURRENCY)], QUOTE_CURRENCY
+            else:
+                base, quote = symbol, ""
+            index[str(position.asset_id).lower()] = position
+            for key in (symbol, base + quote, f"{base}/{quote}" if quote else base):
+                index[key] = position
+            # Prefer the USD pair when a base currency is held against several quotes
+            if base not in index or quote == QUOTE_CURRENCY:
+                index[base] = position
+        return cls(positions=tuple(records), version=version, fetched_at=time.monotonic(), index=index)
+
+    def lookup(self, key: Any) -> Optional[PositionRecord]:
+        """
+        Find an open position by symbol, base currency or asset id.
+
+        Args:
+            key: "BTC/USD", "BTCUSD", "btc" or an asset id
+
+        Returns:
+            Optional[PositionRecord]: The open position, or None if the account holds none
+        """
+        key = str(key).strip()
+        return self.index.get(key.upper()) or self.index.get(key.lower())
+
+
+class PositionStore:
+    """
+    Per-account position snapshots with a short TTL.
+
+    A snapshot is served while it is younger than the TTL and its version
+    still matches the account's current version, so a bump (order submitted
+    or filled, position closed) invalidates it immediately. Concurrent reads
+    of the same account share one upstream fetch.
+    """
+
+    def __init__(self, ttl: float, versions: PositionVersions):
+        self.ttl = ttl
+        self.versions = versions
+        self._snapshots: Dict[str, PositionSnapshot] = {}
+        self._in_flight: Dict[Tuple[str, int], asyncio.Task] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "fetches": 0, "fetch_errors": 0}
+
+    def cached(self, account: str) -> Optional[PositionSnapshot]:
+        """Return the account's snapshot if it is fresh and current, without fetching."""
+        snapshot = self._snapshots.get(account)
+        if (
+            snapshot is None
+            or snapshot.version != self.versions.current(account)
+            or time.monotonic() - snapshot.fetched_at >= self.ttl
+        ):
+            return None
+        return snapshot
+
+    async def get(self, account: str, loader: PositionLoader) -> PositionSnapshot:
+        """
+        Return a fresh snapshot of the account's positions, fetching at most once per version.
+
+        Args:
+            account: Account identifier from account_id()
+            loader: Coroutine factory that fetches all open positions upstream
+
+        Returns:
+            PositionSnapshot: Snapshot that is younger than the TTL and matches the current version
+
+        Raises:
+            Exception: Whatever the loader raised
+        """
+        snapshot = self.cached(account)
+        if snapshot is not None:
+            self._stats["hits"] += 1
+            return snapshot
+
+        version = self.versions.current(account)
+        key = (account, version)
+        task = self._in_flight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self._stats["coalesced"] += 1
+        else:
+            self._stats["misses"] += 1
+            task = asyncio.create_task(self._fetch(account, version, loader))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    def invalidate(self, account: Optional[str]) -> None:
+        """Mark the account's positions as changed so the next read refetches."""
+        self.versions.bump(account)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of cached accounts and hit/miss/fetch counters."""
+        return {**self._stats, "accounts": len(self._snapshots), "ttl": self.ttl}
+
+    async def _fetch(self, account: str, version: int, loader: PositionLoader) -> PositionSnapshot:
+        self._stats["fetches"] += 1
+        try:
+            positions = await loader()
+        except Exception as e:
+            self._stats["fetch_errors"] += 1
+            logging.error_with_emoji("❌ Position snapshot fetch failed: %s", e)
+            raise
+        snapshot = PositionSnapshot.build(positions, version)
+        # A bump during the fetch leaves this snapshot stale; cached() will reject it
+        self._snapshots[account] = snapshot
+        return snapshot
+
+
+# Global instances
+position_versions = PositionVersions()
+position_store = PositionStore(ttl=get_settings().POSITION_SNAPSHOT_TTL, versions=position_versions)
@@ -0,0 +1,224 @@
+"""
+Crypto Quote Store
+
+This module keeps the latest bid, ask and last trade price of every streamed
+crypto pair (see market_data.py) in a compact column store: one array('d')
+per field, with one slot per symbol. Updates are in-place float writes, so a
+busy feed allocates nothing per tick; reads build a small Quote tuple on
+demand.
+
+Order tools use it to convert notional amounts to quantities and to sanity
+check limit prices without an extra API hop.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import math
+import time
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+QUOTE_CURRENCY = "USD"
+NAN = float("nan")
+
+
+def _timestamp(value: Any) -> float:
+    """Epoch seconds from a msgpack Timestamp, datetime, ISO string or number."""
+    if value is None:
+        return time.time()
+    if hasattr(value, "to_unix"):
+        return value.to_unix()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    return float(value)
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+class Quote(NamedTuple):
+    """Latest market data for one symbol."""
+    symbol: str
+    bid: Optional[float]
+    ask: Optional[float]
+    last: Optional[float]
+    updated_at: float  # Epoch seconds of the newest quote or trade
+
+    @property
+    def mid(self) -> Optional[float]:
+        """Midpoint of bid and ask, falling back to the last trade."""
+        if self.bid is not None and self.ask is not None:
+            return (self.bid + self.ask) / 2
+        return self.last
+
+    @property
+    def age(self) -> float:
+        """Seconds since the last update."""
+        return time.time() - self.updated_at
+
+    def reference_price(self, side: str) -> Optional[float]:
+        """Price an order on this side would likely trade at: the ask for buys, the bid for sells."""
+        price = self.ask if side == "buy" else self.bid
+        return price if price is not None else self.mid
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-friendly representation."""
+        return {
+            "symbol": self.symbol,
+            "bid": self.bid,
+            "ask": self.ask,
+            "last": self.last,
+            "mid": self.mid,
+            "updated_at": datetime.fromtimestamp(self.updated_at).astimezone().isoformat(),
+            "age_seconds": round(self.age, 3),
+        }
+
+
+class QuoteStore:
+    """Array-backed latest bid/ask/last per symbol, written only from the event loop."""
+
+    def __init__(self):
+        self._slots: Dict[str, int] = {}  # Every accepted spelling of a symbol -> slot
+        self._symbols: List[str] = []  # Slot -> canonical symbol
+        self._bid = array("d")
+        self._ask = array("d")
+        self._last = array("d")
+        self._updated = array("d")
+        self._stats = {"quotes": 0, "trades": 0, "ignored": 0}
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def ingest(self, message: Dict[str, Any]) -> bool:
+        """
+        Apply one raw Alpaca market-data message ("T": "q" quote or "t" trade).
+
+        Returns:
+            bool: Whether the message updated the store
+        """
+        kind = message.get("T")
+        if kind == "q":
+            self.update_quote(message["S"], message.get("bp"), message.get("ap"), _timestamp(message.get("t")))
+        elif kind == "t":
+            self.update_trade(message["S"], message["p"], _timestamp(message.get("t")))
+        else:
+            self._stats["ignored"] += 1
+            return False
+        return True
+
+    def update_quote(self, symbol: str, bid: Optional[float], ask: Optional[float], timestamp: float) -> None:
+        """Record the latest top of book for a symbol."""
+        slot = self._slot(symbol)
+        if bid:
+            self._bid[slot] = bid
+        if ask:
+            self._ask[slot] = ask
+        self._updated[slot] = max(self._updated[slot], timestamp)
+        self._stats["quotes"] += 1
+
+    def update_trade(self, symbol: str, price: float, timestamp: float) -> None:
+        """Record the latest trade price for a symbol."""
+        slot = self._slot(symbol)
+        self._last[slot] = price
+        self._updated[slot] = max(self._updated[slot], timestamp)
+        self._stats["trades"] += 1
+
+    def get(self, symbol: str, max_age: Optional[float] = None) -> Optional[Quote]:
+        """
+        Look up the latest quote by "BTC/USD", "BTCUSD" or "BTC".
+
+        Args:
+            symbol: Symbol in any accepted spelling
+            max_age: Treat quotes older than this many seconds as missing
+
+        Returns:
+            Optional[Quote]: The quote, or None if unknown or too old
+        """
+        slot = self._slots.get(symbol.strip().upper())
+        if slot is None:
+            return None
+        quote = Quote(
+            symbol=self._symbols[slot],
+            bid=_optional(self._bid[slot]),
+            ask=_optional(self._ask[slot]),
+            last=_optional(self._last[slot]),
+            updated_at=self._updated[slot],
+        )
+        if max_age is not None and quote.age > max_age:
+            return None
+        return quote
+
+    def get_many(self, symbols: Optional[Iterable[str]] = None) -> List[Quote]:
+        """Quotes for the given symbols (unknown ones are skipped), or for every symbol."""
+        symbols = self._symbols if symbols is None else symbols
+        return [quote for quote in (self.get(symbol) for symbol in symbols) if quote is not None]
+
+    def clear(self) -> None:
+        """Drop every symbol, e.g. when the feed restarts."""
+        self.__init__()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of symbols and update counters."""
+        return {**self._stats, "symbols": len(self._symbols), "bytes": 4 * self._bid.itemsize * len(self._bid)}
+
+    def _slot(self, symbol: str) -> int:
+        symbol = symbol.upper()
+        slot = self._slots.get(symbol)
+        if slot is not None:
+            return slot
+        if "/" not in symbol and symbol.endswith(QUOTE_CURRENCY) and len(symbol) > len(QUOTE_CURRENCY):
+            symbol = f"{symbol[:-len(QUOTE_CURRENCY)]}/{QUOTE_CURRENCY}"
+            slot = self._slots.get(symbol)
+            if slot is not None:
+                return slot
+
+        slot = len(self._symbols)
+        self._symbols.append(symbol)
+        for column in (self._bid, self._ask, self._last):
+            column.append(NAN)
+        self._updated.append(0.0)
+
+        base, _, quote = symbol.partition("/")
+        self._slots[symbol] = slot
+        self._slots[base + quote] = slot
+        # A bare base currency means its USD pair
+        if quote == QUOTE_CURRENCY or base not in self._slots:
+            self._slots[base] = slot
+        return slot
+
+
+def check_limit_price(side: str, limit_price: float, quote: Quote, max_deviation: float) -> None:
+    """
+    Reject limit prices that would trade far through the market (likely typos).
+
+    A buy limit far above the ask, or a sell limit far below the bid, is
+    immediately marketable at a much worse price than the user probably
+    meant. Resting orders away from the market are left alone.
+
+    Raises:
+        ValueError: If the limit price is more than max_deviation through the market
+    """
+    reference = quote.reference_price(side)
+    if reference is None:
+        return
+    if side == "buy" and limit_price > reference * (1 + max_deviation):
+        raise ValueError(
+            f"Limit price {limit_price} is {limit_price / reference - 1:.0%} above the current ask of "
+            f"{reference} for {quote.symbol}; the order would fill at market"
+        )
+    if side == "sell" and limit_price < reference * (1 - max_deviation):
+        raise ValueError(
+            f"Limit price {limit_price} is {1 - limit_price / reference:.0%} below the current bid of "
+            f"{reference} for {quote.symbol}; the order would fill at market"
+        )
+
+
+# Global instance
+quote_store = QuoteStore()
@@ -0,0 +1,265 @@
+"""
+Broker Rate Limiting
+
+This module keeps Kryptt inside Alpaca's per-key request quota. Every broker
+call acquires a token from the bucket of the credential it uses before it is
+handed to the broker executor, so bursts of agent traffic queue locally
+instead of turning into 429 errors.
+
+Components:
+- TokenBucket: per-credential token bucket with a priority wait queue
+- RateLimiter: buckets keyed by credential fingerprint, fed by response headers
+- Priority: order submissions and cancels go ahead of reads, reads ahead of background work
+
+The buckets adapt to what Alpaca reports. X-RateLimit-Limit sets the rate,
+X-RateLimit-Remaining caps the local token count, and a 429 empties the
+bucket until X-RateLimit-Reset (or an exponential backoff when the header is
+missing).
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .config import credential_fingerprint, get_settings
+
+API_KEY_HEADER = "APCA-API-KEY-ID"
+
+
+class Priority(IntEnum):
+    """Scheduling class of a broker call; lower values are served first."""
+    ORDER = 0
+    READ = 1
+    BACKGROUND = 2
+
+
+# TradingClient methods that place, change or cancel orders and positions
+ORDER_METHODS = {
+    "submit_order", "replace_order_by_id", "cancel_order_by_id", "cancel_orders",
+    "close_position", "close_all_positions", "exercise_options_position",
+}
+
+
+def priority_for(fn: Callable[..., Any]) -> Priority:
+    """Default priority of a broker call: order actions first, everything else as a read."""
+    return Priority.ORDER if getattr(fn, "__name__", "") in ORDER_METHODS else Priority.READ
+
+
+def credential_of(fn: Callable[..., Any]) -> Optional[str]:
+    """Fingerprint of the API key behind a bound TradingClient method."""
+    api_key = getattr(getattr(fn, "__self__", None), "_api_key", None)
+    return credential_fingerprint(api_key) if api_key else None
+
+
+class TokenBucket:
+    """
+    Token bucket with a priority queue of waiters.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. A call
+    that finds a token and no one waiting ahead of it proceeds immediately;
+    otherwise it waits in (priority, arrival) order until one drains to it.
+    """
+
+    def __init__(self, rate: float, capacity: float, max_backoff: float = 60.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_backoff = max_backoff
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._backoff = 1.0
+        self._lock = threading.Lock()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._drainer: Optional[asyncio.Task] = None
+        self._stats = {"granted": 0, "queued": 0, "rate_limited": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    async def acquire(self, priority: Priority = Priority.READ) -> float:
+        """
+        Wait for a token.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        started = time.monotonic()
+        with self._lock:
+            if not self._waiters and self._take(started):
+                self._record_grant(0.0)
+                return 0.0
+            self._stats["queued"] += 1
+
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (int(priority), next(self._sequence), future))
+        if self._drainer is None or self._drainer.done() or self._drainer.get_loop() is not asyncio.get_running_loop():
+            self._drainer = asyncio.create_task(self._drain())
+        # A cancelled waiter stays in the heap; the drainer skips it
+        await future
+        waited = time.monotonic() - started
+        with self._lock:
+            self._record_grant(waited)
+        return waited
+
+    def observe(self, status: int, limit: Optional[int], remaining: Optional[int], reset: Optional[float]) -> None:
+        """
+        Adjust the bucket from one broker response (called from worker threads).
+
+        Args:
+            status: HTTP status code
+            limit: X-RateLimit-Limit (requests per minute)
+            remaining: X-RateLimit-Remaining
+            reset: X-RateLimit-Reset (epoch seconds)
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            if limit:
+                self.rate = limit / 60.0
+            if remaining is not None:
+                self._tokens = min(self._tokens, float(remaining))
+            if status == 429:
+                self._stats["rate_limited"] += 1
+                self._tokens = 0.0
+                wait = reset - time.time() if reset else self._backoff
+                self._blocked_until = max(self._blocked_until, now + min(max(wait, 0.0), self.max_backoff))
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+            else:
+                self._backoff = 1.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current fill, queue depth by priority and wait times."""
+        now = time.monotonic()
+        with self._lock:
+            self._refill(now)
+            queued = [waiter for waiter in self._waiters if not waiter[2].done()]
+            granted = self._stats["granted"]
+            return {
+                "tokens": round(self._tokens, 2),
+                "capacity": self.capacity,
+                "fill_ratio": round(self._tokens / self.capacity, 3) if self.capacity else 0.0,
+                "rate_per_second": round(self.rate, 3),
+                "queue_depth": len(queued),
+                "queue_depth_by_priority": {
+                    priority.name.lower(): sum(1 for waiter in queued if waiter[0] == priority)
+                    for priority in Priority
+                },
+                "blocked_for_seconds": round(max(self._blocked_until - now, 0.0), 3),
+                "granted": granted,
+                "queued": self._stats["queued"],
+                "rate_limited": self._stats["rate_limited"],
+                "avg_queue_wait_ms": (self._stats["total_wait"] / granted * 1000) if granted else 0.0,
+                "max_queue_wait_ms": self._stats["max_wait"] * 1000,
+            }
+
+    async def _drain(self) -> None:
+        while self._waiters:
+            now = time.monotonic()
+            with self._lock:
+                # Drop waiters whose callers gave up
+                while self._waiters and self._waiters[0][2].done():
+                    heapq.heappop(self._waiters)
+                if not self._waiters:
+                    return
+                if self._take(now):
+                    _, _, future = heapq.heappop(self._waiters)
+                    future.set_result(None)
+                    continue
+                delay = max(self._blocked_until - now, (1.0 - self._tokens) / self.rate if self.rate else 1.0)
+            await asyncio.sleep(max(delay, 0.001))
+
+    def _take(self, now: float) -> bool:
+        if now < self._blocked_until:
+            return False
+        self._refill(now)
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _record_grant(self, waited: float) -> None:
+        self._stats["granted"] += 1
+        self._stats["total_wait"] += waited
+        self._stats["max_wait"] = max(self._stats["max_wait"], waited)
+
+
+class RateLimiter:
+    """Token buckets keyed by credential fingerprint."""
+
+    def __init__(self, requests_per_minute: int, burst: int):
+        self.requests_per_minute = requests_per_minute
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, credential: Optional[str]) -> TokenBucket:
+        """Get (or create) the bucket of one credential."""
+        key = credential or "default"
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(
+                    key,
+                    TokenBucket(rate=self.requests_per_minute / 60.0, capacity=self.burst)
+                )
+        return bucket
+
+    async def acquire(self, credential: Optional[str], priority: Priority = Priority.READ) -> float:
+        """Wait for a token from the credential's bucket; returns the seconds waited."""
+        return await self.bucket(credential).acquire(priority)
+
+    def observe_response(self, request: Any, response: Any) -> None:
+        """requests response hook: feed Alpaca's rate-limit headers into the matching bucket."""
+        api_key = request.headers.get(API_KEY_HEADER)
+        if not api_key:
+            return
+        headers = response.headers
+        self.bucket(credential_fingerprint(api_key)).observe(
+            response.status_code,
+            _header_number(headers, "X-RateLimit-Limit", int),
+            _header_number(headers, "X-RateLimit-Remaining", int),
+            _header_number(headers, "X-RateLimit-Reset", float),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-credential bucket state (keys are fingerprints, never the keys themselves)."""
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {credential: bucket.stats() for credential, bucket in buckets.items()}
+
+
+def _header_number(headers: Any, name: str, cast: Callable[[str], Any]) -> Optional[Any]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        return None
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the process-wide rate limiter, creating it from settings on first use."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                settings = get_settings()
+                _rate_limiter = RateLimiter(
+                    requests_per_minute=settings.BROKER_RATE_LIMIT_PER_MINUTE,
+                    burst=settings.BROKER_RATE_LIMIT_BURST
+                )
+    return _rate_limiter
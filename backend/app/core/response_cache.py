@@ -0,0 +1,137 @@
+"""
+Agent Response Cache
+
+This module caches the answers to read-only agent questions ("What are my
+current crypto positions?"). Entries are keyed by agent, account, the
+account's position version (see positions.py) and a normalized form of the
+question, so an order being placed or a position being closed invalidates
+every cached answer for that account without touching the cache. A short
+TTL bounds staleness from price moves and fills the backend never saw.
+
+Only standalone, read-only turns are cached: questions with mutating verbs or
+references to earlier turns are never looked up, and an answer is only
+stored if every tool the agent called is on the read-only list.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+from app.core.config import get_settings
+from app.core.positions import account_id, position_versions
+
+WORD_PATTERN = re.compile(r"[a-z0-9/.$]+")
+
+# Words that don't change what is being asked
+IGNORED_WORDS = {"please", "pls", "hey", "hi", "hello", "kryptt", "can", "could", "you", "me", "tell", "show", "the", "a", "an"}
+# Questions that could lead to a trade or a position change are never cached.
+# "open", "long" and "short" describe positions far more often than they ask for a trade.
+MUTATING_WORDS = {
+    "buy", "sell", "close", "liquidate", "exit", "order", "trade", "cancel",
+    "reduce", "flatten", "dump", "place", "execute", "submit",
+}
+# Questions that only make sense with the conversation history
+REFERENTIAL_WORDS = {"it", "that", "this", "those", "these", "them", "same", "again", "else", "more", "other"}
+
+CacheKey = Tuple[str, str, int, str]
+
+
+def normalize_query(message: str) -> str:
+    """Lowercase, strip punctuation and filler words, and collapse whitespace."""
+    words = WORD_PATTERN.findall(message.lower())
+    return " ".join(word.strip(".") for word in words if word not in IGNORED_WORDS and word.strip("."))
+
+
+def is_cacheable_query(normalized: str) -> bool:
+    """Whether a normalized question is standalone and read-only."""
+    words = set(normalized.split())
+    return bool(words) and not (words & MUTATING_WORDS) and not (words & REFERENTIAL_WORDS)
+
+
+def response_cache_key(agent_id: str, keys: Optional[Dict[str, str]], message: str) -> Optional[CacheKey]:
+    """
+    Build the cache key for a question, or None if it must not be cached.
+
+    Args:
+        agent_id: Agent answering the question
+        keys: Stored API keys, identifying the account
+        message: The user's chat message
+
+    Returns:
+        Optional[CacheKey]: (agent, account, position version, normalized question)
+    """
+    account = account_id(keys)
+    normalized = normalize_query(message)
+    if account is None or not is_cacheable_query(normalized):
+        return None
+    return (agent_id, account, position_versions.current(account), normalized)
+
+
+class ResponseCache:
+    """LRU cache of final agent answers with a TTL."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "skipped": 0}
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        """Return the cached answer for a key, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self._entries.pop(key, None)
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key: CacheKey, answer: str, tools_used: Iterable[str], read_only_tools: Iterable[str]) -> bool:
+        """
+        Store an answer if the turn only called read-only tools.
+
+        Args:
+            key: Cache key from the lookup
+            answer: The agent's final answer
+            tools_used: Names of the tools the agent called during the turn
+            read_only_tools: Names of the tools that cannot change account state
+
+        Returns:
+            bool: Whether the answer was stored
+        """
+        if not set(tools_used) <= set(read_only_tools):
+            self._stats["skipped"] += 1
+            return False
+        with self._lock:
+            self._entries[key] = (answer, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._stats["stores"] += 1
+        return True
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the entry count and hit/miss/store counters."""
+        return {**self._stats, "entries": len(self._entries)}
+
+
+def _create_response_cache() -> ResponseCache:
+    settings = get_settings()
+    return ResponseCache(ttl=settings.RESPONSE_CACHE_TTL, max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+# Global instance
+response_cache = _create_response_cache()
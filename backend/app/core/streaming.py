@@ -0,0 +1,127 @@
+"""
+Agent Response Streaming
+
+This module turns a LangGraph agent run into incremental Server-Sent Events.
+LLM tokens and tool-call progress are forwarded as they happen instead of
+buffering the whole agent run, and idle periods are filled with heartbeat
+comments so proxies and browsers keep the connection open.
+
+Events:
+- start: emitted immediately when the stream opens
+- token: {"content": "<delta>"} for every streamed LLM token
+- tool_start / tool_end: {"tool": "<name>", ...} around each tool call
+  (tool_end carries "status": "success" or "error")
+- message: {"role": "assistant", "content": "<final answer>"}
+- error: {"role": "assistant", "content": "<error message>"}
+- done: {"processing_time": <seconds>}
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional, Tuple
+from langchain_core.messages import AIMessage
+from app.core.metrics import streams_in_flight
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+# Tool outputs can be large order/position dumps; progress events only need a preview
+TOOL_OUTPUT_PREVIEW_CHARS = 500
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Frame a payload as a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def final_content(agent_response: Dict[str, Any]) -> str:
+    """Extract the assistant's final answer from an agent's output state."""
+    if agent_response.get("messages"):
+        last_message = agent_response["messages"][-1]
+        return last_message.content if isinstance(last_message, AIMessage) else str(last_message)
+    return str(agent_response.get("structured_response", "No response generated"))
+
+
+async def iter_agent_events(
+    agent: Any,
+    agent_state: Dict[str, Any],
+    config: Optional[Dict[str, Any]] = None
+) -> AsyncGenerator[Tuple[str, Dict[str, Any]], None]:
+    """
+    Run an agent and yield (event, payload) pairs as the graph executes.
+
+    Args:
+        agent: Compiled LangGraph agent
+        agent_state: Input state with the message history
+        config: RunnableConfig for the run; its "configurable" values reach the tools
+
+    Yields:
+        Tuple[str, Dict]: token, tool_start, tool_end and a final message event
+    """
+    final_state = None
+
+    async for event in agent.astream_events(agent_state, config=config, version="v2"):
+        kind = event["event"]
+
+        if kind == "on_chat_model_stream":
+            content = event["data"]["chunk"].content
+            # Chunks that only carry tool-call arguments have no text content
+            if isinstance(content, str) and content:
+                yield "token", {"content": content}
+
+        elif kind == "on_tool_start":
+            yield "tool_start", {"tool": event["name"], "input": event["data"].get("input")}
+
+        elif kind == "on_tool_end":
+            output = event["data"].get("output", "")
+            status = getattr(output, "status", "success")
+            output = str(getattr(output, "content", output))
+            yield "tool_end", {"tool": event["name"], "output": output[:TOOL_OUTPUT_PREVIEW_CHARS], "status": status}
+
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            # The root run finishing carries the final graph state
+            final_state = event["data"].get("output")
+
+    content = final_content(final_state) if isinstance(final_state, dict) else "No response generated"
+    yield "message", {"role": "assistant", "content": content}
+
+
+async def with_heartbeat(source: AsyncIterator[str], interval: float) -> AsyncGenerator[str, None]:
+    """
+    Forward SSE frames, emitting a heartbeat comment whenever the source is idle.
+
+    Args:
+        source: Async iterator of already framed SSE strings
+        interval: Seconds of silence before a heartbeat is sent
+    """
+    iterator = source.__aiter__()
+    pending = None
+    streams_in_flight.inc()
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield ": heartbeat\n\n"
+                continue
+
+            next_item, pending = pending, None
+            try:
+                yield next_item.result()
+            except StopAsyncIteration:
+                break
+    finally:
+        streams_in_flight.dec()
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,115 @@
+"""
+Rolling Conversation Summarization
+
+This module keeps agent prompts small on long sessions. Once a session's
+history grows past MEMORY_SUMMARY_TRIGGER_TOKENS, its oldest turns are folded
+into the session's rolling summary by a background task, leaving about
+MEMORY_SUMMARY_KEEP_TOKENS of recent history verbatim. Summaries are
+incremental: each run only sends the previous summary plus the newly folded
+turns to the LLM, never the whole conversation.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+from typing import Callable, Dict, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+from app.core.logging import logging
+from app.core.config import get_settings
+from app.core.memory import memory_store, SessionKey
+from app.api.v1.settings import api_keys_store
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a crypto trader and a trading assistant.
+Update the existing summary with the new turns. Keep every order, symbol, quantity, price, position and
+outcome that was mentioned, plus any stated preferences. Be concise and factual; do not add commentary."""
+
+
+def render_transcript(messages: List[BaseMessage]) -> str:
+    """Render messages as a plain 'role: content' transcript."""
+    return "\n".join(f"{message.type}: {message.content}" for message in messages)
+
+
+class ConversationSummarizer:
+    """Schedules at most one background summarization per session."""
+
+    def __init__(
+        self,
+        trigger_tokens: int,
+        keep_tokens: int,
+        model: str,
+        llm_factory: Optional[Callable[[], BaseChatModel]] = None
+    ):
+        self.trigger_tokens = trigger_tokens
+        self.keep_tokens = keep_tokens
+        self.model = model
+        self.llm_factory = llm_factory or self._default_llm
+        self._in_flight: Dict[SessionKey, asyncio.Task] = {}
+
+    def maybe_schedule(self, session: SessionKey) -> Optional[asyncio.Task]:
+        """
+        Start a background summarization if the session has outgrown the trigger.
+
+        Returns:
+            Optional[asyncio.Task]: The scheduled task, or None if nothing was scheduled
+        """
+        memory = memory_store.get_memory(session)
+        if memory.token_count <= self.trigger_tokens and not memory.pending_fold:
+            return None
+        if session in self._in_flight:
+            return None
+
+        task = asyncio.create_task(self._summarize(session))
+        self._in_flight[session] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(session, None))
+        return task
+
+    async def _summarize(self, session: SessionKey) -> None:
+        folded = memory_store.messages_to_fold(session, self.keep_tokens)
+        if not folded:
+            return
+
+        previous = memory_store.get_summary(session)
+        prompt = [
+            SystemMessage(content=SUMMARY_PROMPT),
+            HumanMessage(content=(
+                f"Existing summary:\n{previous or '(none)'}\n\n"
+                f"New turns:\n{render_transcript(folded)}"
+            ))
+        ]
+
+        try:
+            result = await self.llm_factory().ainvoke(prompt)
+        except Exception as e:
+            # History stays intact; the next turn will try again
+            logging.error_with_emoji("❌ Summarization failed for %s: %s", session.agent_id, e)
+            return
+
+        memory_store.fold(session, folded, str(result.content).strip())
+        logging.info_with_emoji("📚 Folded %s messages into the summary for %s", len(folded), session.agent_id)
+
+    def _default_llm(self) -> BaseChatModel:
+        keys = api_keys_store["current"]
+        return ChatOpenAI(
+            model=self.model,
+            api_key=keys["groq"],
+            temperature=0,
+            max_retries=1,
+            base_url=get_settings().LLM_BASE_URL,
+        )
+
+
+def _create_summarizer() -> ConversationSummarizer:
+    settings = get_settings()
+    return ConversationSummarizer(
+        trigger_tokens=settings.MEMORY_SUMMARY_TRIGGER_TOKENS,
+        keep_tokens=settings.MEMORY_SUMMARY_KEEP_TOKENS,
+        model=settings.MEMORY_SUMMARY_MODEL
+    )
+
+# Global instance
+summarizer = _create_summarizer()
@@ -0,0 +1,547 @@
+"""
+Request Tracing
+
+This module records where the time of a request goes as a tree of spans:
+the HTTP request, each agent graph step, each LLM call, each tool call and
+each Alpaca call down to its HTTP request. Spans follow the OpenTelemetry
+data model (16-byte trace ids, 8-byte span ids, kinds, status, attributes)
+and finished traces are exported as OTLP/JSON, so any OpenTelemetry
+collector can read them; W3C traceparent headers are accepted and returned.
+
+Components:
+- Span / Trace: one timed operation, and every span of one request
+- Tracer: starts spans under the current one and keeps the last traces in a ring buffer
+- TracingMiddleware: pure ASGI middleware that opens the root span of each request
+- TracingCallback: LangChain callback that turns graph steps, LLM and tool runs into spans
+- ConsoleSpanExporter / FileSpanExporter: OTLP/JSON to the log stream or a JSONL file
+
+Finished traces are served by GET /debug/traces and /debug/trace/{trace_id}.
+Spans are only started under an open request span, so background work
+(feeds, prewarming) is not traced.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from random import random
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from .config import get_settings
+from .logging import logging, request_id_var, route_template
+
+SERVICE_NAME = "kryptt-api"
+TRACEPARENT_HEADER = "traceparent"
+ATTRIBUTE_PREVIEW_CHARS = 200
+
+# OTLP enum values
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+STATUS_CODES = {"unset": 0, "ok": 1, "error": 2}
+
+
+class Span:
+    """One timed operation in a trace."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status", "status_message")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], kind: str = "internal", attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+        self.status = "unset"
+        self.status_message = ""
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns is not None else None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException) -> None:
+        self.status = "error"
+        self.status_message = f"{type(error).__name__}: {error}"[:ATTRIBUTE_PREVIEW_CHARS]
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The span in OTLP/JSON form."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS[self.kind],
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": STATUS_CODES[self.status], "message": self.status_message},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    """Every span of one request, in start order."""
+
+    __slots__ = ("trace_id", "spans", "root")
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """The trace as one OTLP/JSON ExportTraceServiceRequest."""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "kryptt"}, "spans": [span.to_otlp() for span in self.spans]}],
+            }]
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        root = self.root
+        return {
+            "trace_id": self.trace_id,
+            "name": root.name if root else None,
+            "started_at": root.start_ns / 1e9 if root else None,
+            "duration_ms": root.duration_ms if root else None,
+            "status": root.status if root else None,
+            "spans": len(self.spans),
+        }
+
+    def tree(self) -> Dict[str, Any]:
+        """Nested spans with offsets from the start of the trace."""
+        origin = self.root.start_ns if self.root else min(span.start_ns for span in self.spans)
+        nodes = {
+            span.span_id: {
+                "name": span.name,
+                "kind": span.kind,
+                "offset_ms": round((span.start_ns - origin) / 1e6, 3),
+                "duration_ms": round(span.duration_ms, 3) if span.duration_ms is not None else None,
+                "status": span.status,
+                "status_message": span.status_message or None,
+                "attributes": span.attributes,
+                "children": [],
+            }
+            for span in list(self.spans)
+        }
+        roots = []
+        for span in list(self.spans):
+            parent = nodes.get(span.parent_id)
+            (parent["children"] if parent else roots).append(nodes[span.span_id])
+        return {**self.summary(), "spans": roots}
+
+    def waterfall(self) -> str:
+        """Plain-text rendering of the span tree: offset, duration and name per line."""
+        lines: List[str] = []
+
+        def walk(node: Dict[str, Any], depth: int) -> None:
+            duration = f"{node['duration_ms']:.1f}ms" if node["duration_ms"] is not None else "open"
+            error = f"  [{node['status_message']}]" if node["status"] == "error" else ""
+            lines.append(f"{node['offset_ms']:>9.1f}ms {duration:>10}  {'  ' * depth}{node['name']}{error}")
+            for child in node["children"]:
+                walk(child, depth + 1)
+
+        tree = self.tree()
+        lines.append(f"trace {tree['trace_id']}")
+        for node in tree["spans"]:
+            walk(node, 0)
+        return "\n".join(lines)
+
+
+class SpanExporter(ABC):
+    """Receives every trace whose root span has finished."""
+
+    @abstractmethod
+    def export(self, trace: Trace) -> None:
+        """Hand off a finished trace; must not block the caller."""
+
+    def shutdown(self) -> None:
+        """Flush and release resources."""
+
+
+class _LazyOtlpJson:
+    """Serializes a trace only when the log record is written (on the listener thread)."""
+
+    __slots__ = ("trace",)
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+
+    def __str__(self) -> str:
+        return json.dumps(self.trace.to_otlp(), default=str)
+
+
+class ConsoleSpanExporter(SpanExporter):
+    """Writes each trace as an OTLP/JSON line to the log stream."""
+
+    def __init__(self, logger_name: str = "kryptt.traces"):
+        self.logger = logging.getLogger(logger_name)
+
+    def export(self, trace: Trace) -> None:
+        self.logger.info("%s", _LazyOtlpJson(trace))
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends each trace as an OTLP/JSON line to a file, from a background thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[Trace]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace) -> None:
+        self._queue.put(trace)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                trace = self._queue.get()
+                if trace is None:
+                    return
+                try:
+                    f.write(json.dumps(trace.to_otlp(), default=str) + "\n")
+                    f.flush()
+                except Exception as e:
+                    logging.error_with_emoji("❌ Trace export failed: %s", e)
+
+
+# Span of the code currently running
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Starts spans and keeps the most recent finished traces.
+
+    A trace is complete when its root span ends; it is then added to the ring
+    buffer and handed to the exporters. Spans that end later (e.g. work the
+    request left running) are still attached to the buffered trace.
+    """
+
+    def __init__(self, buffer_size: int = 100, sample_rate: float = 1.0, exporters: Optional[List[SpanExporter]] = None):
+        self.buffer_size = buffer_size
+        self.sample_rate = sample_rate
+        self.exporters = exporters or []
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start_trace(self, name: str, kind: str = "server", traceparent: Optional[str] = None, attributes: Optional[Dict[str, Any]] = None) -> Optional[Span]:
+        """
+        Start the root span of a new trace, continuing a W3C traceparent if given.
+
+        Returns:
+            Optional[Span]: The root span, or None if the trace is not sampled
+        """
+        remote = _parse_traceparent(traceparent)
+        sampled = remote[2] if remote else random() < self.sample_rate
+        if not sampled:
+            return None
+        trace = Trace(remote[0] if remote else None)
+        span = Span(trace, name, remote[1] if remote else None, kind, attributes)
+        trace.root = span
+        trace.spans.append(span)
+        return span
+
+    def start_span(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None, parent: Optional[Span] = None) -> Optional[Span]:
+        """Start a child of parent (default: the current span); None outside a trace."""
+        parent = parent or current_span.get()
+        if parent is None:
+            return None
+        span = Span(parent.trace, name, parent.span_id, kind, attributes)
+        parent.trace.spans.append(span)
+        return span
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None) -> None:
+        """End a span; ending the root span completes the trace."""
+        if error is not None:
+            span.set_error(error)
+        elif span.status == "unset":
+            span.status = "ok"
+        span.end_ns = time.time_ns()
+        if span is span.trace.root:
+            self._complete(span.trace)
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None) -> Iterator[Optional[Span]]:
+        """Run a block as a child span of the current one (a no-op outside a trace)."""
+        span = self.start_span(name, kind, attributes)
+        if span is None:
+            yield None
+            return
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        else:
+            self.end_span(span)
+        finally:
+            current_span.reset(token)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def recent(self, limit: Optional[int] = None) -> List[Trace]:
+        """Finished traces, newest first."""
+        with self._lock:
+            traces = list(reversed(self._traces.values()))
+        return traces[:limit] if limit is not None else traces
+
+    def shutdown(self) -> None:
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+    def _complete(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            self._traces.move_to_end(trace.trace_id)
+            while len(self._traces) > self.buffer_size:
+                self._traces.popitem(last=False)
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logging.error_with_emoji("❌ Trace export failed: %s", e)
+
+
+def traceparent(span: Span) -> str:
+    """W3C traceparent header value for a span."""
+    return f"00-{span.trace_id}-{span.span_id}-01"
+
+
+def _parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace id, parent span id, sampled) from a W3C traceparent header, or None if invalid."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _preview(value: Any) -> str:
+    text = str(value)
+    return text if len(text) <= ATTRIBUTE_PREVIEW_CHARS else text[:ATTRIBUTE_PREVIEW_CHARS] + "..."
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware that opens the root span of every HTTP request.
+
+    The span covers the whole response, streamed bodies included, and is
+    named after the route template once routing has happened. The response
+    carries a traceparent header whose trace id can be looked up at
+    /debug/trace/{trace_id}.
+    """
+
+    def __init__(self, app: Any, tracer: Optional["Tracer"] = None, exclude_prefixes: Tuple[str, ...] = ("/debug/trace", "/metrics")):
+        self.app = app
+        self.tracer = tracer
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        tracer = self.tracer or get_tracer()
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_prefixes) or not get_settings().TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or ())
+        incoming = headers.get(TRACEPARENT_HEADER.encode())
+        span = tracer.start_trace(
+            f"{scope['method']} {scope['path']}",
+            kind="server",
+            traceparent=incoming.decode("latin-1") if incoming else None,
+            attributes={"http.request.method": scope["method"], "url.path": scope["path"]},
+        )
+        if span is None:
+            await self.app(scope, receive, send)
+            return
+        request_id = request_id_var.get()
+        if request_id:
+            span.set_attribute("request.id", request_id)
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                span.set_attribute("http.response.status_code", status)
+                if status >= 500:
+                    span.status = "error"
+                message["headers"] = [*message.get("headers", []), (TRACEPARENT_HEADER.encode(), traceparent(span).encode())]
+            await send(message)
+
+        token = current_span.set(span)
+        error: Optional[BaseException] = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            current_span.reset(token)
+            route = route_template(scope)
+            span.name = f"{scope['method']} {route}"
+            span.set_attribute("http.route", route)
+            tracer.end_span(span, error)
+
+
+class TracingCallback(BaseCallbackHandler):
+    """
+    LangChain callback that records agent graph steps, LLM calls and tool calls as spans.
+
+    It is passed in the run config, so it sees every run of the agent. Spans
+    are parented by LangChain's run ids; runs that are not traced themselves
+    (internal runnables of a graph node) pass their parent on to their
+    children. While a traced run is active it is the current span, so broker
+    calls made by a tool nest under that tool.
+    """
+
+    # Called directly on the event loop instead of in a thread pool
+    run_inline = True
+
+    def __init__(self, tracer: Optional["Tracer"] = None):
+        self.tracer = tracer
+        # run id -> (nearest traced span, span started by this run, span it replaced as current)
+        self._runs: Dict[UUID, Tuple[Optional[Span], Optional[Span], Optional[Span]]] = {}
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Any, *, run_id: UUID, parent_run_id: Optional[UUID] = None, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "chain"
+        node = (metadata or {}).get("langgraph_node")
+        # Only the graph itself and its nodes; not every runnable inside a node
+        traced = parent_run_id is None or (node is not None and name == node)
+        attributes = {"langgraph.node": node, "langgraph.step": (metadata or {}).get("langgraph_step")} if node else {}
+        self._start(run_id, parent_run_id, f"graph {name}" if parent_run_id is None else f"step {name}", "internal", attributes, traced)
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._start_llm(serialized, run_id, parent_run_id, kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        self._start_llm(serialized, run_id, parent_run_id, kwargs)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        span = self._runs.get(run_id, (None, None, None))[1]
+        if span is not None:
+            for generations in getattr(response, "generations", None) or []:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if usage:
+                        span.set_attribute("gen_ai.usage.input_tokens", usage.get("input_tokens", 0))
+                        span.set_attribute("gen_ai.usage.output_tokens", usage.get("output_tokens", 0))
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._start(run_id, parent_run_id, f"tool {name}", "internal", {"tool.name": name, "tool.input": _preview(input_str)}, True)
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error)
+
+    def _start_llm(self, serialized: Dict[str, Any], run_id: UUID, parent_run_id: Optional[UUID], kwargs: Dict[str, Any]) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or "llm"
+        self._start(run_id, parent_run_id, f"llm {model}", "client", {"gen_ai.request.model": model}, True)
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: str, attributes: Dict[str, Any], traced: bool) -> None:
+        parent = self._runs[parent_run_id][0] if parent_run_id in self._runs else current_span.get()
+        if parent is None:
+            return
+        if not traced:
+            self._runs[run_id] = (parent, None, None)
+            return
+        span = (self.tracer or get_tracer()).start_span(name, kind, {k: v for k, v in attributes.items() if v is not None}, parent=parent)
+        previous = current_span.get()
+        current_span.set(span)
+        self._runs[run_id] = (span, span, previous)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None) -> None:
+        _, span, previous = self._runs.pop(run_id, (None, None, None))
+        if span is None:
+            return
+        (self.tracer or get_tracer()).end_span(span, error)
+        if current_span.get() is span:
+            current_span.set(previous)
+
+
+def _create_tracer() -> Tracer:
+    settings = get_settings()
+    exporters: List[SpanExporter] = []
+    if settings.TRACE_EXPORTER == "console":
+        exporters.append(ConsoleSpanExporter())
+    elif settings.TRACE_EXPORTER == "file":
+        exporters.append(FileSpanExporter(settings.TRACE_EXPORT_PATH))
+    elif settings.TRACE_EXPORTER != "none":
+        raise ValueError(f"Unknown trace exporter: {settings.TRACE_EXPORTER}")
+    return Tracer(buffer_size=settings.TRACE_BUFFER_SIZE, sample_rate=settings.TRACE_SAMPLE_RATE, exporters=exporters)
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer, creating it from settings on first use."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = _create_tracer()
+    return _tracer
+
+
+# Passed in the run config of agent runs and direct tool calls
+tracing_callback = TracingCallback()
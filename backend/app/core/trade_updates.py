@@ -0,0 +1,240 @@
+"""
+Trade Updates Consumer
+
+This module runs a background asyncio task that consumes the account's
+trade-update stream and feeds the local order book (see order_book.py).
+Fill and partial-fill events also invalidate the account's position
+snapshot, so position tools refetch only when something actually changed.
+
+Sources:
+- AlpacaTradeUpdateSource: Alpaca's trade_updates websocket (alpaca-py TradingStream,
+  run by alpaca_stream.StreamRunner; a failed connect or login is a disconnect)
+- ReplayTradeUpdateSource: replays recorded events from a list or a JSONL file,
+  a local stand-in for tests and development
+
+On start the consumer opens the source first, then seeds the book with the
+open orders and positions from the REST API, then drains the stream, so no
+event that happens during seeding is lost.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Union
+from alpaca.trading.enums import QueryOrderStatus
+from alpaca.trading.models import TradeUpdate
+from alpaca.trading.requests import GetOrdersRequest
+from app.core.logging import logging
+from app.core.alpaca_stream import StreamRunner, TradeUpdatesStream
+from app.core.config import get_settings, get_trading_client
+from app.core.broker import call_broker
+from app.core.rate_limit import Priority
+from app.core.order_book import FILL_EVENTS, OrderBook, order_book
+from app.core.positions import account_id, position_store
+from app.api.v1.settings import on_keys_saved
+
+
+def parse_trade_update(message: Union[Dict[str, Any], TradeUpdate]) -> TradeUpdate:
+    """Parse a raw trade_updates message (with or without its stream envelope)."""
+    if isinstance(message, TradeUpdate):
+        return message
+    return TradeUpdate(**message.get("data", message))
+
+
+class TradeUpdateSource(ABC):
+    """A stream of trade-update events for one account."""
+
+    # Whether the book should be seeded from the REST API before consuming
+    seed_from_broker: bool = True
+
+    @property
+    def connected(self) -> bool:
+        """Whether events can currently arrive (replays are always connected)."""
+        return True
+
+    async def open(self) -> None:
+        """Start receiving (and buffering) events."""
+
+    @abstractmethod
+    def __aiter__(self) -> AsyncIterator[TradeUpdate]:
+        """Iterate over events as they arrive."""
+
+    async def close(self) -> None:
+        """Stop receiving events and release the connection."""
+
+
+class AlpacaTradeUpdateSource(TradeUpdateSource):
+    """Alpaca's trade_updates websocket, run in its own thread and buffered into an asyncio queue."""
+
+    def __init__(self, keys: Dict[str, str], url_override: Optional[str] = None, max_queue: int = 1024):
+        self._stream = TradeUpdatesStream(
+            keys["alpaca_api_key"],
+            keys["alpaca_secret_key"],
+            paper=True,
+            url_override=url_override
+        )
+        self._runner = StreamRunner(self._stream, "Trade updates", max_queue)
+
+    @property
+    def connected(self) -> bool:
+        return self._runner.connected
+
+    async def open(self) -> None:
+        self._stream.subscribe_trade_updates(self._runner.put)
+        # The stream reconnects by itself when a connection drops; a failed
+        # connect or login ends the runner, and iterating raises ConnectionError
+        self._runner.start()
+
+    def __aiter__(self) -> AsyncIterator[TradeUpdate]:
+        return self._runner.__aiter__()
+
+    async def close(self) -> None:
+        await self._runner.close()
+
+
+class ReplayTradeUpdateSource(TradeUpdateSource):
+    """Replays recorded trade updates; nothing is fetched from the broker."""
+
+    seed_from_broker = False
+
+    def __init__(self, events: Iterable[Union[Dict[str, Any], TradeUpdate]], delay: float = 0.0):
+        self.events = list(events)
+        self.delay = delay
+
+    @classmethod
+    def from_file(cls, path: str, delay: float = 0.0) -> "ReplayTradeUpdateSource":
+        """Load events from a JSONL file, one trade_updates message per line."""
+        with open(path) as f:
+            return cls([json.loads(line) for line in f if line.strip()], delay=delay)
+
+    async def __aiter__(self) -> AsyncIterator[TradeUpdate]:
+        for event in self.events:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield parse_trade_update(event)
+
+
+SourceFactory = Callable[[Dict[str, str]], TradeUpdateSource]
+
+
+def default_source_factory(keys: Dict[str, str]) -> TradeUpdateSource:
+    """Build the source selected by TRADE_UPDATES_SOURCE ("alpaca" or "replay")."""
+    settings = get_settings()
+    if settings.TRADE_UPDATES_SOURCE == "replay":
+        return ReplayTradeUpdateSource.from_file(settings.TRADE_UPDATES_REPLAY_PATH)
+    if settings.TRADE_UPDATES_SOURCE == "alpaca":
+        return AlpacaTradeUpdateSource(keys)
+    raise ValueError(f"Unknown trade updates source: {settings.TRADE_UPDATES_SOURCE}")
+
+
+class TradeUpdateConsumer:
+    """Background task that keeps an OrderBook in sync with a trade-update source."""
+
+    def __init__(self, book: OrderBook, source_factory: SourceFactory = default_source_factory, retry_delay: float = 5.0):
+        self.book = book
+        self.source_factory = source_factory
+        self.retry_delay = retry_delay
+        self._task: Optional[asyncio.Task] = None
+        self._source: Optional[TradeUpdateSource] = None
+        self._last_event_at: Optional[float] = None
+        self._stats = {"events": 0, "errors": 0, "restarts": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self, keys: Dict[str, str]) -> None:
+        """(Re)start consuming for the given keys with an empty book."""
+        await self.stop()
+        self.book.reset(account_id(keys))
+        self._task = asyncio.create_task(self._run(keys))
+        logging.info_with_emoji("📡 Trade updates consumer started")
+
+    async def stop(self) -> None:
+        """Stop the background task and close the source."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._source = None
+
+    async def wait_idle(self) -> None:
+        """Wait until the source is exhausted (replay sources end; live ones never do)."""
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return connection state and event counters."""
+        since = time.monotonic() - self._last_event_at if self._last_event_at else None
+        return {
+            **self._stats,
+            "running": self.running,
+            "connected": self._source is not None and self._source.connected,
+            "seconds_since_last_event": since,
+        }
+
+    async def _run(self, keys: Dict[str, str]) -> None:
+        while True:
+            source = self._source = self.source_factory(keys)
+            try:
+                await source.open()
+                if source.seed_from_broker:
+                    await self._seed(keys)
+                async for update in source:
+                    self._handle(update)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["errors"] += 1
+                logging.error_with_emoji("❌ Trade updates stream failed, retrying in %ss: %s", self.retry_delay, e)
+            finally:
+                self._source = None
+                await source.close()
+            self._stats["restarts"] += 1
+            await asyncio.sleep(self.retry_delay)
+
+    async def _seed(self, keys: Dict[str, str]) -> None:
+        trading_client = get_trading_client(keys)
+        open_orders = await call_broker(
+            trading_client.get_orders,
+            GetOrdersRequest(status=QueryOrderStatus.OPEN, limit=500),
+            priority=Priority.BACKGROUND
+        )
+        for order in open_orders:
+            self.book.record_order(order)
+        snapshot = await position_store.get(
+            account_id(keys) or "default",
+            lambda: call_broker(trading_client.get_all_positions)
+        )
+        self.book.seed_positions(snapshot.positions)
+        logging.info_with_emoji("📘 Order book seeded with %s open orders and %s positions", len(open_orders), len(snapshot.positions))
+
+    def _handle(self, update: TradeUpdate) -> None:
+        self._stats["events"] += 1
+        self._last_event_at = time.monotonic()
+        state = self.book.apply(update)
+        if getattr(update.event, "value", update.event) in FILL_EVENTS:
+            # The position changed; cached snapshots and answers for this account are stale
+            position_store.invalidate(self.book.account)
+        if state is not None:
+            logging.info_with_emoji("📬 %s order %s is %s", state.symbol, state.id[:8], state.status)
+
+
+# Global instance
+trade_update_consumer = TradeUpdateConsumer(order_book)
+
+@on_keys_saved
+async def restart_trade_updates(keys: Dict[str, str]) -> None:
+    """Follow the new account once keys are saved."""
+    if get_settings().TRADE_UPDATES_ENABLED:
+        await trade_update_consumer.start(keys)
@@ -0,0 +1,187 @@
+"""
+Broker HTTP Transport
+
+This module provides the shared HTTP transport mounted on every pooled
+TradingClient session. It bounds the number of connections per host, keeps
+connections alive between calls (so TLS handshakes are paid once), expires
+connections that sat idle past the keep-alive window, retries idempotent
+requests with exponential backoff, and hands every response to an optional
+hook (the rate limiter reads Alpaca's rate-limit headers there).
+
+Components:
+- TransportMetrics: checkout wait time and connection reuse counters
+- BrokerTransport: requests HTTPAdapter with instrumented urllib3 pools
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+class TransportMetrics:
+    """Thread-safe counters for connection checkouts and reuse."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.reused = 0
+        self.new_connections = 0
+        self.expired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_checkout(self, wait: float, reused: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if reused:
+                self.reused += 1
+
+    def record_new_connection(self) -> None:
+        with self._lock:
+            self.new_connections += 1
+
+    def record_expired(self) -> None:
+        with self._lock:
+            self.expired += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the counters plus derived reuse ratio and average checkout wait."""
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "reused": self.reused,
+                "new_connections": self.new_connections,
+                "expired_keepalive": self.expired,
+                "reuse_ratio": (self.reused / self.checkouts) if self.checkouts else 0.0,
+                "avg_checkout_wait_ms": (self.total_wait / self.checkouts * 1000) if self.checkouts else 0.0,
+                "max_checkout_wait_ms": self.max_wait * 1000,
+            }
+
+
+class _InstrumentedPoolMixin:
+    """Times connection checkouts and enforces the keep-alive expiry."""
+
+    metrics: TransportMetrics
+    keepalive_expiry: float
+
+    def _get_conn(self, timeout=None):
+        started = time.perf_counter()
+        conn = super()._get_conn(timeout=timeout)
+        wait = time.perf_counter() - started
+
+        last_used = getattr(conn, "_kryptt_last_used", None)
+        connected = getattr(conn, "sock", None) is not None
+        if connected and last_used is not None and time.monotonic() - last_used > self.keepalive_expiry:
+            # Closed connections are transparently reopened by urllib3 on the next request
+            conn.close()
+            connected = False
+            self.metrics.record_expired()
+
+        self.metrics.record_checkout(wait, reused=connected)
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn._kryptt_last_used = time.monotonic()
+        super()._put_conn(conn)
+
+    def _new_conn(self):
+        self.metrics.record_new_connection()
+        return super()._new_conn()
+
+
+class BrokerTransport(HTTPAdapter):
+    """
+    Shared HTTP adapter for Alpaca traffic.
+
+    Args:
+        max_connections: Maximum connections kept (and allowed) per host
+        keepalive_expiry: Seconds an idle connection may be reused for
+        max_retries: Retries for connection errors and 502/503/504 on idempotent methods
+        backoff_factor: Exponential backoff factor between retries
+        response_hook: Called with (request, response) after every response
+        tracer: Records each request as a span under the caller's current span
+
+    Note:
+        requests/urllib3 speak HTTP/1.1 only; keep-alive reuse is what removes
+        the per-call TLS handshake.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 32,
+        keepalive_expiry: float = 60.0,
+        max_retries: int = 2,
+        backoff_factor: float = 0.3,
+        response_hook: Optional[Callable[[Any, Any], None]] = None,
+        tracer: Optional[Any] = None
+    ):
+        self.metrics = TransportMetrics()
+        self.response_hook = response_hook
+        self.tracer = tracer
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        super().__init__(
+            pool_connections=max_connections,
+            pool_maxsize=max_connections,
+            max_retries=retry,
+            pool_block=True,
+        )
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attrs = {"metrics": self.metrics, "keepalive_expiry": self.keepalive_expiry}
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": type("BrokerHTTPConnectionPool", (_InstrumentedPoolMixin, HTTPConnectionPool), attrs),
+            "https": type("BrokerHTTPSConnectionPool", (_InstrumentedPoolMixin, HTTPSConnectionPool), attrs),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool configuration and checkout/reuse metrics."""
+        return {
+            "max_connections": self.max_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "open_pools": len(self.poolmanager.pools),
+            **self.metrics.snapshot(),
+        }
+
+    def send(self, request, **kwargs):
+        if self.tracer is None:
+            response = super().send(request, **kwargs)
+        else:
+            response = self._traced_send(request, **kwargs)
+        if self.response_hook is not None:
+            self.response_hook(request, response)
+        return response
+
+    def _traced_send(self, request, **kwargs):
+        # Runs in a broker worker thread, which carries the caller's context (and so its span)
+        with self.tracer.span(
+            f"HTTP {request.method}", kind="client", attributes={"http.request.method": request.method, "url.full": request.url}
+        ) as span:
+            response = super().send(request, **kwargs)
+            if span is not None:
+                span.set_attribute("http.response.status_code", response.status_code)
+                if response.status_code >= 400:
+                    span.status = "error"
+        return response
@@ -18,12 +18,20 @@ Social Media:
 """
 
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from .core.config import get_settings, initialize_trading_client
+from .core.broker import shutdown_broker_executor
 from .core.cors import setup_cors
-from .core.logging import setup_logging, RequestLoggingMiddleware, logging
+from .core.logging import setup_logging, shutdown_logging, RequestLoggingMiddleware, logging, request_metrics
+from .core.metrics import metrics, register_component_collectors
+from .core.tracing import TracingMiddleware, get_tracer
+from .core.memory import memory_store
 from .api.v1 import router as api_v1_router
 from .api.v1.settings import api_keys_store
+from .core.agent_factory import agent_factory
+from .core.trade_updates import trade_update_consumer
+from .core.market_data import market_data_feed
 
 # Create FastAPI application
 app = FastAPI(
@@ -41,7 +49,8 @@ setup_logging(settings)
 # Set up CORS
 setup_cors(app, settings)
 
-# Add request logging middleware
+# Add tracing and request logging middleware (logging outermost, so spans carry the request id)
+app.add_middleware(TracingMiddleware)
 app.add_middleware(RequestLoggingMiddleware)
 
 # Register API routers
@@ -60,15 +69,62 @@ async def root():
         "openapi_url": "/openapi.json"
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Broker, LLM, tool, stream, cache and request metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/metrics/requests")
+async def get_request_metrics():
+    """Per-route request counts and TTFB/TTLB latency percentiles since startup."""
+    return request_metrics.snapshot()
+
+@app.get("/debug/traces")
+async def list_traces(limit: int = 20):
+    """The most recent finished traces, newest first."""
+    return [trace.summary() for trace in get_tracer().recent(limit)]
+
+@app.get("/debug/trace/{trace_id}")
+async def get_trace(trace_id: str, format: str = "json"):
+    """
+    One trace as a span tree (format=json) or a text waterfall (format=text).
+    
+    The trace id is in the traceparent header of every traced response.
+    """
+    trace = get_tracer().get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found (only the last {get_tracer().buffer_size} are kept)")
+    if format == "text":
+        return PlainTextResponse(trace.waterfall())
+    return trace.tree()
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on application startup."""
+    register_component_collectors()
     if "current" in api_keys_store:
         try:
             initialize_trading_client(api_keys_store["current"])
             logging.info_with_emoji("🚀 Trading client initialized successfully")
         except Exception as e:
-            logging.error_with_emoji(f"❌ Failed to initialize trading client: {str(e)}")
+            logging.error_with_emoji("❌ Failed to initialize trading client: %s", e)
+        # Compile the agents now so the first chat request doesn't pay for it
+        agent_factory.prewarm(api_keys_store["current"])
+        if settings.TRADE_UPDATES_ENABLED:
+            await trade_update_consumer.start(api_keys_store["current"])
+        if settings.MARKET_DATA_ENABLED:
+            await market_data_feed.start(api_keys_store["current"])
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release background resources on application shutdown."""
+    await trade_update_consumer.stop()
+    await market_data_feed.stop()
+    shutdown_broker_executor()
+    memory_store.close()
+    get_tracer().shutdown()
+    logging.info_with_emoji("🛑 Streams, broker executor and memory store shut down")
+    shutdown_logging()
 
 if __name__ == "__main__":
     # Get port from environment variable or use default
@@ -81,5 +137,7 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=port,
         reload=False,
+        # One worker: saved API keys, the order dedup store and the broker rate limiter
+        # live in process memory, so a second worker would not see keys saved on the first
         workers=1
     )
@@ -0,0 +1,20 @@
+"""
+Kryptt Benchmarks
+
+Offline benchmark suite for the Kryptt API. It runs the real FastAPI app
+against a local stand-in for Alpaca's REST API and a deterministic
+OpenAI-compatible chat model, so no keys, network or market hours are
+needed and runs are comparable with each other.
+
+Modules:
+- mock_alpaca: stand-in Alpaca server with configurable latency and error rates
+- fake_llm: deterministic chat completions endpoint served by the same stand-in
+- runner: load generator and latency statistics
+- compare: regression check of a result file against a baseline
+- run: command line entry point (python -m benchmarks.run)
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
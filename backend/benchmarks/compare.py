@@ -0,0 +1,105 @@
+"""
+Benchmark Comparison
+
+Compares a result file from benchmarks.run against a baseline. A scenario
+regresses when a latency percentile grows, or throughput drops, by more than
+the relative tolerance, or when its error rate grows by more than the
+absolute error tolerance. Scenarios missing from either file are skipped.
+
+Usage:
+    python -m benchmarks.compare baseline.json current.json --tolerance 0.1
+
+Exits with status 1 when any scenario regressed.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+# Metric path, and whether a higher value is better
+METRICS = [
+    ("throughput_rps", True),
+    ("latency_ms.p50", False),
+    ("latency_ms.p95", False),
+    ("latency_ms.p99", False),
+]
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    tolerance: float = 0.1,
+    error_tolerance: float = 0.01
+) -> List[Dict[str, Any]]:
+    """
+    Compare two benchmark results scenario by scenario.
+
+    Args:
+        baseline: Result document to compare against
+        current: Result document of the new run
+        tolerance: Allowed relative change of throughput and latency
+        error_tolerance: Allowed absolute increase of the error rate
+
+    Returns:
+        List[Dict]: One row per scenario and metric with both values, the change and a regression flag
+    """
+    rows = []
+    for name, result in current["scenarios"].items():
+        reference = baseline["scenarios"].get(name)
+        if reference is None:
+            continue
+        for path, higher_is_better in METRICS:
+            before, after = _lookup(reference, path), _lookup(result, path)
+            change = (after - before) / before if before else 0.0
+            regressed = change < -tolerance if higher_is_better else change > tolerance
+            rows.append({"scenario": name, "metric": path, "baseline": before, "current": after, "change": change, "regression": regressed})
+        before, after = reference["error_rate"], result["error_rate"]
+        rows.append({
+            "scenario": name, "metric": "error_rate", "baseline": before, "current": after,
+            "change": after - before, "regression": after - before > error_tolerance,
+        })
+    return rows
+
+
+def format_report(rows: List[Dict[str, Any]]) -> str:
+    """Render comparison rows as a fixed-width table."""
+    lines = [f"{'scenario':<16}{'metric':<18}{'baseline':>12}{'current':>12}{'change':>10}"]
+    for row in rows:
+        change = f"{row['change']:+.2%}" if row["metric"] != "error_rate" else f"{row['change']:+.4f}"
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(f"{row['scenario']:<16}{row['metric']:<18}{row['baseline']:>12.2f}{row['current']:>12.2f}{change:>10}{flag}")
+    return "\n".join(lines)
+
+
+def _lookup(result: Dict[str, Any], path: str) -> float:
+    value: Any = result
+    for key in path.split("."):
+        value = value[key]
+    return float(value)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare a benchmark result against a baseline")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative change of latency and throughput")
+    parser.add_argument("--error-tolerance", type=float, default=0.01, help="Allowed absolute increase of the error rate")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.tolerance, args.error_tolerance)
+    print(format_report(rows))
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
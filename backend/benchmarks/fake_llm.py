@@ -0,0 +1,168 @@
+"""
+Fake Chat Model
+
+A deterministic stand-in for an OpenAI-compatible chat completions API. The
+agents talk to it through their real ChatOpenAI clients (LLM_BASE_URL), so a
+benchmark exercises the same request building, streaming and tool-call
+parsing as production, without a model in the loop.
+
+The reply is a fixed function of the conversation:
+- after a tool result, a short answer quoting the result
+- an order command ("buy 0.01 BTC") with create_new_order available: that tool call
+- a totals or profit question with get_portfolio_analytics available: that tool call
+- otherwise the first read tool offered (get_crypto_positions, get_order_status)
+- with no matching tool, a plain text answer
+
+Latency is modelled as time to first token plus a delay per streamed token.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ORDER_PATTERN = re.compile(r"\b(buy|sell)\s+(\d+(?:\.\d+)?)\s+([a-z]{2,6})\b")
+ANALYTICS_WORDS = ("total", "profit", "loss", "allocation", "exposure", "analytics")
+READ_TOOLS = ("get_crypto_positions", "get_order_status")
+TOOL_RESULT_PREVIEW_CHARS = 160
+
+
+@dataclass
+class FakeLlmProfile:
+    """Latency of the fake model."""
+    first_token_ms: float = 150.0
+    token_ms: float = 5.0
+
+
+def plan_reply(messages: List[Dict[str, Any]], tool_names: List[str]) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    Decide the next assistant turn.
+
+    Args:
+        messages: OpenAI-format chat messages
+        tool_names: Names of the tools offered with the request
+
+    Returns:
+        Tuple[Optional[Dict], str]: The tool call ({"name", "arguments"}) or None, and the text content
+    """
+    last = messages[-1] if messages else {"role": "user", "content": ""}
+    if last.get("role") == "tool":
+        result = " ".join(str(last.get("content", "")).split())[:TOOL_RESULT_PREVIEW_CHARS]
+        return None, f"Here is what I found: {result}"
+
+    text = _text(last.get("content")).lower()
+    order = ORDER_PATTERN.search(text)
+    if order and "create_new_order" in tool_names:
+        side, qty, symbol = order.groups()
+        return {"name": "create_new_order", "arguments": {
+            "symbol": f"{symbol.upper()}/USD", "side": side, "type": "market",
+            "qty": float(qty), "time_in_force": "gtc",
+        }}, ""
+    if "get_portfolio_analytics" in tool_names and any(word in text for word in ANALYTICS_WORDS):
+        return {"name": "get_portfolio_analytics", "arguments": {}}, ""
+    for name in READ_TOOLS:
+        if name in tool_names:
+            return {"name": name, "arguments": {}}, ""
+    return None, "I can help with your crypto positions and orders. What would you like to do?"
+
+
+def create_router(profile: FakeLlmProfile) -> APIRouter:
+    """Build the /v1/chat/completions route for the given latency profile."""
+    router = APIRouter(prefix="/v1", tags=["fake-llm"])
+
+    @router.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        tool_names = [tool["function"]["name"] for tool in body.get("tools") or []]
+        tool_call, content = plan_reply(messages, tool_names)
+        completion_id = "chatcmpl-" + _digest(messages)
+        model = body.get("model", "fake")
+        usage = _usage(messages, tool_call, content)
+
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                _stream(profile, completion_id, model, tool_call, content, usage if include_usage else None),
+                media_type="text/event-stream"
+            )
+
+        await asyncio.sleep((profile.first_token_ms + profile.token_ms * usage["completion_tokens"]) / 1000)
+        message: Dict[str, Any] = {"role": "assistant", "content": content or None}
+        if tool_call:
+            message["tool_calls"] = [_tool_call(completion_id, tool_call)]
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_call else "stop"}],
+            "usage": usage,
+        })
+
+    return router
+
+
+async def _stream(
+    profile: FakeLlmProfile,
+    completion_id: str,
+    model: str,
+    tool_call: Optional[Dict[str, Any]],
+    content: str,
+    usage: Optional[Dict[str, int]]
+) -> AsyncIterator[str]:
+    created = int(time.time())
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> str:
+        choices = [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else []
+        payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices, **extra}
+        return f"data: {json.dumps(payload)}\n\n"
+
+    await asyncio.sleep(profile.first_token_ms / 1000)
+    yield chunk({"role": "assistant", "content": ""})
+    if tool_call:
+        yield chunk({"tool_calls": [{"index": 0, **_tool_call(completion_id, tool_call)}]})
+        yield chunk({}, "tool_calls")
+    else:
+        for token in re.findall(r"\S+\s*", content):
+            await asyncio.sleep(profile.token_ms / 1000)
+            yield chunk({"content": token})
+        yield chunk({}, "stop")
+    if usage is not None:
+        yield chunk(None, usage=usage)
+    yield "data: [DONE]\n\n"
+
+
+def _tool_call(completion_id: str, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": "call_" + completion_id[-24:],
+        "type": "function",
+        "function": {"name": tool_call["name"], "arguments": json.dumps(tool_call["arguments"])},
+    }
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content or "")
+
+
+def _digest(messages: List[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps(messages, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+
+def _usage(messages: List[Dict[str, Any]], tool_call: Optional[Dict[str, Any]], content: str) -> Dict[str, int]:
+    # Whitespace-separated words stand in for tokens
+    prompt_tokens = sum(len(_text(message.get("content")).split()) for message in messages)
+    completion_tokens = len(json.dumps(tool_call["arguments"]).split()) if tool_call else len(content.split())
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
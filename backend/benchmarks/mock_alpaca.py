@@ -0,0 +1,381 @@
+"""
+Mock Alpaca Server
+
+A local stand-in for the parts of Alpaca's trading REST API that Kryptt
+uses (account, assets, positions and orders), plus the fake chat model from
+fake_llm.py. Point the app at it with ALPACA_URL_OVERRIDE and LLM_BASE_URL.
+
+Responses are deterministic: a fixed crypto catalogue, a fixed set of
+positions, and orders that are accepted and kept in memory (a reused
+client_order_id is rejected like Alpaca does). Faults are injected on the
+Alpaca routes only:
+- latency: a base delay with uniform jitter on every request
+- error_rate: fraction of requests answered with a 500
+- throttle_rate: fraction of requests answered with a 429
+- rate_limit: per-key requests per minute, enforced with X-RateLimit-* headers
+
+Run it on its own with:
+    python -m benchmarks.mock_alpaca --port 8900 --latency-ms 30 --error-rate 0.01
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from .fake_llm import FakeLlmProfile, create_router
+
+API_KEY_HEADER = "APCA-API-KEY-ID"
+NAMESPACE = uuid.UUID("6f1c1e52-8f0b-4a43-9d55-4b0d7f1a2c3e")
+
+# Base currency, name, price, minimum order size, quantity increment, price increment
+CATALOGUE = [
+    ("BTC", "Bitcoin", 97000.0, "0.0001", "0.000000001", "1"),
+    ("ETH", "Ethereum", 3400.0, "0.001", "0.000000001", "0.1"),
+    ("SOL", "Solana", 190.0, "0.01", "0.000000001", "0.01"),
+    ("DOGE", "Dogecoin", 0.32, "1", "0.000000001", "0.00001"),
+    ("LTC", "Litecoin", 105.0, "0.01", "0.000000001", "0.01"),
+    ("AVAX", "Avalanche", 36.0, "0.1", "0.000000001", "0.001"),
+    ("LINK", "Chainlink", 22.0, "0.1", "0.000000001", "0.001"),
+    ("UNI", "Uniswap", 13.0, "0.1", "0.000000001", "0.001"),
+    ("AAVE", "Aave", 330.0, "0.01", "0.000000001", "0.01"),
+    ("BCH", "Bitcoin Cash", 450.0, "0.01", "0.000000001", "0.01"),
+    ("DOT", "Polkadot", 7.0, "0.5", "0.000000001", "0.001"),
+    ("XRP", "XRP", 2.3, "1", "0.000000001", "0.0001"),
+    ("XTZ", "Tezos", 1.3, "1", "0.000000001", "0.0001"),
+    ("SUSHI", "SushiSwap", 1.4, "1", "0.000000001", "0.0001"),
+    ("YFI", "Yearn.finance", 8500.0, "0.0001", "0.000000001", "1"),
+    ("MKR", "Maker", 1500.0, "0.001", "0.000000001", "0.1"),
+    ("BAT", "Basic Attention Token", 0.22, "1", "0.000000001", "0.00001"),
+    ("CRV", "Curve DAO", 0.9, "1", "0.000000001", "0.0001"),
+    ("GRT", "The Graph", 0.2, "1", "0.000000001", "0.00001"),
+    ("SHIB", "Shiba Inu", 0.00002, "100000", "1", "0.00000001"),
+    ("PEPE", "Pepe", 0.000012, "100000", "1", "0.000000001"),
+    ("USDC", "USD Coin", 1.0, "1", "0.000000001", "0.0001"),
+    ("USDT", "Tether", 1.0, "1", "0.000000001", "0.0001"),
+]
+QUOTES = ("USD", "USDT", "USDC", "BTC")
+
+# Base currency and quantity held
+HOLDINGS = [("BTC", "0.25"), ("ETH", "3.5"), ("SOL", "40"), ("DOGE", "12000"), ("LINK", "150")]
+
+
+@dataclass
+class FaultProfile:
+    """Latency and failures injected on the Alpaca routes."""
+    latency_ms: float = 30.0
+    jitter_ms: float = 10.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    rate_limit: int = 12000
+    seed: int = 0
+
+
+class MockBroker:
+    """In-memory account, catalogue, positions and orders."""
+
+    def __init__(self):
+        self.prices = {base: price for base, _, price, *_ in CATALOGUE}
+        self.assets = [_asset(base, name, quote, *sizes) for base, name, _, *sizes in CATALOGUE for quote in QUOTES if base != quote]
+        self.positions = {f"{base}USD": _position(base, float(qty), self.prices[base]) for base, qty in HOLDINGS}
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.orders_by_client_id: Dict[str, Dict[str, Any]] = {}
+
+    def account(self) -> Dict[str, Any]:
+        market_value = sum(float(position["market_value"]) for position in self.positions.values())
+        cash = 25000.0
+        return {
+            "id": str(uuid.uuid5(NAMESPACE, "account")),
+            "account_number": "PA3BENCHMARK",
+            "status": "ACTIVE",
+            "crypto_status": "ACTIVE",
+            "currency": "USD",
+            "buying_power": f"{cash * 2:.2f}",
+            "regt_buying_power": f"{cash * 2:.2f}",
+            "daytrading_buying_power": "0",
+            "non_marginable_buying_power": f"{cash:.2f}",
+            "cash": f"{cash:.2f}",
+            "portfolio_value": f"{cash + market_value:.2f}",
+            "pattern_day_trader": False,
+            "trading_blocked": False,
+            "transfers_blocked": False,
+            "account_blocked": False,
+            "created_at": "2024-01-02T15:04:05.000000Z",
+            "trade_suspended_by_user": False,
+            "multiplier": "2",
+            "shorting_enabled": False,
+            "equity": f"{cash + market_value:.2f}",
+            "last_equity": f"{cash + market_value * 0.98:.2f}",
+            "long_market_value": f"{market_value:.2f}",
+            "short_market_value": "0",
+            "initial_margin": "0",
+            "maintenance_margin": "0",
+            "last_maintenance_margin": "0",
+            "sma": "0",
+            "daytrade_count": 0,
+        }
+
+    def submit_order(self, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Accept an order; None if its client_order_id was already used."""
+        client_order_id = body.get("client_order_id") or str(uuid.uuid4())
+        if client_order_id in self.orders_by_client_id:
+            return None
+        symbol = body.get("symbol", "")
+        now = _now()
+        order = {
+            "id": str(uuid.uuid4()),
+            "client_order_id": client_order_id,
+            "created_at": now,
+            "updated_at": now,
+            "submitted_at": now,
+            "filled_at": None,
+            "expired_at": None,
+            "canceled_at": None,
+            "failed_at": None,
+            "replaced_at": None,
+            "replaced_by": None,
+            "replaces": None,
+            "asset_id": str(uuid.uuid5(NAMESPACE, symbol)),
+            "symbol": symbol,
+            "asset_class": "crypto",
+            "notional": _string(body.get("notional")),
+            "qty": _string(body.get("qty")),
+            "filled_qty": "0",
+            "filled_avg_price": None,
+            "order_class": "simple",
+            "order_type": body.get("type", "market"),
+            "type": body.get("type", "market"),
+            "side": body.get("side", "buy"),
+            "time_in_force": body.get("time_in_force", "gtc"),
+            "limit_price": _string(body.get("limit_price")),
+            "stop_price": _string(body.get("stop_price")),
+            "status": "new",
+            "extended_hours": False,
+            "legs": None,
+            "trail_percent": None,
+            "trail_price": None,
+            "hwm": None,
+        }
+        self.orders[order["id"]] = order
+        self.orders_by_client_id[client_order_id] = order
+        return order
+
+    def cancel_order(self, order_id: str) -> bool:
+        order = self.orders.get(order_id)
+        if order is None:
+            return False
+        order["status"] = "canceled"
+        order["canceled_at"] = order["updated_at"] = _now()
+        return True
+
+    def close_position(self, symbol: str) -> Optional[Dict[str, Any]]:
+        position = self.positions.get(symbol.replace("/", "").upper())
+        if position is None:
+            return None
+        # Positions stay put so every run sees the same account
+        return self.submit_order({"symbol": position["symbol"], "qty": position["qty"], "side": "sell", "type": "market", "time_in_force": "gtc"})
+
+
+def create_mock_app(faults: FaultProfile, llm: FakeLlmProfile) -> FastAPI:
+    """Build the stand-in server for the given fault and fake model profiles."""
+    app = FastAPI(title="Mock Alpaca", docs_url=None, redoc_url=None)
+    broker = MockBroker()
+    rng = random.Random(faults.seed)
+    windows: Dict[str, List[int]] = {}
+    stats: Counter = Counter()
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        if not request.url.path.startswith("/v2/"):
+            return await call_next(request)
+        stats["requests"] += 1
+        delay = max(faults.latency_ms + rng.uniform(-faults.jitter_ms, faults.jitter_ms), 0.0)
+        await asyncio.sleep(delay / 1000)
+
+        api_key = request.headers.get(API_KEY_HEADER)
+        if not api_key:
+            stats["unauthorized"] += 1
+            return JSONResponse({"code": 40110000, "message": "request is not authorized"}, status_code=401)
+
+        # Fixed one-minute window per key, like Alpaca's quota
+        minute = int(time.time() // 60)
+        window = windows.setdefault(api_key, [minute, 0])
+        if window[0] != minute:
+            window[:] = [minute, 0]
+        window[1] += 1
+        headers = {
+            "X-RateLimit-Limit": str(faults.rate_limit),
+            "X-RateLimit-Remaining": str(max(faults.rate_limit - window[1], 0)),
+            "X-RateLimit-Reset": str((minute + 1) * 60),
+        }
+        roll = rng.random()
+        if window[1] > faults.rate_limit or roll < faults.throttle_rate:
+            stats["throttled"] += 1
+            return JSONResponse({"code": 42910000, "message": "rate limit exceeded"}, status_code=429, headers=headers)
+        if roll < faults.throttle_rate + faults.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"code": 50010000, "message": "internal server error"}, status_code=500, headers=headers)
+
+        response = await call_next(request)
+        response.headers.update(headers)
+        return response
+
+    @app.get("/v2/account")
+    async def get_account():
+        return broker.account()
+
+    @app.get("/v2/assets")
+    async def get_assets(status: Optional[str] = None, asset_class: Optional[str] = None):
+        return [
+            asset for asset in broker.assets
+            if (status is None or asset["status"] == status) and (asset_class is None or asset["class"] == asset_class)
+        ]
+
+    @app.get("/v2/positions")
+    async def get_positions():
+        return list(broker.positions.values())
+
+    @app.get("/v2/positions/{symbol_or_asset_id}")
+    async def get_position(symbol_or_asset_id: str):
+        position = broker.positions.get(symbol_or_asset_id.replace("/", "").upper())
+        if position is None:
+            return JSONResponse({"code": 40410000, "message": "position does not exist"}, status_code=404)
+        return position
+
+    @app.delete("/v2/positions/{symbol_or_asset_id}")
+    async def close_position(symbol_or_asset_id: str):
+        order = broker.close_position(symbol_or_asset_id)
+        if order is None:
+            return JSONResponse({"code": 40410000, "message": "position does not exist"}, status_code=404)
+        return order
+
+    @app.post("/v2/orders")
+    async def submit_order(request: Request):
+        order = broker.submit_order(await request.json())
+        if order is None:
+            return JSONResponse({"code": 40010001, "message": "client_order_id must be unique"}, status_code=422)
+        return order
+
+    @app.get("/v2/orders")
+    async def get_orders(status: str = "open"):
+        open_statuses = {"new", "accepted", "partially_filled"}
+        return [
+            order for order in broker.orders.values()
+            if status == "all" or (order["status"] in open_statuses) == (status == "open")
+        ]
+
+    @app.get("/v2/orders:by_client_order_id")
+    async def get_order_by_client_id(client_order_id: str):
+        order = broker.orders_by_client_id.get(client_order_id)
+        if order is None:
+            return JSONResponse({"code": 40410000, "message": "order not found"}, status_code=404)
+        return order
+
+    @app.get("/v2/orders/{order_id}")
+    async def get_order(order_id: str):
+        order = broker.orders.get(order_id) or broker.orders_by_client_id.get(order_id)
+        if order is None:
+            return JSONResponse({"code": 40410000, "message": "order not found"}, status_code=404)
+        return order
+
+    @app.delete("/v2/orders/{order_id}")
+    async def cancel_order(order_id: str):
+        if not broker.cancel_order(order_id):
+            return JSONResponse({"code": 40410000, "message": "order not found"}, status_code=404)
+        return Response(status_code=204)
+
+    @app.get("/_mock/stats")
+    async def get_stats():
+        return {**stats, "orders": len(broker.orders), "faults": asdict(faults), "llm": asdict(llm)}
+
+    app.include_router(create_router(llm))
+    return app
+
+
+def _asset(base: str, name: str, quote: str, min_order_size: str, min_trade_increment: str, price_increment: str) -> Dict[str, Any]:
+    symbol = f"{base}/{quote}"
+    return {
+        "id": str(uuid.uuid5(NAMESPACE, symbol)),
+        "class": "crypto",
+        "exchange": "CRYPTO",
+        "symbol": symbol,
+        "name": f"{name} / {quote}",
+        "status": "active",
+        "tradable": True,
+        "marginable": False,
+        "maintenance_margin_requirement": 100,
+        "shortable": False,
+        "easy_to_borrow": False,
+        "fractionable": True,
+        "attributes": [],
+        "min_order_size": min_order_size,
+        "min_trade_increment": min_trade_increment,
+        "price_increment": price_increment,
+    }
+
+
+def _position(base: str, qty: float, price: float) -> Dict[str, Any]:
+    entry = price * 0.9
+    return {
+        "asset_id": str(uuid.uuid5(NAMESPACE, f"{base}/USD")),
+        "symbol": f"{base}USD",
+        "exchange": "CRYPTO",
+        "asset_class": "crypto",
+        "avg_entry_price": f"{entry}",
+        "qty": f"{qty}",
+        "qty_available": f"{qty}",
+        "side": "long",
+        "market_value": f"{qty * price:.2f}",
+        "cost_basis": f"{qty * entry:.2f}",
+        "unrealized_pl": f"{qty * (price - entry):.2f}",
+        "unrealized_plpc": f"{(price - entry) / entry:.4f}",
+        "unrealized_intraday_pl": f"{qty * price * 0.01:.2f}",
+        "unrealized_intraday_plpc": "0.0100",
+        "current_price": f"{price}",
+        "lastday_price": f"{price * 0.99}",
+        "change_today": "0.0101",
+    }
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _string(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the mock Alpaca API and fake chat model")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=FaultProfile.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=FaultProfile.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=FaultProfile.error_rate)
+    parser.add_argument("--throttle-rate", type=float, default=FaultProfile.throttle_rate)
+    parser.add_argument("--rate-limit", type=int, default=FaultProfile.rate_limit, help="Requests per minute per key")
+    parser.add_argument("--seed", type=int, default=FaultProfile.seed)
+    parser.add_argument("--llm-first-token-ms", type=float, default=FakeLlmProfile.first_token_ms)
+    parser.add_argument("--llm-token-ms", type=float, default=FakeLlmProfile.token_ms)
+    args = parser.parse_args()
+
+    faults = FaultProfile(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, args.rate_limit, args.seed)
+    llm = FakeLlmProfile(args.llm_first_token_ms, args.llm_token_ms)
+    uvicorn.run(create_mock_app(faults, llm), host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Benchmark Entry Point
+
+Starts the mock Alpaca server and the Kryptt API as subprocesses, saves a
+set of dummy keys, runs the selected scenarios and writes the results as
+JSON. With --baseline the run is compared against an earlier result and
+exits with status 1 on a regression.
+
+The app runs with in-memory conversation memory and without the trade
+update and market data streams (the mock has no websocket endpoints).
+Everything else uses the app's own settings; pass --app-env KEY=VALUE to
+benchmark a different configuration.
+
+Usage (from backend/):
+    python -m benchmarks.run
+    python -m benchmarks.run --scenarios account,mixed --requests 500 --concurrency 32
+    python -m benchmarks.run --error-rate 0.02 --latency-ms 80 --baseline benchmarks/results/baseline.json
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import httpx
+from .compare import compare, format_report
+from .fake_llm import FakeLlmProfile
+from .mock_alpaca import FaultProfile
+from .runner import SCENARIOS, run_scenario
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BACKEND_DIR / "benchmarks" / "results"
+READY_TIMEOUT = 60.0
+BENCHMARK_KEYS = {
+    "groq": "benchmark-llm-key",
+    "alpaca_api_key": "benchmark-key-id",
+    "alpaca_secret_key": "benchmark-secret-key",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_process(args: List[str], log_path: Path, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(args, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def stop_process(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def wait_ready(url: str, process: subprocess.Popen, log_path: Path) -> None:
+    """Poll a URL until it answers, failing early if the process exits."""
+    deadline = time.monotonic() + READY_TIMEOUT
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(process.args)} exited with {process.returncode}, see {log_path}")
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {READY_TIMEOUT:.0f}s, see {log_path}")
+
+
+def app_environment(mock_url: str, faults: FaultProfile, overrides: List[str]) -> Dict[str, str]:
+    env = {
+        **os.environ,
+        "ALPACA_URL_OVERRIDE": mock_url,
+        "LLM_BASE_URL": f"{mock_url}/v1",
+        "MEMORY_BACKEND": "memory",
+        "TRADE_UPDATES_ENABLED": "false",
+        "MARKET_DATA_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+        # Match the mock's quota so the local limiter paces like it would against Alpaca
+        "BROKER_RATE_LIMIT_PER_MINUTE": str(faults.rate_limit),
+        "BROKER_RATE_LIMIT_BURST": str(max(faults.rate_limit // 60, 20)),
+    }
+    for override in overrides:
+        key, _, value = override.partition("=")
+        env[key] = value
+    return env
+
+
+def run_metadata(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+    }
+
+
+async def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    faults = FaultProfile(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, args.rate_limit, args.seed)
+    llm = FakeLlmProfile(args.llm_first_token_ms, args.llm_token_ms)
+    mock_port, app_port = free_port(), free_port()
+    mock_url, app_url = f"http://127.0.0.1:{mock_port}", f"http://127.0.0.1:{app_port}"
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    mock_log, app_log = RESULTS_DIR / "mock.log", RESULTS_DIR / "app.log"
+
+    mock = start_process([
+        sys.executable, "-m", "benchmarks.mock_alpaca", "--port", str(mock_port),
+        "--latency-ms", str(faults.latency_ms), "--jitter-ms", str(faults.jitter_ms),
+        "--error-rate", str(faults.error_rate), "--throttle-rate", str(faults.throttle_rate),
+        "--rate-limit", str(faults.rate_limit), "--seed", str(faults.seed),
+        "--llm-first-token-ms", str(llm.first_token_ms), "--llm-token-ms", str(llm.token_ms),
+    ], mock_log)
+    app = start_process([
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port),
+        "--log-level", "warning", "--no-access-log",
+    ], app_log, app_environment(mock_url, faults, args.app_env))
+
+    try:
+        await wait_ready(f"{mock_url}/_mock/stats", mock, mock_log)
+        await wait_ready(f"{app_url}/", app, app_log)
+
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=args.timeout) as client:
+            response = await client.post("/api/v1/settings/keys", json=BENCHMARK_KEYS)
+            response.raise_for_status()
+
+            results = {}
+            offset = 0
+            for name in args.scenarios:
+                print(f"⏱️ {name}: {args.requests} requests, concurrency {args.concurrency}", flush=True)
+                results[name] = await run_scenario(
+                    client, SCENARIOS[name], args.requests, args.concurrency, args.warmup, offset
+                )
+                offset += args.warmup + args.requests
+
+        async with httpx.AsyncClient() as client:
+            mock_stats = (await client.get(f"{mock_url}/_mock/stats")).json()
+    finally:
+        stop_process(app)
+        stop_process(mock)
+
+    return {"meta": run_metadata(args), "scenarios": results, "mock": mock_stats}
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    """Render scenario summaries as a fixed-width table."""
+    lines = [f"{'scenario':<16}{'rps':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for name, summary in results["scenarios"].items():
+        latency = summary["latency_ms"]
+        lines.append(
+            f"{name:<16}{summary['throughput_rps']:>9.1f}{summary['error_rate']:>8.1%}"
+            f"{latency['p50']:>10.1f}{latency['p95']:>10.1f}{latency['p99']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the Kryptt API against a mock Alpaca server and fake LLM")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests before each scenario")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="Result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative change of latency and throughput")
+    parser.add_argument("--error-tolerance", type=float, default=0.01, help="Allowed absolute increase of the error rate")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="Extra app setting (repeatable)")
+    parser.add_argument("--latency-ms", type=float, default=FaultProfile.latency_ms, help="Mock Alpaca base latency")
+    parser.add_argument("--jitter-ms", type=float, default=FaultProfile.jitter_ms, help="Mock Alpaca latency jitter")
+    parser.add_argument("--error-rate", type=float, default=FaultProfile.error_rate, help="Fraction of Alpaca calls answered with a 500")
+    parser.add_argument("--throttle-rate", type=float, default=FaultProfile.throttle_rate, help="Fraction of Alpaca calls answered with a 429")
+    parser.add_argument("--rate-limit", type=int, default=FaultProfile.rate_limit, help="Mock Alpaca quota per key and minute")
+    parser.add_argument("--seed", type=int, default=FaultProfile.seed)
+    parser.add_argument("--llm-first-token-ms", type=float, default=FakeLlmProfile.first_token_ms)
+    parser.add_argument("--llm-token-ms", type=float, default=FakeLlmProfile.token_ms)
+    args = parser.parse_args(argv)
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    results = asyncio.run(run_benchmarks(args))
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(format_results(results))
+    print(f"📄 Results written to {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        rows = compare(baseline, results, args.tolerance, args.error_tolerance)
+        print(format_report(rows))
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
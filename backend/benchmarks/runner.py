@@ -0,0 +1,208 @@
+"""
+Benchmark Runner
+
+Scenarios and the closed-loop load generator. Each scenario builds the
+n-th request of a run; `concurrency` workers send requests back to back
+until the run has sent `requests` of them, and every response body is read
+to the end (agent chats stream SSE until their "done" event).
+
+Components:
+- RequestSpec / Scenario: what to send
+- SCENARIOS: the account, asset catalogue, agent chat and mixed workloads
+- run_scenario: warm up, then drive one scenario and summarize it
+- summarize / percentile: throughput, error rate and latency percentiles
+
+Latency percentiles are over successful requests only, so fast failures do
+not flatter them; failures show up in error_rate. A chat counts as failed
+when it streams an "error" event, even though its status is 200.
+
+Project: Kryptt
+Author: Jon
+Social Media:
+- Twitter: @jondoescoding
+"""
+
+import asyncio
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import httpx
+
+API_PREFIX = "/api/v1"
+ERROR_EVENT = b"event: error"
+
+
+@dataclass(frozen=True)
+class RequestSpec:
+    """One request of a scenario."""
+    name: str
+    method: str
+    path: str
+    body: Optional[Dict[str, Any]] = None
+    stream: bool = False
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """A named workload; make(n) builds its n-th request."""
+    name: str
+    make: Callable[[int], RequestSpec]
+
+
+@dataclass(frozen=True)
+class Sample:
+    """Outcome of one request."""
+    name: str
+    status: int
+    ok: bool
+    latency: float
+    ttfb: Optional[float]
+
+
+def account_request(n: int) -> RequestSpec:
+    return RequestSpec("account", "GET", f"{API_PREFIX}/alpaca/account")
+
+
+def crypto_assets_request(n: int) -> RequestSpec:
+    return RequestSpec("crypto_assets", "GET", f"{API_PREFIX}/assets/crypto")
+
+
+def position_chat_request(n: int) -> RequestSpec:
+    # A unique message and conversation per request keeps the response cache and memory cold
+    return RequestSpec("position_chat", "POST", f"{API_PREFIX}/agents/position-agent/chat", {
+        "message": f"What are my current crypto positions? (check {n})",
+        "conversation_id": f"bench-position-{n}",
+    }, stream=True)
+
+
+def order_chat_request(n: int) -> RequestSpec:
+    # Phrased as a question so the intent fast path leaves it to the agent
+    return RequestSpec("order_chat", "POST", f"{API_PREFIX}/agents/order-agent/chat", {
+        "message": f"Could you buy 0.01 BTC for me? (ticket {n})",
+        "conversation_id": f"bench-order-{n}",
+    }, stream=True)
+
+
+# Share of each request type in the mixed workload
+MIXED_WEIGHTS = [(account_request, 4), (crypto_assets_request, 3), (position_chat_request, 2), (order_chat_request, 1)]
+MIXED_CYCLE = [make for make, weight in MIXED_WEIGHTS for _ in range(weight)]
+
+
+def mixed_request(n: int) -> RequestSpec:
+    return MIXED_CYCLE[n % len(MIXED_CYCLE)](n)
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    scenario.name: scenario for scenario in (
+        Scenario("account", account_request),
+        Scenario("crypto_assets", crypto_assets_request),
+        Scenario("position_chat", position_chat_request),
+        Scenario("order_chat", order_chat_request),
+        Scenario("mixed", mixed_request),
+    )
+}
+
+
+async def send(client: httpx.AsyncClient, spec: RequestSpec) -> Sample:
+    """Send one request and read its body to the end."""
+    started = time.perf_counter()
+    ttfb = None
+    failed = False
+    try:
+        async with client.stream(spec.method, spec.path, json=spec.body) as response:
+            async for chunk in response.aiter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - started
+                if spec.stream and ERROR_EVENT in chunk:
+                    failed = True
+            status = response.status_code
+    except httpx.HTTPError:
+        status, failed = 0, True
+    return Sample(spec.name, status, status < 400 and not failed, time.perf_counter() - started, ttfb)
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+    offset: int = 0
+) -> Dict[str, Any]:
+    """
+    Drive one scenario and summarize it.
+
+    Args:
+        client: Client bound to the app's base URL
+        scenario: The workload
+        requests: Measured requests to send
+        concurrency: Requests in flight at once
+        warmup: Unmeasured requests sent first (cold caches, agent builds)
+        offset: First request number, so runs never repeat a chat message
+
+    Returns:
+        Dict: Summary as produced by summarize()
+    """
+    for n in range(offset, offset + warmup):
+        await send(client, scenario.make(n))
+
+    numbers = iter(range(offset + warmup, offset + warmup + requests))
+    samples: List[Sample] = []
+
+    async def worker() -> None:
+        for n in numbers:
+            samples.append(await send(client, scenario.make(n)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - started, concurrency)
+
+
+def summarize(samples: Sequence[Sample], elapsed: float, concurrency: int) -> Dict[str, Any]:
+    """Throughput, error rate and latency percentiles of a run, overall and per request type."""
+    summary = _summarize(samples, elapsed)
+    summary["concurrency"] = concurrency
+    names = sorted({sample.name for sample in samples})
+    if len(names) > 1:
+        summary["by_request"] = {
+            name: _summarize([sample for sample in samples if sample.name == name], elapsed)
+            for name in names
+        }
+    return summary
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """q-th percentile (0-100) of sorted values, interpolating between ranks."""
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def _summarize(samples: Sequence[Sample], elapsed: float) -> Dict[str, Any]:
+    ok = [sample for sample in samples if sample.ok]
+    latencies = sorted(sample.latency * 1000 for sample in ok)
+    ttfbs = sorted(sample.ttfb * 1000 for sample in ok if sample.ttfb is not None)
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else 0.0,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "status_codes": dict(Counter(str(sample.status) for sample in samples)),
+        "latency_ms": _distribution(latencies),
+        "ttfb_ms": _distribution(ttfbs),
+    }
+
+
+def _distribution(values: Sequence[float]) -> Dict[str, float]:
+    return {
+        "mean": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(values[-1], 2) if values else 0.0,
+    }
@@ -0,0 +1,8 @@
+import os
+
+# Keep test runs away from the on-disk conversation memory
+os.environ.setdefault("MEMORY_BACKEND", "memory")
+
+# Import the app the way the server does: it attaches the logging helpers and
+# resolves the app.core <-> app.api import order
+import app.main  # noqa: E402,F401
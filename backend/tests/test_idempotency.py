@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+from app.core.idempotency import OrderDedupStore, client_order_id, order_leg_key, order_scope, turn_id
+
+LEG = SimpleNamespace(
+    symbol="BTC/USD", side="buy", type="market", qty=0.1, notional=None,
+    time_in_force="gtc", limit_price=None, stop_price=None
+)
+
+
+def leg_id(request_id=None, leg=0):
+    return client_order_id("account", order_scope("session", turn_id(request_id)), order_leg_key(LEG, leg))
+
+
+def test_repeated_command_without_request_id_is_a_new_order():
+    assert turn_id() != turn_id()
+    assert leg_id() != leg_id()
+
+
+def test_resent_request_id_reuses_the_order_ids():
+    assert turn_id("submit-1") == "submit-1"
+    assert leg_id("submit-1") == leg_id("submit-1")
+    # Identical legs of one batch are still separate orders
+    assert leg_id("submit-1", leg=0) != leg_id("submit-1", leg=1)
+
+
+def test_dedup_store_places_each_id_once():
+    store = OrderDedupStore(ttl=60)
+    calls = []
+
+    async def submit():
+        calls.append(1)
+        return "order"
+
+    async def recover():
+        return "recovered"
+
+    async def run():
+        first = await store.submit(leg_id("submit-1"), submit, recover)
+        again = await store.submit(leg_id("submit-1"), submit, recover)
+        other = await store.submit(leg_id(), submit, recover)
+        return first, again, other
+
+    assert asyncio.run(run()) == (("order", False), ("order", True), ("order", False))
+    assert len(calls) == 2
@@ -0,0 +1,58 @@
+import pytest
+from app.core.intent import parse_order_intent
+
+KNOWN = lambda symbol: True
+
+
+@pytest.mark.parametrize("message", [
+    "buy 2 eth 3",                # a bare second number is not a price
+    "buy 0.1 eth for $2000",      # "for $N" could be a total, not a limit
+    "buy 1 eth at 1,5",           # decimal comma or thousands separator
+    "buy 1,5 eth",
+    "sell 0.1 btc at $70,000",
+    "buy 0.1 eth $2000",
+    "buy 0.1 eth 2000 usd",
+    "buy 0.1 eth limit 2000 2100",
+    "sell 50% eth",               # a share of the position, not a quantity
+    "sell 100% btc",
+    "sell -0.5 btc",              # signs are never dropped
+    "buy 0.1 eth at -2000",
+    "buy 0.1 eth at 2000€",
+    "buy $ 100 of btc",
+])
+def test_ambiguous_numbers_fall_back_to_the_agent(message):
+    assert parse_order_intent(message, KNOWN) is None
+    assert parse_order_intent(message) is None
+
+
+@pytest.mark.parametrize("message, order_type, limit_price, stop_price", [
+    ("Buy 0.1 ETH", "market", None, None),
+    ("Please, buy 0.1 ETH!", "market", None, None),
+    ("sell 0.05 btc at 70000.", "limit", 70000.0, None),
+    ("Sell 0.05 BTC at $70k", "limit", 70000.0, None),
+    ("buy 0.1 eth @ 2000", "limit", 2000.0, None),
+    ("buy 0.2 eth limit 2000", "limit", 2000.0, None),
+    ("buy 0.1 eth limit price 2000", "limit", 2000.0, None),
+    ("Set a stop loss order for 0.1 BTC at $40000", "stop", None, 40000.0),
+    ("buy 0.1 eth stop 3000 limit 3100", "stop_limit", 3100.0, 3000.0),
+])
+def test_prices_are_read_after_price_markers(message, order_type, limit_price, stop_price):
+    intent = parse_order_intent(message, KNOWN)
+    assert intent is not None
+    assert (intent.order_type, intent.limit_price, intent.stop_price) == (order_type, limit_price, stop_price)
+
+
+def test_dollar_amount_before_the_asset_is_notional():
+    intent = parse_order_intent("buy $100 of btc", KNOWN)
+    assert (intent.order_type, intent.notional, intent.qty) == ("market", 100.0, None)
+
+
+def test_cold_catalogue_only_trusts_common_tickers():
+    assert parse_order_intent("buy 5 pepe") is None
+    intent = parse_order_intent("buy 0.1 eth")
+    assert intent.symbol == "ETH" and intent.confidence < 1.0
+    assert parse_order_intent("buy 5 pepe", KNOWN).symbol == "PEPE"
+
+
+def test_unknown_catalogue_symbol_is_rejected():
+    assert parse_order_intent("buy 0.1 eth", lambda symbol: False) is None
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+import msgpack
+import pytest
+from websockets.asyncio.server import serve
+from app.core import quotes
+from app.core.market_data import AlpacaMarketDataSource, MarketDataFeed, ReplayMarketDataSource
+from app.core.quotes import QuoteStore, check_limit_price
+
+REPLAY = Path(__file__).parent / "data" / "market_data.jsonl"
+KEYS = {"alpaca_api_key": "replay-key-id", "alpaca_secret_key": "replay-secret"}
+# Five seconds after the last BTC quote of the recording, two minutes after the last ETH one
+NOW = datetime.fromisoformat("2026-03-02T14:00:10+00:00").timestamp()
+MAX_AGE = 30.0
+MAX_DEVIATION = 0.05
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(quotes, "time", SimpleNamespace(time=lambda: NOW))
+    store = QuoteStore()
+
+    async def symbols(keys):
+        return ["BTC/USD", "ETH/USD"]
+
+    async def run():
+        feed = MarketDataFeed(store, lambda keys: ReplayMarketDataSource.from_file(str(REPLAY)), symbols, retry_delay=0)
+        await feed.start(KEYS)
+        await feed.wait_idle()
+        return feed.stats()
+
+    stats = asyncio.run(run())
+    assert stats["messages"] == 6
+    return store
+
+
+def test_replay_keeps_the_latest_quote_and_trade(store):
+    quote = store.get("BTC")
+    assert (quote.symbol, quote.bid, quote.ask, quote.last) == ("BTC/USD", 59990.0, 60010.0, 60010.0)
+    assert quote.age == pytest.approx(5.0)
+    assert store.get("BTCUSD") == quote
+    # Not subscribed, so filtered out of the replay
+    assert store.get("SOL/USD") is None
+    assert store.stats()["ignored"] == 1
+
+
+def test_limit_price_is_checked_against_a_fresh_quote(store):
+    quote = store.get("BTC/USD", max_age=MAX_AGE)
+    assert quote is not None
+    with pytest.raises(ValueError, match="above the current ask of 60010.0"):
+        check_limit_price("buy", 70000.0, quote, MAX_DEVIATION)
+    with pytest.raises(ValueError, match="below the current bid of 59990.0"):
+        check_limit_price("sell", 6000.0, quote, MAX_DEVIATION)
+    # Close to the market, or resting away from it
+    check_limit_price("buy", 61000.0, quote, MAX_DEVIATION)
+    check_limit_price("buy", 50000.0, quote, MAX_DEVIATION)
+    check_limit_price("sell", 90000.0, quote, MAX_DEVIATION)
+
+
+def test_stale_quote_is_not_used_for_limit_checks(store):
+    assert store.get("ETH/USD", max_age=MAX_AGE) is None
+    stale = store.get("ETH/USD")
+    assert stale.age == pytest.approx(129.0)
+    # Only the caller's max_age keeps the stale price from rejecting the order
+    with pytest.raises(ValueError):
+        check_limit_price("buy", 4000.0, stale, MAX_DEVIATION)
+
+
+def test_refused_login_is_surfaced_as_a_disconnect():
+    async def handler(websocket):
+        await websocket.send(msgpack.packb([{"T": "success", "msg": "connected"}]))
+        await websocket.recv()
+        await websocket.send(msgpack.packb([{"T": "error", "code": 402, "msg": "auth failed"}]))
+
+    async def run():
+        async with serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            source = AlpacaMarketDataSource(KEYS, url_override=f"ws://127.0.0.1:{port}")
+            await source.open(["BTC/USD"])
+            try:
+                with pytest.raises(ConnectionError, match="auth failed"):
+                    async for message in source:
+                        pass
+                assert not source.connected
+            finally:
+                await source.close()
+
+    asyncio.run(asyncio.wait_for(run(), timeout=30))
@@ -0,0 +1,18 @@
+from app.core.positions import PositionRecord
+
+
+def test_as_strings_renders_fixed_point_numbers():
+    record = PositionRecord.from_position({
+        "symbol": "BTCUSD",
+        "asset_id": "276e2673-764b-4ab6-a611-caf665ca6340",
+        "qty": "0.00000005",
+        "avg_entry_price": "61000.5",
+        "market_value": "1E+2",
+        "unrealized_plpc": "-0.000012",
+        "cost_basis": None,
+    })
+    fields = record.as_strings()
+    assert (fields["qty"], fields["avg_entry_price"]) == ("0.00000005", "61000.5")
+    assert (fields["market_value"], fields["unrealized_plpc"]) == ("100", "-0.000012")
+    assert fields["cost_basis"] == "0"
+    assert "asset_id" not in fields
@@ -0,0 +1,22 @@
+import pytest
+from app.core.response_cache import is_cacheable_query, normalize_query
+
+
+@pytest.mark.parametrize("message", [
+    "What are my open positions?",
+    "Show my long positions",
+    "Is my BTC position long or short?",
+    "What are my current crypto positions?",
+])
+def test_read_only_position_questions_are_cacheable(message):
+    assert is_cacheable_query(normalize_query(message))
+
+
+@pytest.mark.parametrize("message", [
+    "Buy 0.1 ETH",
+    "Close my BTC position",
+    "Place an order to open a long",
+    "What about that one?",
+])
+def test_trades_and_follow_ups_are_not_cached(message):
+    assert not is_cacheable_query(normalize_query(message))
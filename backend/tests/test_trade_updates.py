@@ -0,0 +1,87 @@
+import asyncio
+import json
+from decimal import Decimal
+from pathlib import Path
+import pytest
+from websockets.asyncio.server import serve
+from app.core.order_book import OrderBook
+from app.core.positions import account_id, position_versions
+from app.core.trade_updates import AlpacaTradeUpdateSource, ReplayTradeUpdateSource, TradeUpdateConsumer
+
+REPLAY = Path(__file__).parent / "data" / "trade_updates.jsonl"
+KEYS = {"alpaca_api_key": "replay-key-id", "alpaca_secret_key": "replay-secret"}
+
+
+def replay_into(book: OrderBook) -> TradeUpdateConsumer:
+    consumer = TradeUpdateConsumer(book, lambda keys: ReplayTradeUpdateSource.from_file(str(REPLAY)), retry_delay=0)
+
+    async def run():
+        await consumer.start(KEYS)
+        await consumer.wait_idle()
+
+    asyncio.run(run())
+    return consumer
+
+
+def test_replay_moves_orders_and_positions():
+    book = OrderBook()
+    consumer = replay_into(book)
+
+    first, second, canceled = (book.get_order(client_id) for client_id in ("kryptt-a", "kryptt-b", "kryptt-c"))
+    assert (first.status, first.filled_qty, first.last_event) == ("filled", Decimal("0.5"), "fill")
+    assert (second.status, second.filled_qty) == ("filled", Decimal("2"))
+    assert canceled.status == "canceled"
+    assert book.orders("open") == []
+
+    positions = {position.symbol: position for position in book.positions()}
+    assert positions["BTC/USD"].qty == Decimal("0.5")
+    assert positions["BTC/USD"].avg_entry_price == Decimal("60600")
+    assert (positions["ETH/USD"].qty, positions["ETH/USD"].avg_entry_price) == (Decimal("2"), Decimal("3000"))
+
+    stats = book.stats()
+    assert (stats["fills"], stats["duplicate_fills"], stats["stale_events"]) == (3, 1, 1)
+    assert consumer.stats()["events"] == 9
+
+
+def test_replay_fills_bump_the_position_version():
+    account = account_id(KEYS)
+    before = position_versions.current(account)
+    replay_into(OrderBook())
+    # One bump per fill event, including the redelivered one
+    assert position_versions.current(account) - before == 4
+
+
+def test_stream_disconnect_is_surfaced_to_the_consumer():
+    # The first connection delivers one event and drops; the reconnect is refused
+    with REPLAY.open() as f:
+        event = json.loads(f.readline())
+    connections = []
+
+    async def handler(websocket):
+        connections.append(websocket)
+        await websocket.recv()
+        if len(connections) > 1:
+            await websocket.send(json.dumps({"stream": "authorization", "data": {"status": "unauthorized"}}))
+            return
+        await websocket.send(json.dumps({"stream": "authorization", "data": {"status": "authorized"}}))
+        await websocket.recv()
+        await websocket.send(json.dumps({"stream": "trade_updates", "data": event}))
+
+    async def run():
+        async with serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            source = AlpacaTradeUpdateSource(KEYS, url_override=f"ws://127.0.0.1:{port}")
+            await source.open()
+            received = []
+            try:
+                with pytest.raises(ConnectionError, match="failed to authenticate"):
+                    async for update in source:
+                        received.append(update)
+                assert not source.connected
+            finally:
+                await source.close()
+            return received
+
+    received = asyncio.run(asyncio.wait_for(run(), timeout=30))
+    assert [update.order.client_order_id for update in received] == ["kryptt-a"]
+    assert len(connections) == 2
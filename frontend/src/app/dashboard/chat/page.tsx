@@ -13,6 +13,7 @@ import {
   SelectValue,
 } from "@/components/ui/select";
 import { Loader2 } from "lucide-react";
+import { createClient } from '@/lib/supabase/client';
 
 type Message = {
   id: string;
@@ -73,6 +74,13 @@ export default function ChatPage() {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState('');
   const [selectedAgent, setSelectedAgent] = useState<Agent>(agents[0]);
+  const [userId, setUserId] = useState<string | null>(null);
+  // Scopes agent memory on the backend to this chat session
+  const conversationId = useRef<string>(crypto.randomUUID());
+
+  useEffect(() => {
+    createClient().auth.getUser().then(({ data }) => setUserId(data.user?.id ?? null));
+  }, []);
 
   const scrollToBottom = () => {
     if (messagesEndRef.current) {
@@ -118,7 +126,11 @@ export default function ChatPage() {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
-          message: input
+          message: input,
+          user_id: userId,
+          conversation_id: conversationId.current,
+          // New per message, so sending the same command again places a new order
+          request_id: crypto.randomUUID()
         })
       });
 
@@ -128,31 +140,49 @@ export default function ChatPage() {
       if (!reader) throw new Error('No reader available');
 
       let content = '';
+      let buffer = '';
       const decoder = new TextDecoder();
 
+      const updateAssistantMessage = (text: string) => {
+        setMessages(prev => {
+          const lastMessage = prev[prev.length - 1];
+          if (lastMessage?.role === 'assistant') {
+            return [...prev.slice(0, -1), { ...lastMessage, content: text }];
+          }
+          return [...prev, { id: Date.now().toString(), role: 'assistant', content: text }];
+        });
+      };
+
       while (true) {
         const { done, value } = await reader.read();
         if (done) break;
 
-        const chunk = decoder.decode(value);
-        const lines = chunk.split('\n');
+        // SSE frames are separated by a blank line and may span network chunks
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop() ?? '';
+
+        for (const frame of frames) {
+          let event = 'message';
+          let data = '';
+          for (const line of frame.split('\n')) {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+          }
+          // Heartbeat comments carry no data
+          if (!data) continue;
 
-        for (const line of lines) {
-          if (line.trim() === '') continue;
           try {
-            const parsed = JSON.parse(line);
-            if (parsed.role === 'assistant') {
+            const parsed = JSON.parse(data);
+            if (event === 'token') {
+              content += parsed.content;
+              updateAssistantMessage(content);
+            } else if ((event === 'message' || event === 'error') && parsed.role === 'assistant') {
               content = parsed.content;
-              setMessages(prev => {
-                const lastMessage = prev[prev.length - 1];
-                if (lastMessage?.role === 'assistant') {
-                  return [...prev.slice(0, -1), { ...lastMessage, content }];
-                }
-                return [...prev, { id: Date.now().toString(), role: 'assistant', content }];
-              });
+              updateAssistantMessage(content);
             }
           } catch (e) {
-            console.error('Failed to parse chunk:', e);
+            console.error('Failed to parse event:', e);
           }
         }
       }